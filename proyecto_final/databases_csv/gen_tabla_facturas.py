@@ -9,18 +9,18 @@ from datetime import datetime, timedelta
 
 def generar_id_factura(fecha, existentes):
     """
-    Genera un ID_FACTURA único con formato:
+    Siguiente ID_FACTURA libre del día, con formato:
     Letra + Dígito + DDMMYY
     Ejemplo: G5121024
+    existentes cuenta los ID ya dados por día: los códigos se reparten en
+    orden (A0, A1, ..., Z9) en vez de probar al azar hasta encontrar uno libre.
     """
-    while True:
-        letra = random.choice(string.ascii_uppercase)
-        digito = str(random.randint(0, 9))
-        fecha_str = fecha.strftime("%d%m%y")
-        id_factura = f"{letra}{digito}{fecha_str}"
-        if id_factura not in existentes:
-            existentes.add(id_factura)
-            return id_factura
+    fecha_str = fecha.strftime("%d%m%y")
+    n = existentes.get(fecha_str, 0)
+    if n >= len(string.ascii_uppercase) * 10:
+        raise ValueError(f"No quedan ID_FACTURA libres para el {fecha.strftime('%Y-%m-%d')}")
+    existentes[fecha_str] = n + 1
+    return f"{string.ascii_uppercase[n // 10]}{n % 10}{fecha_str}"
 
 
 def fecha_aleatoria(inicio, fin):
@@ -62,7 +62,7 @@ with open("restaurantes.csv", "r", encoding="utf-8") as f:
 # ===========================
 
 facturas = []
-id_facturas_existentes = set()
+id_facturas_existentes = {}
 
 # --- Facturas que vienen de reservas (obligatorias) ---
 for r in reservas:
@@ -31,13 +31,20 @@ def generar_hora_reserva():
     minutos = random.choice([0, 15, 30, 45])
     return f"{hora:02d}:{minutos:02d}"
 
+LETRAS_ID = 'ABCDEFGHJKLMNPQRSTUVWXYZ'
+
 def generar_id_reserva(fecha, usados):
-    """Genera un ID_RESERVA único con formato YYMMDD + Letra + Dígito."""
-    while True:
-        codigo = f"{fecha.strftime('%y%m%d')}{random.choice('ABCDEFGHJKLMNPQRSTUVWXYZ')}{random.randint(0,9)}"
-        if codigo not in usados:
-            usados.add(codigo)
-            return codigo
+    """Siguiente ID_RESERVA libre del día, con formato YYMMDD + Letra + Dígito.
+
+    usados cuenta los ID ya dados por día: los códigos se reparten en orden
+    (A0, A1, ..., Z9) en vez de probar al azar hasta encontrar uno libre.
+    """
+    dia = fecha.strftime('%y%m%d')
+    n = usados.get(dia, 0)
+    if n >= len(LETRAS_ID) * 10:
+        raise ValueError(f"No quedan ID_RESERVA libres para el {fecha.strftime('%Y-%m-%d')}")
+    usados[dia] = n + 1
+    return f"{dia}{LETRAS_ID[n // 10]}{n % 10}"
 
 # === CARGA DE DATOS ===
 clientes = cargar_columna_csv(ARCHIVO_CLIENTES, "ID_CLIENTE")
@@ -48,7 +55,7 @@ print(f"Restaurantes cargados: {len(restaurantes)}")
 
 # === GENERACIÓN DE RESERVAS ===
 reservas = []
-id_usados = set()
+id_usados = {}
 
 for cliente in clientes:
     # Cada cliente tendrá entre 1 y 5 reservas
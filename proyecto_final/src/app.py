@@ -1,186 +1,445 @@
-from flask import Flask, jsonify, request, send_file
-from flask_mysqldb import MySQL
-import matplotlib
-matplotlib.use('Agg')  # Backend sin GUI
-import matplotlib.pyplot as plt
+from flask import Blueprint, Flask, current_app, jsonify, request, send_file, stream_with_context, url_for
+from datetime import datetime
 import io
-import base64
+import json
+import random
+import time
 
+from auditoria_sql import AuditoriaSQL
+import busqueda
+from buscador import FACETAS, FACETAS_NUMERICAS, Buscador, cumple_faceta
+from catalogo import CatalogoRestaurantes, IndiceAlergenos
 from config import config
+from db import MySQLPool, marcar_lote
+import disponibilidad
+from disponibilidad import IndiceDisponibilidad, SinDisponibilidad
+import facturacion
+import importacion
 from frontend import frontend_bp
+import identificadores
+from graficos import CacheGraficos, ServicioGraficos, ServicioGraficosOcupado, TimeoutGrafico, huella
+from graficos_svg import renderizar_svg
+from mercado import MercadoPrecios
+from metricas import Metricas
+import migraciones
+import paginacion
+import rollups
 
-app = Flask(__name__)
+# Importar este módulo no abre conexiones, no toca la BD ni arranca procesos:
+# todo eso ocurre en create_app(). matplotlib solo se importa en los procesos
+# de gráficos (ver graficos.py), nunca en los que atienden peticiones.
+api_bp = Blueprint('api', __name__)
 
-# Configure MySQL BEFORE creating connection
-app.config.from_object(config['development'])
-app.config['JSON_AS_ASCII'] = False
-app.config['JSON_SORT_KEYS'] = False
-app.config['JSONIFY_MIMETYPE'] = 'application/json; charset=utf-8'
-app.config['MYSQL_INIT_COMMAND'] = "SET NAMES utf8mb4 COLLATE utf8mb4_unicode_ci"
+# Pool de conexiones: utf8mb4 se fija al crear cada conexión (ver db.py),
+# así que ya no hace falta lanzar SET NAMES en cada petición
+conexion = MySQLPool()
 
-conexion = MySQL(app)
+# Snapshots en memoria de restaurantes y alérgenos por plato (ver catalogo.py)
+catalogo = CatalogoRestaurantes()
+indice_alergenos = IndiceAlergenos()
+# Índice invertido de restaurantes y platos para /api/buscar (ver buscador.py)
+buscador = Buscador()
+# Histogramas del gasto por persona del mercado por CCAA y estrellas (ver mercado.py)
+mercado = MercadoPrecios()
+# Ocupación por restaurante, fecha y franja de 15 minutos (ver disponibilidad.py)
+indice_disponibilidad = IndiceDisponibilidad()
 
-# Configurar encoding al iniciar - CRÍTICO para caracteres especiales
-@app.before_request
-def before_request():
-    if conexion.connection:
-        cursor = conexion.connection.cursor()
-        # Estos 3 comandos fuerzan UTF-8 en toda la conexión
-        cursor.execute("SET NAMES utf8mb4")
-        cursor.execute("SET CHARACTER_SET_CLIENT = utf8mb4")
-        cursor.execute("SET CHARACTER_SET_RESULTS = utf8mb4")
-        cursor.execute("SET CHARACTER_SET_CONNECTION = utf8mb4")
-        cursor.close()
+# Peticiones, SQL y gráficos por ruta, expuestos en /metrics (ver metricas.py)
+metricas = Metricas()
+# N+1, sentencias lentas y presupuesto de sentencias por petición (ver auditoria_sql.py)
+auditoria = AuditoriaSQL()
 
-# Register frontend blueprint to serve templates/static
-app.register_blueprint(frontend_bp)
+# Los gráficos se dibujan en un pool de procesos aparte y los PNG ya dibujados
+# se guardan versionados por la huella de sus datos
+servicio_graficos = ServicioGraficos()
+cache_graficos = CacheGraficos(metricas.medir_grafico('png', servicio_graficos.renderizar))
+# La versión SVG se genera en el propio hilo: no usa matplotlib y tarda microsegundos
+cache_svg = CacheGraficos(metricas.medir_grafico('svg', renderizar_svg))
+FORMATOS_GRAFICO = {'png': 'image/png', 'svg': 'image/svg+xml'}
+
+def create_app(nombre_config='development'):
+    """Crea la aplicación Flask (flask run la encuentra automáticamente)."""
+    app = Flask(__name__)
+
+    # Configure MySQL BEFORE creating connection
+    app.config.from_object(config[nombre_config])
+    app.config['JSON_AS_ASCII'] = False
+    app.config['JSON_SORT_KEYS'] = False
+    app.config['JSONIFY_MIMETYPE'] = 'application/json; charset=utf-8'
+
+    conexion.init_app(app)
+    auditoria.init_app(app)  # antes que metricas: pone su propio g.uso_sql
+    metricas.init_app(app)
+    identificadores.configurar(conexion.pool, app.config['ID_BLOQUE'])
+
+    catalogo.ttl = app.config['CATALOGO_TTL']
+    indice_alergenos.ttl = app.config['CATALOGO_TTL']
+    buscador.ttl = app.config['CATALOGO_TTL']
+    mercado.ttl = app.config['CATALOGO_TTL']
+    indice_disponibilidad.ttl = app.config['DISPONIBILIDAD_TTL']
+    indice_disponibilidad.aforo = app.config['AFORO_POR_DEFECTO']
+    indice_disponibilidad.duracion = app.config['DURACION_RESERVA']
+    indice_disponibilidad.horario = app.config['HORARIO_RESERVAS']
+    try:
+        with app.app_context():
+            catalogo.cargar(conexion.cursor())
+            indice_alergenos.cargar(conexion.cursor())
+            buscador.cargar(conexion.cursor())
+    except Exception as ex:
+        # Si la BD no está disponible al arrancar, se cargarán en la primera petición
+        app.logger.warning("No se pudo cargar el catálogo de restaurantes: %s", ex)
+    try:
+        with app.app_context():
+            if rollups.asegurar(conexion.connection):
+                app.logger.info("Tablas resumen de analytics creadas y rellenadas")
+            mercado.cargar(conexion.cursor())
+    except Exception as ex:
+        app.logger.warning("No se pudieron cargar las tablas resumen: %s", ex)
+    try:
+        with app.app_context():
+            identificadores.asegurar(conexion.connection)
+            for version, creados in migraciones.aplicar(conexion.connection):
+                app.logger.info("Migración de índices %s aplicada: %s", version, ', '.join(creados) or 'ya existían')
+            if busqueda.asegurar(conexion.connection):
+                app.logger.info("Índice de búsqueda de clientes creado")
+    except Exception as ex:
+        app.logger.warning("No se pudieron comprobar los índices: %s", ex)
+    try:
+        with app.app_context():
+            disponibilidad.asegurar(conexion.connection)
+            indice_disponibilidad.cargar(conexion.cursor())
+    except Exception as ex:
+        app.logger.warning("No se pudo cargar la disponibilidad: %s", ex)
+
+    servicio_graficos.init_app(app)
+    cache_graficos.max_entradas = app.config['GRAFICOS_CACHE_MAX']
+    cache_svg.max_entradas = app.config['GRAFICOS_CACHE_MAX']
+
+    app.register_blueprint(api_bp)
+    # Register frontend blueprint to serve templates/static
+    app.register_blueprint(frontend_bp)
+    app.register_error_handler(404, pagina_no_encontrada)
+    return app
+
+def leer_fecha_param(nombre):
+    """Lee un parámetro de fecha opcional (YYYY-MM-DD) de la query string."""
+    valor = request.args.get(nombre)
+    if not valor:
+        return None
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f'{nombre} debe tener formato YYYY-MM-DD')
+
+def leer_limite(por_defecto, maximo):
+    """Lee ?limit= (entre 1 y maximo) o devuelve por_defecto."""
+    valor = request.args.get('limit')
+    if not valor:
+        return por_defecto
+    if not valor.isdigit() or not 1 <= int(valor) <= maximo:
+        raise ValueError(f'limit debe ser un entero entre 1 y {maximo}')
+    return int(valor)
+
+def leer_reserva(data):
+    """Fecha ('YYYY-MM-DD'), hora ('HH:MM:SS'), su franja y comensales del cuerpo de una reserva.
+
+    ValueError si no son válidos. HORARIO_RESERVAS solo limita la búsqueda de
+    disponibilidad: una reserva puede crearse o moverse a cualquier hora.
+    """
+    try:
+        fecha = datetime.strptime(str(data.get('fecha')), '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError('fecha debe tener formato YYYY-MM-DD')
+    texto = str(data.get('hora'))
+    try:
+        hora = datetime.strptime(texto, '%H:%M:%S' if texto.count(':') == 2 else '%H:%M').time().isoformat()
+    except ValueError:
+        raise ValueError('hora debe tener formato HH:MM')
+    try:
+        personas = int(data.get('num_personas'))
+    except (TypeError, ValueError):
+        personas = 0
+    if personas < 1:
+        raise ValueError('num_personas debe ser un entero positivo')
+    return fecha.isoformat(), hora, disponibilidad.franja(hora), personas
+
+def leer_pagina():
+    """Parámetros de los listados paginados: ?limit=, ?after=, ?desde= y ?hasta=.
+
+    after es el token `siguiente` devuelto por la página anterior.
+    """
+    limite = leer_limite(current_app.config['PAGINA_LIMITE'], current_app.config['PAGINA_LIMITE_MAX'])
+    return paginacion.Pagina(limite, request.args.get('after') or None,
+                             leer_fecha_param('desde'), leer_fecha_param('hasta'))
+
+def sql_pagina(select, condiciones, params, pagina, columnas):
+    """Completa la consulta de un listado con los filtros, el orden y el límite de la página."""
+    filtros, params_pagina = paginacion.filtros(pagina, columnas)
+    sql = f"{select} WHERE {' AND '.join(condiciones + filtros)} ORDER BY {paginacion.orden(columnas)} LIMIT %s"
+    return sql, (*params, *params_pagina, pagina.limite + 1)
+
+def facturas_de_reservas(cursor, ids_reserva):
+    """{ID_RESERVA: factura} de las reservas de una página, con una sola consulta."""
+    if not ids_reserva:
+        return {}
+    cursor.execute("""SELECT ID_RESERVA, ID_FACTURA, PRECIO, VALORACION, TIPO_VISITA
+                      FROM facturas WHERE ID_RESERVA IN %s""", (tuple(ids_reserva),))
+    return {
+        fila[0]: {
+            'id_factura': fila[1],
+            'precio': float(fila[2]),
+            'valoracion': float(fila[3]) if fila[3] else None,
+            'tipo_visita': fila[4]
+        }
+        for fila in cursor.fetchall()
+    }
 
 # ===== API ENDPOINTS FOR CLIENT WEB APP =====
 
-@app.route('/api/restaurantes', methods=['GET'])
+@api_bp.route('/api/restaurantes', methods=['GET'])
 def listar_restaurantes():
     try:
-        cursor = conexion.connection.cursor()
         alergia_filter = request.args.get('alergia', None)
-        
-        if alergia_filter:
-            # Buscar restaurantes que tengan al menos un plato SIN ese alérgeno
-            sql = """SELECT DISTINCT r.ID_RESTAURANTE, r.NOMBRE, r.CIUDAD, r.CCAA, r.T_COMIDA, 
-                     r.PRESUPUESTO, r.ESTRELLA_MICH, r.CADENA 
-                     FROM restaurantes r
-                     WHERE EXISTS (
-                         SELECT 1 FROM platos p
-                         WHERE p.ID_RESTAURANTE = r.ID_RESTAURANTE
-                         AND (p.ID_RESTAURANTE, p.N_PLATO) NOT IN (
-                             SELECT al.ID_RESTAURANTE, al.N_PLATO
-                             FROM alergias al
-                             JOIN alergenos a ON al.NUM_ALERGENO = a.NUM_ALERGENO
-                             WHERE a.ALERGENO = %s
-                         )
-                     )
-                     ORDER BY r.ESTRELLA_MICH DESC, r.NOMBRE"""
-            cursor.execute(sql, (alergia_filter,))
-        else:
-            sql = """SELECT ID_RESTAURANTE, NOMBRE, CIUDAD, CCAA, T_COMIDA, 
-                     PRESUPUESTO, ESTRELLA_MICH, CADENA 
-                     FROM restaurantes ORDER BY ESTRELLA_MICH DESC, NOMBRE"""
-            cursor.execute(sql)
-            
-        datos = cursor.fetchall()
-        restaurantes = []
-        for fila in datos:
-            restaurante = {
-                'id': fila[0],
-                'nombre': fila[1],
-                'ciudad': fila[2],
-                'ccaa': fila[3],
-                'tipo_comida': fila[4],
-                'presupuesto': fila[5],
-                'estrellas': fila[6],
-                'cadena': fila[7] if fila[7] and fila[7] != 'NULL' else None
-            }
-            restaurantes.append(restaurante)
+        snapshot = catalogo.actual(conexion.cursor)
+        
+        if not alergia_filter:
+            # Listado completo servido desde el snapshot, sin consultas a la BD
+            respuesta = current_app.response_class(snapshot.json_listado, mimetype=current_app.config['JSONIFY_MIMETYPE'])
+            respuesta.set_etag(snapshot.etag)
+            return respuesta.make_conditional(request)
+        
+        # Restaurantes con al menos un plato SIN ninguno de los alérgenos pedidos
+        # (?alergia=Huevos,Gluten,...), resuelto con la máscara de bits de cada plato
+        alergenos = indice_alergenos.actual(conexion.cursor)
+        mascara = alergenos.mascara(alergia_filter.split(','))
+        # El snapshot ya viene ordenado por estrellas y nombre
+        restaurantes = [r._asdict() for r in snapshot.restaurantes
+                        if alergenos.restaurante_seguro(r.id, mascara)]
         return jsonify({'restaurantes': restaurantes, 'mensaje': 'Restaurantes listados'})
     except Exception as ex:
         return jsonify({'mensaje': f'Error: {str(ex)}'}), 500
 
-@app.route('/api/restaurantes/<id_rest>', methods=['GET'])
+@api_bp.route('/api/restaurantes/<id_rest>', methods=['GET'])
 def obtener_restaurante(id_rest):
     try:
-        cursor = conexion.connection.cursor()
-        sql = """SELECT ID_RESTAURANTE, NOMBRE, CIUDAD, CCAA, T_COMIDA, 
-                 PRESUPUESTO, ESTRELLA_MICH, CADENA 
-                 FROM restaurantes WHERE ID_RESTAURANTE = %s"""
-        cursor.execute(sql, (id_rest,))
-        datos = cursor.fetchone()
-        if datos:
-            restaurante = {
-                'id': datos[0],
-                'nombre': datos[1],
-                'ciudad': datos[2],
-                'ccaa': datos[3],
-                'tipo_comida': datos[4],
-                'presupuesto': datos[5],
-                'estrellas': datos[6],
-                'cadena': datos[7]
-            }
-            return jsonify({'restaurante': restaurante})
+        restaurante = catalogo.buscar(catalogo.actual(conexion.cursor), id_rest)
+        if restaurante:
+            return jsonify({'restaurante': restaurante._asdict()})
         else:
             return jsonify({'mensaje': 'Restaurante no encontrado'}), 404
     except Exception as ex:
         return jsonify({'mensaje': f'Error: {str(ex)}'}), 500
 
-@app.route('/api/restaurantes/<id_rest>/platos', methods=['GET'])
+@api_bp.route('/api/restaurantes/<id_rest>/platos', methods=['GET'])
 def listar_platos_restaurante(id_rest):
     try:
-        cursor = conexion.connection.cursor()
         alergia_filter = request.args.get('alergia', None)
+        # Carta y alérgenos de cada plato salen del índice en memoria, sin una consulta por plato
+        alergenos = indice_alergenos.actual(conexion.cursor)
+        mascara = alergenos.mascara(alergia_filter.split(',')) if alergia_filter else 0
         
-        sql = """SELECT N_PLATO, T_PLATO, PRECIO 
-                 FROM platos WHERE ID_RESTAURANTE = %s 
-                 ORDER BY FIELD(T_PLATO, 'ENTRANTE', 'PRINCIPAL', 'POSTRE', 'BEBIDA'), PRECIO DESC"""
-        cursor.execute(sql, (id_rest,))
-        datos = cursor.fetchall()
         platos = []
-        
-        for fila in datos:
-            nombre_plato = fila[0]
-            tiene_alergeno = False
-            
-            if alergia_filter:
-                # Verificar si el plato contiene el alérgeno
-                sql_alergia = """SELECT COUNT(*) FROM alergias al
-                                 JOIN alergenos a ON al.NUM_ALERGENO = a.NUM_ALERGENO
-                                 WHERE al.ID_RESTAURANTE = %s 
-                                 AND al.N_PLATO = %s 
-                                 AND a.ALERGENO = %s"""
-                cursor.execute(sql_alergia, (id_rest, nombre_plato, alergia_filter))
-                tiene_alergeno = cursor.fetchone()[0] > 0
-            
-            plato = {
-                'nombre': nombre_plato,
-                'tipo': fila[1],
-                'precio': float(fila[2]),
-                'sin_alergeno': not tiene_alergeno if alergia_filter else None
-            }
-            platos.append(plato)
+        for plato in alergenos.menu(id_rest):
+            platos.append({
+                'nombre': plato.nombre,
+                'tipo': plato.tipo,
+                'precio': plato.precio,
+                'alergenos': list(plato.alergenos),
+                'sin_alergeno': plato.mascara & mascara == 0 if alergia_filter else None
+            })
         return jsonify({'platos': platos})
     except Exception as ex:
         return jsonify({'mensaje': f'Error: {str(ex)}'}), 500
 
-@app.route('/api/reservas', methods=['POST'])
+@api_bp.route('/api/buscar', methods=['GET'])
+def buscar_catalogo():
+    """Búsqueda de restaurantes y platos mientras se escribe.
+
+    ?q= es el texto (cada palabra se busca como prefijo, sin acentos ni
+    mayúsculas), ?limit= el número de resultados y ?tipo=, ?ccaa=, ?ciudad=,
+    ?estrellas=, ?presupuesto=, ?tipo_comida= y ?t_plato= filtran por faceta.
+    """
+    try:
+        texto = request.args.get('q', '')
+        limite = leer_limite(current_app.config['BUSQUEDA_LIMITE'], current_app.config['BUSQUEDA_LIMITE_MAX'])
+        filtros = {}
+        for faceta in FACETAS:
+            valor = request.args.get(faceta, '').strip()
+            if valor:
+                if faceta in FACETAS_NUMERICAS:
+                    if not valor.isdigit():
+                        raise ValueError(f'{faceta} debe ser un número entero')
+                    valor = int(valor)
+                filtros[faceta] = valor
+        
+        snapshot = buscador.actual(conexion.cursor)
+        resultados, total, facetas = buscador.buscar(snapshot, texto, filtros, limite)
+        return jsonify({'resultados': resultados, 'total': total, 'facetas': facetas})
+    except ValueError as ex:
+        return jsonify({'mensaje': str(ex)}), 400
+    except Exception as ex:
+        return jsonify({'mensaje': f'Error: {str(ex)}'}), 500
+
+@api_bp.route('/api/disponibilidad', methods=['GET'])
+def buscar_disponibilidad():
+    """Restaurantes con sitio para ?personas= (2 por defecto) el día ?fecha= (YYYY-MM-DD).
+
+    Con ?hora= (HH:MM) devuelve los que tienen sitio a esa hora y sus plazas
+    libres; sin ella, las horas con sitio de cada restaurante ese día.
+    ?ccaa=, ?ciudad=, ?tipo_comida= y ?estrellas= filtran los restaurantes.
+    Se responde solo con los índices en memoria, sin consultar reservas.
+    """
+    try:
+        fecha = leer_fecha_param('fecha')
+        if fecha is None:
+            raise ValueError('Falta el parámetro fecha')
+        if fecha < datetime.now().date():
+            raise ValueError('No se puede reservar en una fecha pasada')
+        personas = request.args.get('personas', '2')
+        if not personas.isdigit() or int(personas) < 1:
+            raise ValueError('personas debe ser un entero positivo')
+        personas = int(personas)
+        hora = request.args.get('hora')
+        inicio = disponibilidad.leer_hora(hora, current_app.config['HORARIO_RESERVAS']) if hora else None
+        limite = leer_limite(current_app.config['PAGINA_LIMITE'], current_app.config['PAGINA_LIMITE_MAX'])
+        filtros = {}
+        for faceta in ('ccaa', 'ciudad', 'tipo_comida', 'estrellas'):
+            valor = request.args.get(faceta, '').strip()
+            if valor:
+                if faceta == 'estrellas':
+                    if not valor.isdigit():
+                        raise ValueError('estrellas debe ser un número entero')
+                    valor = int(valor)
+                filtros[faceta] = valor
+
+        restaurantes = catalogo.actual(conexion.cursor).restaurantes
+        snapshot = indice_disponibilidad.actual(conexion.cursor)
+        fecha = fecha.isoformat()
+        encontrados = []
+        for r in restaurantes:
+            if not all(cumple_faceta(getattr(r, faceta), valor) for faceta, valor in filtros.items()):
+                continue
+            estado = indice_disponibilidad.estado(snapshot, r.id)
+            datos = {'id_restaurante': r.id, 'nombre': r.nombre, 'ciudad': r.ciudad, 'ccaa': r.ccaa,
+                     'tipo_comida': r.tipo_comida, 'estrellas': r.estrellas}
+            if inicio is not None:
+                plazas = disponibilidad.libres(estado.ocupacion.get(fecha), inicio, estado.duracion, estado.aforo)
+                if plazas >= personas:
+                    encontrados.append(dict(datos, plazas_libres=plazas))
+            else:
+                horas = indice_disponibilidad.horas_libres(estado, fecha, personas)
+                if horas:
+                    encontrados.append(dict(datos, horas=[{'hora': h, 'plazas_libres': p} for h, p in horas]))
+        return jsonify({'fecha': fecha, 'hora': hora, 'personas': personas,
+                        'total': len(encontrados), 'restaurantes': encontrados[:limite]})
+    except ValueError as ex:
+        return jsonify({'mensaje': str(ex)}), 400
+    except Exception as ex:
+        return jsonify({'mensaje': f'Error: {str(ex)}'}), 500
+
+@api_bp.route('/api/reservas', methods=['POST'])
 def crear_reserva():
+    """Crea la reserva solo si hay sitio; si no, 409 con las horas de ese día que sí tienen."""
     try:
         data = request.json
-        cursor = conexion.connection.cursor()
-        
-        # Generate unique ID_RESERVA (8 chars)
-        import random
-        import string
-        id_reserva = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
-        
+        fecha, hora, inicio, personas = leer_reserva(data)
+        id_restaurante = data['id_restaurante']
+        if catalogo.buscar(catalogo.actual(conexion.cursor), id_restaurante) is None:
+            raise ValueError(f'El restaurante {id_restaurante} no existe')
+        cursor = conexion.cursor()
+        # Bloquea el restaurante hasta el commit: la comprobación y el INSERT son atómicos
+        indice_disponibilidad.comprobar(cursor, id_restaurante, fecha, inicio, personas)
+
+        id_reserva = identificadores.reservas.siguiente()
         sql = """INSERT INTO reservas (ID_RESERVA, ID_CLIENTE, NUM_PERSONAS, 
                  FECHA_RESERVA, HORA_RESERVA, ID_RESTAURANTE, ESTADO_RESERVA)
                  VALUES (%s, %s, %s, %s, %s, %s, 'Confirmada')"""
-        cursor.execute(sql, (id_reserva, data['id_cliente'], data['num_personas'],
-                            data['fecha'], data['hora'], data['id_restaurante']))
+        cursor.execute(sql, (id_reserva, data['id_cliente'], personas,
+                            fecha, hora, id_restaurante))
+        rollups.sumar_reserva(cursor, id_reserva)
+        disponibilidad.tocar_restaurantes(cursor, [id_restaurante])
         conexion.connection.commit()
+        indice_disponibilidad.invalidar()
         return jsonify({'mensaje': 'Reserva creada exitosamente', 'id_reserva': id_reserva})
+    except SinDisponibilidad as ex:
+        return jsonify({'mensaje': str(ex), 'alternativas': ex.alternativas}), 409
+    except ValueError as ex:
+        return jsonify({'mensaje': str(ex)}), 400
     except Exception as ex:
         return jsonify({'mensaje': f'Error: {str(ex)}'}), 500
 
-@app.route('/api/reservas/<id_cliente>', methods=['GET'])
+@api_bp.route('/api/reservas/importar', methods=['POST'])
+def importar_reservas():
+    """Importación masiva de reservas desde CSV o NDJSON (ver importacion.py).
+
+    El fichero va en el cuerpo (se lee a medida que se importa) o en el campo
+    'archivo' de un formulario multipart; el formato se toma de ?formato=, de la extensión o del
+    Content-Type. La respuesta es NDJSON: una línea {'linea', 'exito',
+    'id_reserva' | 'mensaje'} por fila del fichero y al final {'resumen': {...}}.
+    """
+    try:
+        if request.mimetype == 'multipart/form-data':
+            archivo = request.files.get('archivo')
+            if archivo is None:
+                raise ValueError("Falta el fichero en el campo 'archivo'")
+            # Werkzeug ya ha recibido el fichero entero y lo cierra al terminar la
+            # vista, antes de que empiece el streaming: se copia a memoria
+            flujo, nombre, tipo = io.BytesIO(archivo.read()), archivo.filename or '', archivo.mimetype
+        else:
+            flujo, nombre, tipo = request.stream, '', request.mimetype
+        formato = request.args.get('formato')
+        if not formato:
+            formato = 'ndjson' if nombre.lower().endswith(('.ndjson', '.jsonl')) or 'json' in tipo else 'csv'
+        if formato not in ('csv', 'ndjson'):
+            raise ValueError('formato debe ser csv o ndjson')
+        filas = importacion.leer_filas(flujo, formato)
+        clientes = importacion.ids_clientes(conexion.cursor_servidor())
+        restaurantes = {clave: r.id for clave, r in catalogo.actual(conexion.cursor).por_id.items()}
+    except ValueError as ex:
+        return jsonify({'mensaje': str(ex)}), 400
+    except Exception as ex:
+        return jsonify({'mensaje': f'Error: {str(ex)}'}), 500
+
+    lote = current_app.config['IMPORTACION_LOTE']
+    a_json = lambda datos: json.dumps(datos, ensure_ascii=False) + '\n'
+
+    def informe():
+        inicio = time.perf_counter()
+        filas_leidas = importadas = 0
+        try:
+            # Como en la exportación de clientes, la conexión se pide ya dentro del streaming
+            for resultados in importacion.importar(conexion.connection, conexion.cursor(), filas,
+                                                   clientes, restaurantes, lote):
+                filas_leidas += len(resultados)
+                importadas += sum(1 for r in resultados if r['exito'])
+                yield ''.join(a_json(r) for r in resultados)
+        except Exception as ex:
+            # Los lotes ya confirmados se quedan; el resto del fichero no se importa
+            current_app.logger.exception("Error importando reservas")
+            yield a_json({'error': str(ex)})
+        indice_disponibilidad.invalidar()
+        yield a_json({'resumen': {'filas': filas_leidas, 'importadas': importadas,
+                                  'errores': filas_leidas - importadas,
+                                  'segundos': round(time.perf_counter() - inicio, 2)}})
+
+    return current_app.response_class(stream_with_context(informe()),
+                                      mimetype='application/x-ndjson; charset=utf-8')
+
+@api_bp.route('/api/reservas/<id_cliente>', methods=['GET'])
 def listar_reservas_cliente(id_cliente):
     try:
-        cursor = conexion.connection.cursor()
-        sql = """SELECT r.ID_RESERVA, r.NUM_PERSONAS, r.FECHA_RESERVA, r.HORA_RESERVA,
-                 r.ESTADO_RESERVA, rest.NOMBRE, rest.CIUDAD, rest.ID_RESTAURANTE
-                 FROM reservas r
-                 JOIN restaurantes rest ON r.ID_RESTAURANTE = rest.ID_RESTAURANTE
-                 WHERE r.ID_CLIENTE = %s
-                 ORDER BY r.FECHA_RESERVA DESC, r.HORA_RESERVA DESC"""
-        cursor.execute(sql, (id_cliente,))
-        datos = cursor.fetchall()
+        pagina = leer_pagina()
+        cursor = conexion.cursor()
+        columnas = ('r.FECHA_RESERVA', 'r.HORA_RESERVA', 'r.ID_RESERVA')
+        sql, params = sql_pagina("""SELECT r.ID_RESERVA, r.NUM_PERSONAS, r.FECHA_RESERVA, r.HORA_RESERVA,
+                                    r.ESTADO_RESERVA, rest.NOMBRE, rest.CIUDAD, rest.ID_RESTAURANTE
+                                    FROM reservas r
+                                    JOIN restaurantes rest ON r.ID_RESTAURANTE = rest.ID_RESTAURANTE""",
+                                 ["r.ID_CLIENTE = %s"], (id_cliente,), pagina, columnas)
+        cursor.execute(sql, params)
+        datos, siguiente = paginacion.cortar(cursor.fetchall(), pagina.limite,
+                                             lambda fila: (fila[2], fila[3], fila[0]))
+        facturas = facturas_de_reservas(cursor, [fila[0] for fila in datos])
         reservas = []
         for fila in datos:
             # Convertir fecha a string en formato YYYY-MM-DD
@@ -194,25 +453,38 @@ def listar_reservas_cliente(id_cliente):
                 'estado': fila[4],
                 'restaurante_nombre': fila[5],
                 'restaurante_ciudad': fila[6],
-                'id_restaurante': fila[7]
+                'id_restaurante': fila[7],
+                'factura': facturas.get(fila[0])
             }
             reservas.append(reserva)
-        return jsonify({'reservas': reservas})
+        respuesta = {'reservas': reservas, 'siguiente': siguiente}
+        if not pagina.despues:
+            # Los totales solo se calculan con la primera página
+            condiciones, params = paginacion.filtros(pagina, ('FECHA_RESERVA',))
+            cursor.execute(f"SELECT COUNT(*) FROM reservas WHERE {' AND '.join(['ID_CLIENTE = %s'] + condiciones)}",
+                           (id_cliente, *params))
+            respuesta['total'] = cursor.fetchone()[0]
+        return jsonify(respuesta)
+    except ValueError as ex:
+        return jsonify({'mensaje': str(ex)}), 400
     except Exception as ex:
         return jsonify({'mensaje': f'Error: {str(ex)}'}), 500
 
-@app.route('/api/restaurantes/<id_restaurante>/reservas', methods=['GET'])
+@api_bp.route('/api/restaurantes/<id_restaurante>/reservas', methods=['GET'])
 def listar_reservas_restaurante(id_restaurante):
     try:
-        cursor = conexion.connection.cursor()
-        sql = """SELECT r.ID_RESERVA, r.NUM_PERSONAS, r.FECHA_RESERVA, r.HORA_RESERVA,
-                 r.ESTADO_RESERVA, r.ID_CLIENTE, c.N_CLIENTE
-                 FROM reservas r
-                 JOIN clientes c ON r.ID_CLIENTE = c.ID_CLIENTE
-                 WHERE r.ID_RESTAURANTE = %s
-                 ORDER BY r.FECHA_RESERVA DESC, r.HORA_RESERVA DESC"""
-        cursor.execute(sql, (id_restaurante,))
-        datos = cursor.fetchall()
+        pagina = leer_pagina()
+        cursor = conexion.cursor()
+        columnas = ('r.FECHA_RESERVA', 'r.HORA_RESERVA', 'r.ID_RESERVA')
+        sql, params = sql_pagina("""SELECT r.ID_RESERVA, r.NUM_PERSONAS, r.FECHA_RESERVA, r.HORA_RESERVA,
+                                    r.ESTADO_RESERVA, r.ID_CLIENTE, c.N_CLIENTE
+                                    FROM reservas r
+                                    JOIN clientes c ON r.ID_CLIENTE = c.ID_CLIENTE""",
+                                 ["r.ID_RESTAURANTE = %s"], (id_restaurante,), pagina, columnas)
+        cursor.execute(sql, params)
+        datos, siguiente = paginacion.cortar(cursor.fetchall(), pagina.limite,
+                                             lambda fila: (fila[2], fila[3], fila[0]))
+        facturas = facturas_de_reservas(cursor, [fila[0] for fila in datos])
         reservas = []
         for fila in datos:
             reserva = {
@@ -222,23 +494,30 @@ def listar_reservas_restaurante(id_restaurante):
                 'hora': str(fila[3]),
                 'estado': fila[4],
                 'id_cliente': fila[5],
-                'nombre_cliente': fila[6]
+                'nombre_cliente': fila[6],
+                'factura': facturas.get(fila[0])
             }
             reservas.append(reserva)
-        return jsonify({'reservas': reservas})
+        respuesta = {'reservas': reservas, 'siguiente': siguiente}
+        if not pagina.despues:
+            respuesta['total'] = rollups.total_reservas(cursor, id_restaurante, pagina.desde, pagina.hasta)
+        return jsonify(respuesta)
+    except ValueError as ex:
+        return jsonify({'mensaje': str(ex)}), 400
     except Exception as ex:
         return jsonify({'mensaje': f'Error: {str(ex)}'}), 500
 
-@app.route('/api/restaurantes/<id_restaurante>/facturas', methods=['GET'])
+@api_bp.route('/api/restaurantes/<id_restaurante>/facturas', methods=['GET'])
 def listar_facturas_restaurante(id_restaurante):
     try:
-        cursor = conexion.connection.cursor()
-        sql = """SELECT ID_FACTURA, PRECIO, ID_RESERVA, FECHA_FACTURA
-                 FROM facturas
-                 WHERE ID_RESTAURANTE = %s
-                 ORDER BY FECHA_FACTURA DESC"""
-        cursor.execute(sql, (id_restaurante,))
-        datos = cursor.fetchall()
+        pagina = leer_pagina()
+        cursor = conexion.cursor()
+        sql, params = sql_pagina("SELECT ID_FACTURA, PRECIO, ID_RESERVA, FECHA_FACTURA FROM facturas",
+                                 ["ID_RESTAURANTE = %s"], (id_restaurante,), pagina,
+                                 ('FECHA_FACTURA', 'ID_FACTURA'))
+        cursor.execute(sql, params)
+        datos, siguiente = paginacion.cortar(cursor.fetchall(), pagina.limite,
+                                             lambda fila: (fila[3], fila[0]))
         facturas = []
         for fila in datos:
             factura = {
@@ -248,98 +527,173 @@ def listar_facturas_restaurante(id_restaurante):
                 'fecha': str(fila[3])
             }
             facturas.append(factura)
-        return jsonify({'facturas': facturas})
+        respuesta = {'facturas': facturas, 'siguiente': siguiente}
+        if not pagina.despues:
+            respuesta['total'], respuesta['importe_total'] = rollups.total_facturas(
+                cursor, id_restaurante, pagina.desde, pagina.hasta)
+        return jsonify(respuesta)
+    except ValueError as ex:
+        return jsonify({'mensaje': str(ex)}), 400
     except Exception as ex:
         return jsonify({'mensaje': f'Error: {str(ex)}'}), 500
 
-@app.route('/api/restaurantes/factura/crear', methods=['POST'])
+@api_bp.route('/api/restaurantes/factura/crear', methods=['POST'])
 def crear_factura_restaurante():
     try:
-        print("=== CREAR FACTURA DESDE RESTAURANTE ===")
         data = request.json
-        print(f"Datos recibidos: {data}")
-        
-        cursor = conexion.connection.cursor()
-        
-        # Generar ID de factura
-        import random
-        import string
-        from datetime import datetime
-        
-        id_factura = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
-        fecha_factura = datetime.now().strftime('%Y-%m-%d')
-        
-        # Insertar factura con TIPO_VISITA NULL inicialmente
-        sql_factura = """INSERT INTO facturas (ID_FACTURA, ID_CLIENTE, ID_RESERVA, 
-                        PRECIO, FECHA_FACTURA, ID_RESTAURANTE, TIPO_VISITA)
-                        VALUES (%s, %s, %s, %s, %s, %s, NULL)"""
-        cursor.execute(sql_factura, (
-            id_factura,
-            data['id_cliente'],
-            data['id_reserva'],
-            data['precio'],
-            fecha_factura,
-            data['id_restaurante']
-        ))
-        
-        # Insertar comandas (cada plato es una comanda)
-        for plato in data['platos']:
-            sql_comanda = """INSERT INTO comandas (ID_FACTURA, N_PLATO, ID_RESTAURANTE, NUM_PEDIDOS)
-                            VALUES (%s, %s, %s, %s)"""
-            cursor.execute(sql_comanda, (
-                id_factura,
-                plato['nombre'],
-                data['id_restaurante'],
-                plato['cantidad']
-            ))
-        
+        id_restaurante = data['id_restaurante']
+        lineas = facturacion.leer_lineas(data.get('platos'))
+        cursor = conexion.cursor()
+        # El precio se calcula con la carta, no con el que envía el navegador
+        reservas = facturacion.estado_reservas(cursor, id_restaurante, [data['id_reserva']])
+        id_cliente = facturacion.validar_reserva(reservas, data['id_reserva'], data.get('id_cliente'))
+        precios = facturacion.precios_platos(cursor, id_restaurante, list(lineas))
+        id_factura, precio = facturacion.insertar_factura(cursor, id_restaurante, data['id_reserva'],
+                                                          id_cliente, lineas, precios)
+        rollups.sumar_factura(cursor, id_factura)
         conexion.connection.commit()
-        print(f"Factura {id_factura} creada con {len(data['platos'])} platos")
-        
+        refrescar_mercado(cursor, id_restaurante)
+
         return jsonify({
             'mensaje': 'Factura creada exitosamente',
             'id_factura': id_factura,
+            'precio': float(precio),
             'exito': True
         }), 200
-        
+
+    except ValueError as ex:
+        return jsonify({'mensaje': str(ex), 'exito': False}), 400
     except Exception as ex:
-        print(f"Error al crear factura: {ex}")
-        import traceback
-        print(traceback.format_exc())
+        current_app.logger.exception("Error al crear factura")
         return jsonify({'mensaje': str(ex), 'exito': False}), 500
 
-@app.route('/api/reservas/update/<id_reserva>', methods=['PUT'])
+@api_bp.route('/api/restaurantes/<id_restaurante>/facturas/lote', methods=['POST'])
+def crear_facturas_lote(id_restaurante):
+    """Cierre de servicio: crea muchas facturas y confirma cada FACTURAS_LOTE.
+
+    Cuerpo: {'facturas': [{'id_reserva', 'id_cliente' (opcional), 'platos'}]}.
+    Una factura que falla se deshace con un SAVEPOINT sin afectar al resto y
+    se devuelve el resultado de cada una en el orden recibido.
+    """
+    resultados, confirmados = [], 0
+    try:
+        facturas = (request.get_json(silent=True) or {}).get('facturas')
+        if not isinstance(facturas, list) or not facturas:
+            raise ValueError('Se esperaba una lista facturas con al menos una factura')
+        if len(facturas) > current_app.config['FACTURAS_LOTE_MAX']:
+            raise ValueError(f"Como máximo {current_app.config['FACTURAS_LOTE_MAX']} facturas por petición")
+        lote = current_app.config['FACTURAS_LOTE']
+        cursor = conexion.cursor()
+
+        for inicio in range(0, len(facturas), lote):
+            bloque = facturas[inicio:inicio + lote]
+            marcar_lote()
+            # Una consulta de precios y otra de reservas por lote, bloqueadas hasta su commit
+            precios = facturacion.precios_platos(cursor, id_restaurante)
+            ids_reserva = {f.get('id_reserva') for f in bloque
+                           if isinstance(f, dict) and isinstance(f.get('id_reserva'), str)}
+            reservas = facturacion.estado_reservas(cursor, id_restaurante, ids_reserva)
+            creadas = []
+            for indice, factura in enumerate(bloque, start=inicio):
+                try:
+                    if not isinstance(factura, dict):
+                        raise ValueError('Cada factura debe ser un objeto')
+                    id_reserva = factura.get('id_reserva')
+                    id_cliente = facturacion.validar_reserva(reservas, id_reserva, factura.get('id_cliente'))
+                    lineas = facturacion.leer_lineas(factura.get('platos'))
+                except ValueError as ex:
+                    resultados.append({'indice': indice, 'exito': False, 'mensaje': str(ex)})
+                    continue
+                cursor.execute("SAVEPOINT factura")
+                try:
+                    id_factura, precio = facturacion.insertar_factura(cursor, id_restaurante, id_reserva,
+                                                                      id_cliente, lineas, precios)
+                except Exception as ex:
+                    cursor.execute("ROLLBACK TO SAVEPOINT factura")
+                    resultados.append({'indice': indice, 'exito': False, 'mensaje': str(ex)})
+                    continue
+                cursor.execute("RELEASE SAVEPOINT factura")
+                reservas[id_reserva][1] = id_factura  # la misma reserva no se factura dos veces
+                creadas.append(id_factura)
+                resultados.append({'indice': indice, 'exito': True, 'id_factura': id_factura,
+                                   'precio': float(precio)})
+            rollups.sumar_facturas(cursor, creadas)
+            conexion.connection.commit()
+            confirmados = len(resultados)
+
+        refrescar_mercado(cursor, id_restaurante)
+        creadas = sum(1 for r in resultados if r['exito'])
+        return jsonify({
+            'mensaje': f'{creadas} de {len(facturas)} facturas creadas',
+            'creadas': creadas,
+            'resultados': resultados,
+            'exito': True
+        }), 200
+
+    except ValueError as ex:
+        return jsonify({'mensaje': str(ex), 'exito': False}), 400
+    except Exception as ex:
+        # Los lotes anteriores ya están confirmados: se devuelve lo que se llegó a procesar
+        current_app.logger.exception("Error al crear facturas en lote")
+        return jsonify({'mensaje': str(ex), 'resultados': resultados[:confirmados], 'exito': False}), 500
+
+@api_bp.route('/api/reservas/update/<id_reserva>', methods=['PUT'])
 def actualizar_reserva(id_reserva):
     try:
         data = request.json
-        cursor = conexion.connection.cursor()
+        cursor = conexion.cursor()
+        # La fecha y los comensales cuentan en los resúmenes: se resta la
+        # versión anterior y se suma la nueva en la misma transacción
+        cursor.execute("SELECT ID_RESTAURANTE FROM reservas WHERE ID_RESERVA = %s FOR UPDATE", (id_reserva,))
+        reserva = cursor.fetchone()
+        if reserva is None:
+            return jsonify({'mensaje': 'Reserva no encontrada', 'exito': False}), 404
+        fecha, hora, inicio, personas = leer_reserva(data)
+        indice_disponibilidad.comprobar(cursor, reserva[0], fecha, inicio, personas, excluir=id_reserva)
+        rollups.sumar_reserva(cursor, id_reserva, -1)
+        rollups.sumar_facturas_reserva(cursor, id_reserva, -1)
         sql = """UPDATE reservas 
                  SET FECHA_RESERVA = %s, HORA_RESERVA = %s, NUM_PERSONAS = %s
                  WHERE ID_RESERVA = %s"""
-        cursor.execute(sql, (data['fecha'], data['hora'], data['num_personas'], id_reserva))
+        cursor.execute(sql, (fecha, hora, personas, id_reserva))
+        rollups.sumar_reserva(cursor, id_reserva)
+        rollups.sumar_facturas_reserva(cursor, id_reserva)
+        disponibilidad.tocar_restaurantes(cursor, [reserva[0]])
         conexion.connection.commit()
+        indice_disponibilidad.invalidar()
+        refrescar_mercado(cursor, reserva[0])
         return jsonify({'mensaje': 'Reserva actualizada exitosamente', 'exito': True}), 200
+    except SinDisponibilidad as ex:
+        return jsonify({'mensaje': str(ex), 'alternativas': ex.alternativas, 'exito': False}), 409
+    except ValueError as ex:
+        return jsonify({'mensaje': str(ex), 'exito': False}), 400
     except Exception as ex:
         print(f"Error al actualizar reserva: {str(ex)}")
         return jsonify({'mensaje': 'Error al actualizar la reserva', 'exito': False}), 400
 
-@app.route('/api/reservas/cancel/<id_reserva>', methods=['DELETE'])
+@api_bp.route('/api/reservas/cancel/<id_reserva>', methods=['DELETE'])
 def cancelar_reserva(id_reserva):
     try:
-        cursor = conexion.connection.cursor()
+        cursor = conexion.cursor()
+        cursor.execute("SELECT ID_RESTAURANTE FROM reservas WHERE ID_RESERVA = %s FOR UPDATE", (id_reserva,))
+        reserva = cursor.fetchone()
+        rollups.sumar_reserva(cursor, id_reserva, -1)
         sql = "DELETE FROM reservas WHERE ID_RESERVA = %s"
         cursor.execute(sql, (id_reserva,))
+        if reserva:
+            disponibilidad.tocar_restaurantes(cursor, [reserva[0]])
         conexion.connection.commit()
+        indice_disponibilidad.invalidar()
         return jsonify({'mensaje': 'Reserva cancelada exitosamente', 'exito': True}), 200
     except Exception as ex:
         print(f"Error al cancelar reserva: {str(ex)}")
         return jsonify({'mensaje': 'Error al cancelar la reserva', 'exito': False}), 400
 
-@app.route('/api/resenas/<id_cliente>', methods=['GET'])
+@api_bp.route('/api/resenas/<id_cliente>', methods=['GET'])
 def listar_resenas_cliente(id_cliente):
     print(f"=== OBTENER RESEÑAS DEL CLIENTE {id_cliente} ===")
     try:
-        cursor = conexion.connection.cursor()
+        cursor = conexion.cursor()
         sql = """SELECT ID_FACTURA, VALORACION, TIPO_VISITA, ID_RESTAURANTE
                  FROM facturas
                  WHERE ID_CLIENTE = %s AND VALORACION IS NOT NULL"""
@@ -361,13 +715,13 @@ def listar_resenas_cliente(id_cliente):
         print(f"Error al obtener reseñas: {str(ex)}")
         return jsonify({'mensaje': f'Error: {str(ex)}'}), 500
 
-@app.route('/api/resenas', methods=['POST'])
+@api_bp.route('/api/resenas', methods=['POST'])
 def crear_resena():
     print("=== CREAR RESEÑA ===")
     print("Datos recibidos:", request.json)
     try:
         data = request.json
-        cursor = conexion.connection.cursor()
+        cursor = conexion.cursor()
         
         # Buscar si existe una factura asociada a esta reserva/cliente/restaurante
         sql_check = """SELECT ID_FACTURA, VALORACION FROM facturas 
@@ -406,18 +760,20 @@ def crear_resena():
         print(traceback.format_exc())
         return jsonify({'mensaje': 'Error al guardar la reseña', 'exito': False, 'error': str(ex)}), 400
 
-@app.route('/api/facturas/<id_cliente>', methods=['GET'])
+@api_bp.route('/api/facturas/<id_cliente>', methods=['GET'])
 def listar_facturas_cliente(id_cliente):
     try:
-        cursor = conexion.connection.cursor()
-        sql = """SELECT f.ID_FACTURA, f.PRECIO, f.VALORACION, f.TIPO_VISITA,
-                 f.FECHA_FACTURA, rest.NOMBRE, rest.CIUDAD, f.ID_RESERVA, f.ID_RESTAURANTE
-                 FROM facturas f
-                 JOIN restaurantes rest ON f.ID_RESTAURANTE = rest.ID_RESTAURANTE
-                 WHERE f.ID_CLIENTE = %s
-                 ORDER BY f.FECHA_FACTURA DESC"""
-        cursor.execute(sql, (id_cliente,))
-        datos = cursor.fetchall()
+        pagina = leer_pagina()
+        cursor = conexion.cursor()
+        sql, params = sql_pagina("""SELECT f.ID_FACTURA, f.PRECIO, f.VALORACION, f.TIPO_VISITA,
+                                    f.FECHA_FACTURA, rest.NOMBRE, rest.CIUDAD, f.ID_RESERVA, f.ID_RESTAURANTE
+                                    FROM facturas f
+                                    JOIN restaurantes rest ON f.ID_RESTAURANTE = rest.ID_RESTAURANTE""",
+                                 ["f.ID_CLIENTE = %s"], (id_cliente,), pagina,
+                                 ('f.FECHA_FACTURA', 'f.ID_FACTURA'))
+        cursor.execute(sql, params)
+        datos, siguiente = paginacion.cortar(cursor.fetchall(), pagina.limite,
+                                             lambda fila: (fila[4], fila[0]))
         facturas = []
         for fila in datos:
             factura = {
@@ -432,17 +788,26 @@ def listar_facturas_cliente(id_cliente):
                 'id_restaurante': fila[8]
             }
             facturas.append(factura)
-        print(f"DEBUG: Facturas encontradas para cliente {id_cliente}: {len(facturas)}")
-        return jsonify({'facturas': facturas, 'total': len(facturas)})
+        respuesta = {'facturas': facturas, 'siguiente': siguiente}
+        if not pagina.despues:
+            condiciones, params = paginacion.filtros(pagina, ('FECHA_FACTURA',))
+            cursor.execute(f"""SELECT COUNT(*), COALESCE(SUM(PRECIO), 0) FROM facturas
+                               WHERE {' AND '.join(['ID_CLIENTE = %s'] + condiciones)}""",
+                           (id_cliente, *params))
+            total, importe = cursor.fetchone()
+            respuesta['total'], respuesta['importe_total'] = total, float(importe)
+        return jsonify(respuesta)
+    except ValueError as ex:
+        return jsonify({'mensaje': str(ex)}), 400
     except Exception as ex:
         print(f"ERROR en facturas: {str(ex)}")
         return jsonify({'mensaje': f'Error: {str(ex)}', 'facturas': []}), 500
 
-@app.route('/api/reservas/<id_reserva>/factura', methods=['POST'])
+@api_bp.route('/api/reservas/<id_reserva>/factura', methods=['POST'])
 def generar_factura_reserva(id_reserva):
     try:
         print(f"=== GENERAR FACTURA PARA RESERVA {id_reserva} ===")
-        cursor = conexion.connection.cursor()
+        cursor = conexion.cursor()
         
         # Obtener información de la reserva
         sql_reserva = """SELECT ID_CLIENTE, ID_RESTAURANTE, FECHA_RESERVA 
@@ -470,11 +835,7 @@ def generar_factura_reserva(id_reserva):
             }), 200
         
         # Generar nueva factura
-        import random
-        import string
-        from datetime import datetime
-        
-        id_factura = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
+        id_factura = identificadores.facturas.siguiente()
         precio = round(random.uniform(30, 150), 2)  # Precio aleatorio entre 30 y 150€
         fecha_factura = datetime.now().strftime('%Y-%m-%d')
         
@@ -483,7 +844,9 @@ def generar_factura_reserva(id_reserva):
                         VALUES (%s, %s, %s, %s, %s, %s, NULL)"""
         cursor.execute(sql_insert, (id_factura, id_cliente, id_reserva, 
                                      precio, fecha_factura, id_restaurante))
+        rollups.sumar_factura(cursor, id_factura)
         conexion.connection.commit()
+        refrescar_mercado(cursor, id_restaurante)
         
         print(f"Factura {id_factura} generada correctamente para reserva {id_reserva}")
         return jsonify({
@@ -499,23 +862,31 @@ def generar_factura_reserva(id_reserva):
         print(traceback.format_exc())
         return jsonify({'mensaje': str(ex), 'exito': False}), 500
 
-@app.route('/api/clientes/buscar', methods=['GET'])
+@api_bp.route('/api/clientes/buscar', methods=['GET'])
 def buscar_clientes():
+    """?id= busca un cliente exacto; ?q= busca en nombre, email y teléfono y ?nombre= solo en el nombre.
+
+    Las búsquedas de texto no distinguen acentos ni mayúsculas, admiten subcadenas
+    y prefijos y usan el índice de trigramas de busqueda.py; necesitan al menos
+    una palabra de 3 caracteres (400 si no).
+    """
     try:
         nombre = request.args.get('nombre', '')
+        texto = request.args.get('q', '')
         id_cliente = request.args.get('id', '')
-        cursor = conexion.connection.cursor()
+        cursor = conexion.cursor()
         
         if id_cliente:
             sql = "SELECT ID_CLIENTE, N_CLIENTE, NUM_TELEFONO, EMAIL, ESTUDIOS, SEXO, EDAD FROM clientes WHERE ID_CLIENTE = %s"
             cursor.execute(sql, (id_cliente,))
-        elif nombre:
-            sql = "SELECT ID_CLIENTE, N_CLIENTE, NUM_TELEFONO, EMAIL, ESTUDIOS, SEXO, EDAD FROM clientes WHERE N_CLIENTE LIKE %s"
-            cursor.execute(sql, (f'%{nombre}%',))
+            datos = cursor.fetchall()
+        elif texto or nombre:
+            limite = leer_limite(current_app.config['BUSQUEDA_LIMITE'], current_app.config['BUSQUEDA_LIMITE_MAX'])
+            campos = busqueda.CAMPOS_CLIENTE if texto else ('nombre',)
+            datos = busqueda.buscar_clientes(cursor, texto or nombre, campos, limite)
         else:
-            return jsonify({'clientes': [], 'mensaje': 'Debe proporcionar nombre o ID'})
+            return jsonify({'clientes': [], 'mensaje': 'Debe proporcionar nombre, q o ID'})
         
-        datos = cursor.fetchall()
         clientes = []
         for fila in datos:
             cliente = {
@@ -529,28 +900,112 @@ def buscar_clientes():
             }
             clientes.append(cliente)
         return jsonify({'clientes': clientes, 'mensaje': f'{len(clientes)} cliente(s) encontrado(s)'})
+    except ValueError as ex:
+        return jsonify({'mensaje': str(ex)}), 400
     except Exception as ex:
         return jsonify({'mensaje': f'Error: {str(ex)}'}), 500
 
-@app.route('/clientes', methods=['GET'])
+COLUMNAS_CLIENTE = ('ID_CLIENTE', 'N_CLIENTE', 'NUM_TELEFONO', 'EMAIL', 'ESTUDIOS', 'SEXO', 'EDAD')
+
+def leer_exportacion_clientes():
+    """Columnas y filtros de GET /clientes.
+
+    ?campos=ID_CLIENTE,EMAIL elige columnas; ?sexo=, ?estudios=, ?nombre= (contiene),
+    ?edad_min= y ?edad_max= filtran.
+    """
+    campos = COLUMNAS_CLIENTE
+    if request.args.get('campos'):
+        campos = tuple(c.strip().upper() for c in request.args['campos'].split(',') if c.strip())
+        desconocidos = [c for c in campos if c not in COLUMNAS_CLIENTE]
+        if desconocidos or not campos:
+            raise ValueError(f"campos debe ser una lista de: {', '.join(COLUMNAS_CLIENTE)}")
+    condiciones, params = [], []
+    for parametro, columna in (('sexo', 'SEXO'), ('estudios', 'ESTUDIOS')):
+        if request.args.get(parametro):
+            condiciones.append(f"{columna} = %s")
+            params.append(request.args[parametro])
+    if request.args.get('nombre'):
+        condiciones.append("N_CLIENTE LIKE %s")
+        params.append(f"%{request.args['nombre']}%")
+    for parametro, operador in (('edad_min', '>='), ('edad_max', '<=')):
+        valor = request.args.get(parametro)
+        if valor:
+            if not valor.isdigit():
+                raise ValueError(f'{parametro} debe ser un número entero')
+            condiciones.append(f"EDAD {operador} %s")
+            params.append(int(valor))
+    return campos, condiciones, params
+
+def filas_cliente(cursor, campos, lote):
+    """Recorre el cursor de servidor por lotes: nunca hay más de `lote` filas en memoria."""
+    while True:
+        filas = cursor.fetchmany(lote)
+        if not filas:
+            return
+        yield [dict(zip(campos, fila)) for fila in filas]
+
+@api_bp.route('/clientes', methods=['GET'])
 def listar_clientes():
+    """Exportación de clientes en streaming.
+
+    Por defecto responde el mismo JSON de siempre ({'clientes': [...], 'mensaje': ...})
+    pero generado por fragmentos; con ?formato=ndjson envía un cliente por línea.
+    Las filas salen de un cursor de servidor, así que la memoria del worker no
+    depende del número de clientes.
+    """
     try:
-        cursor = conexion.connection.cursor()
-        sql= "SELECT ID_CLIENTE, N_CLIENTE, NUM_TELEFONO, EMAIL, ESTUDIOS, SEXO, EDAD FROM clientes"
-        cursor.execute(sql)
-        datos = cursor.fetchall()
-        clientes = []
-        for fila in datos:
-            cliente = {'ID_CLIENTE':fila[0], 'N_CLIENTE':fila[1], 'NUM_TELEFONO':fila[2], 'EMAIL':fila[3], 'ESTUDIOS':fila[4], 'SEXO':fila[5], 'EDAD':fila[6]}
-            clientes.append(cliente)
-        return jsonify({'clientes':clientes, 'mensaje': "Clientes listados."})
-    except Exception as ex:
-        return jsonify({'mensaje': "Error"})
+        formato = request.args.get('formato', 'json')
+        if formato not in ('json', 'ndjson'):
+            raise ValueError('formato debe ser json o ndjson')
+        campos, condiciones, params = leer_exportacion_clientes()
+        sql = f"SELECT {', '.join(campos)} FROM clientes"
+        if condiciones:
+            sql += " WHERE " + " AND ".join(condiciones)
+    except ValueError as ex:
+        return jsonify({'mensaje': str(ex)}), 400
+
+    lote = current_app.config['EXPORTACION_LOTE']
+    a_json = lambda cliente: json.dumps(cliente, ensure_ascii=False, default=str)
+
+    def leer():
+        # Flask ejecuta el teardown de la petición (que cierra los cursores y
+        # devuelve la conexión al pool) antes de empezar a enviar la respuesta,
+        # así que el cursor se abre aquí, ya dentro del contexto del streaming
+        cursor = conexion.cursor_servidor()
+        cursor.execute(sql, params)
+        return filas_cliente(cursor, campos, lote)
+
+    def ndjson():
+        try:
+            for clientes in leer():
+                yield ''.join(a_json(cliente) + '\n' for cliente in clientes)
+        except Exception as ex:
+            current_app.logger.exception("Error exportando clientes")
+            yield a_json({'error': str(ex)}) + '\n'
+
+    def array_json():
+        # Si algo falla a mitad, el JSON queda sin cerrar y el cliente lo detecta al parsearlo
+        yield '{"clientes": ['
+        separador = ''
+        try:
+            for clientes in leer():
+                yield separador + ', '.join(a_json(cliente) for cliente in clientes)
+                separador = ', '
+        except Exception:
+            current_app.logger.exception("Error exportando clientes")
+            return
+        yield '], "mensaje": "Clientes listados."}'
+
+    if formato == 'ndjson':
+        return current_app.response_class(stream_with_context(ndjson()),
+                                          mimetype='application/x-ndjson; charset=utf-8')
+    return current_app.response_class(stream_with_context(array_json()),
+                                      mimetype='application/json; charset=utf-8')
     
-@app.route('/clientes/<codigo>', methods=['GET'])
+@api_bp.route('/clientes/<codigo>', methods=['GET'])
 def leer_cliente(codigo):
     try: 
-        cursor= conexion.connection.cursor()
+        cursor= conexion.cursor()
         sql= "SELECT ID_CLIENTE, N_CLIENTE, NUM_TELEFONO, EMAIL, ESTUDIOS, SEXO, EDAD FROM clientes WHERE ID_CLIENTE = {0}".format(codigo)
         cursor.execute(sql)
         datos = cursor.fetchone()
@@ -562,17 +1017,18 @@ def leer_cliente(codigo):
     except Exception as ex:
         return jsonify({'mensaje': "Error"})    
 
-@app.route('/clientes', methods=['POST'])
+@api_bp.route('/clientes', methods=['POST'])
 def registrar_cliente():
     print("=== REGISTRO DE CLIENTE ===")
     print("Datos recibidos:", request.json)
     try:
-        cursor= conexion.connection.cursor()
+        cursor= conexion.cursor()
         sql="""INSERT INTO clientes (ID_CLIENTE, N_CLIENTE, NUM_TELEFONO, EMAIL, ESTUDIOS, SEXO, EDAD) 
         VALUES ('{0}','{1}',{2},'{3}','{4}','{5}',{6})""".format(request.json['ID_CLIENTE'], 
         request.json['N_CLIENTE'], request.json['NUM_TELEFONO'], request.json['EMAIL'], request.json['ESTUDIOS'], request.json['SEXO'], request.json['EDAD'])
         print("SQL:", sql)
         cursor.execute(sql)
+        busqueda.indexar_cliente(cursor, request.json['ID_CLIENTE'])
         conexion.connection.commit()
         print("Cliente registrado exitosamente")
         return jsonify({'mensaje': "Cliente registrado exitosamente.", 'exito': True}), 200
@@ -581,40 +1037,42 @@ def registrar_cliente():
         error_msg = "El cliente ya existe" if "Duplicate entry" in str(ex) else "Error al registrar el cliente"
         return jsonify({'mensaje': error_msg, 'exito': False, 'error': str(ex)}), 400 
 
-@app.route('/clientes/<codigo>', methods=['PUT'])
+@api_bp.route('/clientes/<codigo>', methods=['PUT'])
 def actualizar_cliente_legacy(codigo):
     try:
-        cursor= conexion.connection.cursor()
+        cursor= conexion.cursor()
         sql="""UPDATE clientes 
         SET N_CLIENTE = '{0}', NUM_TELEFONO = {1}, EMAIL = '{2}', ESTUDIOS = '{3}', SEXO = '{4}', EDAD = {5} 
         WHERE ID_CLIENTE = '{6}'""".format(request.json['N_CLIENTE'], 
         request.json['NUM_TELEFONO'], request.json['EMAIL'], request.json['ESTUDIOS'], request.json['SEXO'], request.json['EDAD'], codigo)
         cursor.execute(sql)
+        busqueda.indexar_cliente(cursor, codigo)
         conexion.connection.commit()
         return jsonify({'mensaje': "Cliente actualizado."})
     except Exception as ex:
         return jsonify({'mensaje': "Error"})
     
 
-@app.route('/clientes/<codigo>', methods=['DELETE'])
+@api_bp.route('/clientes/<codigo>', methods=['DELETE'])
 def eliminar_cliente_legacy(codigo):
     try:
-        cursor= conexion.connection.cursor()
+        cursor= conexion.cursor()
         sql="DELETE FROM clientes WHERE ID_CLIENTE = '{0}'".format(codigo)
         cursor.execute(sql)
+        busqueda.desindexar_cliente(cursor, codigo)
         conexion.connection.commit()
         return jsonify({'mensaje': "Cliente eliminado."})
     except Exception as ex:
         return jsonify({'mensaje': "Error"}) 
 
-@app.route('/api/clientes/<string:id_cliente>', methods=['PUT'])
+@api_bp.route('/api/clientes/<string:id_cliente>', methods=['PUT'])
 def actualizar_cliente(id_cliente):
     try:
         print(f"=== ACTUALIZAR CLIENTE {id_cliente} ===")
         data = request.json
         print(f"Datos recibidos: {data}")
         
-        cursor = conexion.connection.cursor()
+        cursor = conexion.cursor()
         
         # Verificar que el cliente existe
         cursor.execute("SELECT ID_CLIENTE FROM clientes WHERE ID_CLIENTE = %s", (id_cliente,))
@@ -633,6 +1091,7 @@ def actualizar_cliente(id_cliente):
             data['estudios'],
             id_cliente
         ))
+        busqueda.indexar_cliente(cursor, id_cliente)
         conexion.connection.commit()
         
         print(f"Cliente {id_cliente} actualizado correctamente")
@@ -644,18 +1103,23 @@ def actualizar_cliente(id_cliente):
         print(traceback.format_exc())
         return jsonify({'mensaje': str(ex)}), 500
 
-@app.route('/api/clientes/<string:id_cliente>', methods=['DELETE'])
+@api_bp.route('/api/clientes/<string:id_cliente>', methods=['DELETE'])
 def eliminar_cliente(id_cliente):
     try:
         print(f"=== ELIMINAR CLIENTE {id_cliente} ===")
         
-        cursor = conexion.connection.cursor()
+        cursor = conexion.cursor()
         
         # Verificar que el cliente existe
         cursor.execute("SELECT ID_CLIENTE FROM clientes WHERE ID_CLIENTE = %s", (id_cliente,))
         if not cursor.fetchone():
             return jsonify({'mensaje': 'Cliente no encontrado'}), 404
         
+        # Restar del resumen de analytics lo que se va a borrar
+        rollups.restar_cliente(cursor, id_cliente)
+        cursor.execute("SELECT DISTINCT ID_RESTAURANTE FROM reservas WHERE ID_CLIENTE = %s", (id_cliente,))
+        disponibilidad.tocar_restaurantes(cursor, [fila[0] for fila in cursor.fetchall()])
+        
         # Eliminar en cascada:
         # 1. Eliminar comandas asociadas a facturas del cliente
         cursor.execute("""DELETE FROM comandas 
@@ -674,9 +1138,13 @@ def eliminar_cliente(id_cliente):
         
         # 5. Finalmente, eliminar el cliente
         cursor.execute("DELETE FROM clientes WHERE ID_CLIENTE = %s", (id_cliente,))
+        busqueda.desindexar_cliente(cursor, id_cliente)
         
         conexion.connection.commit()
         
+        mercado.invalidar()
+        indice_disponibilidad.invalidar()
+        
         print(f"Cliente {id_cliente} eliminado correctamente (con todas sus dependencias)")
         return jsonify({'mensaje': 'Cliente eliminado correctamente'})
         
@@ -686,10 +1154,10 @@ def eliminar_cliente(id_cliente):
         print(traceback.format_exc())
         return jsonify({'mensaje': str(ex)}), 500
 
-@app.route('/api/alergenos', methods=['GET'])
+@api_bp.route('/api/alergenos', methods=['GET'])
 def listar_alergenos():
     try:
-        cursor = conexion.connection.cursor()
+        cursor = conexion.cursor()
         sql = "SELECT ALERGENO, NUM_ALERGENO FROM alergenos ORDER BY ALERGENO"
         cursor.execute(sql)
         datos = cursor.fetchall()
@@ -706,326 +1174,349 @@ def listar_alergenos():
 
 # ===== ANALYTICS ENDPOINTS =====
 
-@app.route('/api/restaurantes/<id_restaurante>/analytics/sin-valorar', methods=['GET'])
+# Mapeo de días (MySQL DAYOFWEEK: 1=Domingo, 2=Lunes, ..., 7=Sábado)
+DIAS_MYSQL = {
+    1: 'Domingo', 2: 'Lunes', 3: 'Martes', 4: 'Miércoles',
+    5: 'Jueves', 6: 'Viernes', 7: 'Sábado'
+}
+DIAS_SEMANA = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
+
+# Cada métrica del área de restaurante se calcula con una de estas funciones.
+# Las agregadas (gasto medio, reservas por día, top de platos, mercado) leen
+# las tablas resumen de rollups.py, así que su coste no crece con el
+# histórico. El endpoint /analytics/dashboard las combina todas y los
+# endpoints individuales son vistas finas sobre las mismas funciones.
+
+def clientes_sin_valorar_de(cursor, id_restaurante):
+    """Clientes con factura sin valorar en el restaurante, de la más reciente a la más antigua."""
+    sql = """SELECT f.ID_FACTURA, f.FECHA_FACTURA, c.ID_CLIENTE, c.N_CLIENTE, c.EMAIL, c.NUM_TELEFONO
+             FROM facturas f
+             JOIN clientes c ON f.ID_CLIENTE = c.ID_CLIENTE
+             WHERE f.ID_RESTAURANTE = %s
+             AND f.VALORACION IS NULL
+             ORDER BY f.FECHA_FACTURA DESC"""
+    cursor.execute(sql, (id_restaurante,))
+    clientes = []
+    for id_factura, fecha, id_cliente, nombre, email, telefono in cursor.fetchall():
+        clientes.append({
+            'id_cliente': id_cliente,
+            'nombre': nombre,
+            'email': email or 'No disponible',
+            'telefono': telefono or 'No disponible',
+            'id_factura': id_factura,
+            'fecha_visita': str(fecha) if fecha else ''
+        })
+    return clientes
+
+def datos_dias_semana(cursor, id_restaurante):
+    """Reservas por día de la semana, de lunes a domingo."""
+    dias_data = {dia: 0 for dia in DIAS_SEMANA}
+    for dia_num, total in rollups.reservas_por_dia_semana(cursor, id_restaurante):
+        if dia_num in DIAS_MYSQL:
+            dias_data[DIAS_MYSQL[dia_num]] = int(total)
+    return {'dias': DIAS_SEMANA, 'valores': [dias_data[dia] for dia in DIAS_SEMANA]}
+
+def dia_mas_concurrido_de(datos_dias):
+    """Día con más reservas a partir de datos_dias_semana()."""
+    total = max(datos_dias['valores'], default=0)
+    if not total:
+        return {'dia': 'N/A', 'total': 0}
+    return {'dia': datos_dias['dias'][datos_dias['valores'].index(total)], 'total': total}
+
+def consultar_top_platos(cursor, id_restaurante, limite=3, desde=None, hasta=None, por_tipo=False):
+    """Platos más pedidos del restaurante, opcionalmente el top N de cada T_PLATO.
+
+    Sin rango de fechas se lee el total acumulado de resumen_platos; con
+    desde/hasta hay que ir a las comandas de ese periodo.
+    """
+    if not desde and not hasta:
+        return [fila_a_plato_pedido(fila) for fila in
+                rollups.top_platos(cursor, id_restaurante, limite, por_tipo)]
+    
+    filtros = "f.ID_RESTAURANTE = %s"
+    params = [id_restaurante]
+    if desde:
+        filtros += " AND f.FECHA_FACTURA >= %s"
+        params.append(desde)
+    if hasta:
+        filtros += " AND f.FECHA_FACTURA <= %s"
+        params.append(hasta)
+    
+    # Una sola consulta: facturas → comandas → platos (para el T_PLATO),
+    # con ROW_NUMBER por tipo cuando se agrupa
+    particion = "PARTITION BY p.T_PLATO " if por_tipo else ""
+    sql = f"""SELECT N_PLATO, T_PLATO, total_pedidos FROM (
+                 SELECT c.N_PLATO, p.T_PLATO, SUM(c.NUM_PEDIDOS) as total_pedidos,
+                        ROW_NUMBER() OVER ({particion}ORDER BY SUM(c.NUM_PEDIDOS) DESC, c.N_PLATO) as puesto
+                 FROM facturas f
+                 JOIN comandas c ON f.ID_FACTURA = c.ID_FACTURA AND f.ID_RESTAURANTE = c.ID_RESTAURANTE
+                 LEFT JOIN platos p ON p.ID_RESTAURANTE = c.ID_RESTAURANTE AND p.N_PLATO = c.N_PLATO
+                 WHERE {filtros}
+                 GROUP BY c.N_PLATO, p.T_PLATO
+             ) ranking
+             WHERE puesto <= %s
+             ORDER BY {"FIELD(T_PLATO, 'ENTRANTE', 'PRINCIPAL', 'POSTRE', 'BEBIDA'), " if por_tipo else ""}puesto"""
+    params.append(limite)
+    cursor.execute(sql, params)
+    return [fila_a_plato_pedido(fila) for fila in cursor.fetchall()]
+
+def fila_a_plato_pedido(fila):
+    return {
+        'nombre': fila[0],
+        'tipo': fila[1] or 'N/A',
+        'total_pedidos': int(fila[2]) if fila[2] else 0
+    }
+
+ESTRELLAS_MICHELIN = (0, 1, 2, 3)
+
+def leer_grupo_mercado():
+    """Filtros opcionales del grupo de pares: ?ccaa=<comunidad>&estrellas=<0-3>."""
+    ccaa = request.args.get('ccaa', '').strip() or None
+    estrellas = request.args.get('estrellas')
+    if estrellas is not None:
+        if not estrellas.isdigit() or int(estrellas) not in ESTRELLAS_MICHELIN:
+            raise ValueError('estrellas debe ser un entero entre 0 y 3')
+        estrellas = int(estrellas)
+    return ccaa, estrellas
+
+def datos_precio_comparativo(id_restaurante, ccaa=None, estrellas=None):
+    """Gasto medio por persona del restaurante frente al de su grupo de pares.
+
+    Se responde desde los histogramas en memoria de mercado.py, sin recorrer
+    facturas. Devuelve None si el grupo no tiene al menos dos restaurantes.
+    """
+    snapshot = mercado.actual(conexion.cursor)
+    grupo = snapshot.grupo(ccaa, estrellas)
+    if grupo is None or grupo.n < 2:
+        return None
+    
+    gasto_restaurante = snapshot.gasto(id_restaurante)
+    return {
+        'gasto_restaurante': gasto_restaurante,
+        'media': grupo.media,
+        'desviacion': grupo.desviacion,
+        'percentil': grupo.percentil(gasto_restaurante) if gasto_restaurante else None,
+        'total': grupo.n
+    }
+
+def refrescar_mercado(cursor, id_restaurante):
+    """Aplica al mercado en memoria el nuevo gasto de un restaurante tras un commit."""
+    try:
+        restaurante = catalogo.buscar(catalogo.actual(conexion.cursor), id_restaurante)
+        if restaurante:
+            mercado.actualizar_restaurante(cursor, restaurante)
+    except Exception as ex:
+        # Los datos ya están guardados; el mercado se pondrá al día al vencer el TTL
+        current_app.logger.warning("No se pudo actualizar el mercado de precios: %s", ex)
+
+def json_precio_comparativo(datos):
+    gasto_restaurante = datos['gasto_restaurante']
+    percentil = datos['percentil']
+    return {
+        'gasto_restaurante': round(gasto_restaurante, 2) if gasto_restaurante else None,
+        'media_mercado': round(datos['media'], 2),
+        'desviacion': round(datos['desviacion'], 2),
+        'percentil': round(percentil, 1) if percentil else None,
+        'total_restaurantes': datos['total']
+    }
+
+def spec_precio_comparativo(datos):
+    # Solo los datos que influyen en el dibujo forman parte de la huella
+    return {
+        'media': round(datos['media'], 4),
+        'desviacion': round(datos['desviacion'], 4),
+        'total': datos['total'],
+        'gasto_restaurante': round(datos['gasto_restaurante'], 4) if datos['gasto_restaurante'] else None
+    }
+
+def calcular_dashboard(cursor, id_restaurante, formato='png', limite_platos=3):
+    """Todas las métricas de la pestaña de analytics."""
+    gasto = rollups.gasto_medio(cursor, id_restaurante)
+    dias = datos_dias_semana(cursor, id_restaurante)
+    precio = datos_precio_comparativo(id_restaurante)
+
+    if precio is None:
+        precio_comparativo = None
+    else:
+        precio_comparativo = json_precio_comparativo(precio)
+        precio_comparativo['imagen_url'] = url_for('.grafico_precio_comparativo_imagen',
+                                                   id_restaurante=id_restaurante, formato=formato)
+    return {
+        'sin_valorar': clientes_sin_valorar_de(cursor, id_restaurante),
+        'gasto_medio': round(gasto, 2) if gasto else 0,
+        'dia_mas_concurrido': dia_mas_concurrido_de(dias),
+        'reservas_por_dia': {
+            'dias': dias['dias'],
+            'valores': dias['valores'],
+            'imagen_url': url_for('.grafico_dias_semana_imagen', id_restaurante=id_restaurante, formato=formato)
+        },
+        'top_platos': consultar_top_platos(cursor, id_restaurante, limite_platos),
+        'precio_comparativo': precio_comparativo
+    }
+
+@api_bp.route('/api/restaurantes/<id_restaurante>/analytics/dashboard', methods=['GET'])
+def analytics_dashboard(id_restaurante):
+    try:
+        formato = leer_formato_grafico()
+        limite = leer_limite(current_app.config['TOP_PLATOS_LIMITE'], current_app.config['TOP_PLATOS_LIMITE_MAX'])
+        return jsonify(calcular_dashboard(conexion.cursor(), id_restaurante, formato, limite))
+    except ValueError as ex:
+        return jsonify({'mensaje': str(ex)}), 400
+    except Exception as ex:
+        current_app.logger.exception("Error en analytics_dashboard")
+        return jsonify({'mensaje': f'Error: {str(ex)}'}), 500
+
+@api_bp.route('/api/restaurantes/<id_restaurante>/analytics/sin-valorar', methods=['GET'])
 def clientes_sin_valorar(id_restaurante):
     try:
-        cursor = conexion.connection.cursor()
         # Clientes con factura pero sin valoración para este restaurante
-        sql = """SELECT DISTINCT c.ID_CLIENTE, c.N_CLIENTE, c.EMAIL, c.NUM_TELEFONO,
-                 f.ID_FACTURA, f.FECHA_FACTURA
-                 FROM facturas f
-                 JOIN clientes c ON f.ID_CLIENTE = c.ID_CLIENTE
-                 WHERE f.ID_RESTAURANTE = %s 
-                 AND (f.VALORACION IS NULL)
-                 ORDER BY f.FECHA_FACTURA DESC"""
-        cursor.execute(sql, (id_restaurante,))
-        datos = cursor.fetchall()
-        
-        print(f"Clientes sin valorar encontrados: {len(datos)} para restaurante {id_restaurante}")
-        
-        clientes = []
-        for fila in datos:
-            cliente = {
-                'id_cliente': fila[0],
-                'nombre': fila[1],
-                'email': fila[2] or 'No disponible',
-                'telefono': fila[3] or 'No disponible',
-                'id_factura': fila[4],
-                'fecha_visita': str(fila[5]) if fila[5] else ''
-            }
-            clientes.append(cliente)
-        
+        clientes = clientes_sin_valorar_de(conexion.cursor(), id_restaurante)
         return jsonify({'clientes': clientes})
     except Exception as ex:
-        print(f"Error en clientes_sin_valorar: {ex}")
-        import traceback
-        traceback.print_exc()
+        current_app.logger.exception("Error en clientes_sin_valorar")
         return jsonify({'mensaje': f'Error: {str(ex)}'}), 500
 
-@app.route('/api/restaurantes/<id_restaurante>/analytics/gasto-medio', methods=['GET'])
+@api_bp.route('/api/restaurantes/<id_restaurante>/analytics/gasto-medio', methods=['GET'])
 def gasto_medio_persona(id_restaurante):
     try:
-        cursor = conexion.connection.cursor()
-        # Calcular gasto medio por persona usando facturas y reservas
-        sql = """SELECT AVG(f.PRECIO / r.NUM_PERSONAS) as gasto_medio
-                 FROM facturas f
-                 JOIN reservas r ON f.ID_RESERVA = r.ID_RESERVA
-                 WHERE f.ID_RESTAURANTE = %s"""
-        cursor.execute(sql, (id_restaurante,))
-        resultado = cursor.fetchone()
-        
-        gasto_medio = round(resultado[0], 2) if resultado[0] else 0
-        
-        return jsonify({'gasto_medio': gasto_medio})
+        gasto_medio = rollups.gasto_medio(conexion.cursor(), id_restaurante)
+        return jsonify({'gasto_medio': round(gasto_medio, 2) if gasto_medio else 0})
     except Exception as ex:
         return jsonify({'mensaje': f'Error: {str(ex)}'}), 500
 
-@app.route('/api/restaurantes/<id_restaurante>/analytics/dia-mas-concurrido', methods=['GET'])
+@api_bp.route('/api/restaurantes/<id_restaurante>/analytics/dia-mas-concurrido', methods=['GET'])
 def dia_mas_concurrido(id_restaurante):
     try:
-        cursor = conexion.connection.cursor()
-        # Obtener el día de la semana con más reservas
-        sql = """SELECT DAYNAME(FECHA_RESERVA) as dia, COUNT(*) as total
-                 FROM reservas
-                 WHERE ID_RESTAURANTE = %s
-                 GROUP BY DAYNAME(FECHA_RESERVA), DAYOFWEEK(FECHA_RESERVA)
-                 ORDER BY total DESC
-                 LIMIT 1"""
-        cursor.execute(sql, (id_restaurante,))
-        resultado = cursor.fetchone()
-        
-        if resultado:
-            # Traducir días al español
-            dias_es = {
-                'Monday': 'Lunes', 'Tuesday': 'Martes', 'Wednesday': 'Miércoles',
-                'Thursday': 'Jueves', 'Friday': 'Viernes', 'Saturday': 'Sábado', 'Sunday': 'Domingo'
-            }
-            dia = dias_es.get(resultado[0], resultado[0])
-            total = resultado[1]
-        else:
-            dia = 'N/A'
-            total = 0
-        
-        return jsonify({'dia': dia, 'total': total})
+        return jsonify(dia_mas_concurrido_de(datos_dias_semana(conexion.cursor(), id_restaurante)))
     except Exception as ex:
         return jsonify({'mensaje': f'Error: {str(ex)}'}), 500
 
-@app.route('/api/restaurantes/<id_restaurante>/analytics/top-platos', methods=['GET'])
+@api_bp.route('/api/restaurantes/<id_restaurante>/analytics/top-platos', methods=['GET'])
 def top_platos(id_restaurante):
     try:
-        cursor = conexion.connection.cursor()
-        # Top 3 platos más pedidos - unir facturas → comandas (N_PLATO es el nombre del plato)
-        sql = """SELECT c.N_PLATO, SUM(c.NUM_PEDIDOS) as total_pedidos
-                 FROM facturas f
-                 JOIN comandas c ON f.ID_FACTURA = c.ID_FACTURA
-                 WHERE f.ID_RESTAURANTE = %s
-                 GROUP BY c.N_PLATO
-                 ORDER BY total_pedidos DESC
-                 LIMIT 3"""
-        cursor.execute(sql, (id_restaurante,))
-        datos = cursor.fetchall()
-        
-        print(f"Top platos encontrados: {len(datos)} para restaurante {id_restaurante}")
-        if datos:
-            print(f"Datos: {datos}")
-        
-        platos = []
-        if not datos or len(datos) == 0:
-            # Si no hay comandas, mostrar mensaje
-            print("No se encontraron platos pedidos en comandas")
+        # Parámetros opcionales: limit (3 por defecto), desde/hasta (YYYY-MM-DD)
+        # y agrupar=tipo para obtener el top N de cada T_PLATO
+        limite = leer_limite(current_app.config['TOP_PLATOS_LIMITE'], current_app.config['TOP_PLATOS_LIMITE_MAX'])
+        desde = leer_fecha_param('desde')
+        hasta = leer_fecha_param('hasta')
+        por_tipo = request.args.get('agrupar') == 'tipo'
+        
+        platos = consultar_top_platos(conexion.cursor(), id_restaurante, limite, desde, hasta, por_tipo)
+        if not platos:
             return jsonify({'platos': [], 'mensaje': 'No hay datos de platos pedidos'})
         
-        for fila in datos:
-            # Buscar el tipo de plato en la tabla platos
-            sql_tipo = """SELECT T_PLATO FROM platos 
-                         WHERE ID_RESTAURANTE = %s AND N_PLATO = %s
-                         LIMIT 1"""
-            cursor.execute(sql_tipo, (id_restaurante, fila[0]))
-            tipo_result = cursor.fetchone()
-            tipo = tipo_result[0] if tipo_result else 'N/A'
-            
-            plato = {
-                'nombre': fila[0],
-                'tipo': tipo,
-                'total_pedidos': int(fila[1]) if fila[1] else 0
-            }
-            platos.append(plato)
-        
-        return jsonify({'platos': platos})
+        respuesta = {'platos': platos}
+        if por_tipo:
+            agrupados = {}
+            for plato in platos:
+                agrupados.setdefault(plato['tipo'], []).append(plato)
+            respuesta['por_tipo'] = agrupados
+        return jsonify(respuesta)
+    except ValueError as ex:
+        return jsonify({'mensaje': str(ex)}), 400
     except Exception as ex:
-        print(f"Error en top_platos: {ex}")
-        import traceback
-        traceback.print_exc()
+        current_app.logger.exception("Error en top_platos")
         return jsonify({'mensaje': f'Error: {str(ex)}'}), 500
 
-@app.route('/api/restaurantes/<id_restaurante>/analytics/grafico-dias', methods=['GET'])
+def leer_formato_grafico():
+    """Formato de imagen pedido con ?format= (png por defecto)."""
+    formato = request.args.get('format', 'png').lower()
+    if formato not in FORMATOS_GRAFICO:
+        raise ValueError(f"format debe ser uno de: {', '.join(FORMATOS_GRAFICO)}")
+    return formato
+
+def respuesta_grafico(tipo, id_restaurante, spec, formato='png'):
+    """Imagen con ETag: si el navegador ya tiene esta versión se contesta 304 sin dibujar nada."""
+    etiqueta = huella(spec)
+    if request.if_none_match.contains(etiqueta):
+        respuesta = current_app.response_class(status=304)
+    else:
+        try:
+            if formato == 'svg':
+                imagen = cache_svg.obtener(tipo, id_restaurante, spec, etiqueta)
+            else:
+                imagen = cache_graficos.obtener(tipo, id_restaurante, spec, etiqueta)
+        except ServicioGraficosOcupado as ex:
+            return jsonify({'mensaje': str(ex)}), 503, {'Retry-After': '2'}
+        except TimeoutGrafico as ex:
+            return jsonify({'mensaje': str(ex)}), 504
+        respuesta = current_app.response_class(imagen, mimetype=FORMATOS_GRAFICO[formato])
+    respuesta.set_etag(etiqueta)
+    respuesta.cache_control.no_cache = True  # Revalidar siempre con If-None-Match
+    return respuesta
+
+@api_bp.route('/api/restaurantes/<id_restaurante>/analytics/grafico-dias', methods=['GET'])
 def grafico_dias_semana(id_restaurante):
     try:
-        cursor = conexion.connection.cursor()
-        
-        # Obtener reservas por día de la semana
-        sql = """SELECT 
-                 DAYOFWEEK(FECHA_RESERVA) as dia_num,
-                 DAYNAME(FECHA_RESERVA) as dia_nombre,
-                 COUNT(*) as total
-                 FROM reservas
-                 WHERE ID_RESTAURANTE = %s
-                 GROUP BY DAYOFWEEK(FECHA_RESERVA), DAYNAME(FECHA_RESERVA)
-                 ORDER BY DAYOFWEEK(FECHA_RESERVA)"""
-        cursor.execute(sql, (id_restaurante,))
-        datos = cursor.fetchall()
-        
-        # Mapeo de días (MySQL DAYOFWEEK: 1=Domingo, 2=Lunes, ..., 7=Sábado)
-        dias_map = {
-            1: 'Domingo', 2: 'Lunes', 3: 'Martes', 4: 'Miércoles',
-            5: 'Jueves', 6: 'Viernes', 7: 'Sábado'
-        }
-        
-        # Inicializar todos los días en 0
-        dias_data = {dia: 0 for dia in dias_map.values()}
-        
-        # Rellenar con los datos reales
-        for fila in datos:
-            dia_num = fila[0]
-            total = fila[2]
-            dia_nombre = dias_map.get(dia_num, 'Desconocido')
-            dias_data[dia_nombre] = total
-        
-        # Ordenar los días correctamente (Lunes a Domingo)
-        dias_ordenados = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
-        dias_labels = dias_ordenados
-        dias_valores = [dias_data[dia] for dia in dias_ordenados]
-        
-        # Crear gráfico con matplotlib
-        plt.figure(figsize=(10, 6))
-        colores = ['#FF6B6B', '#4ECDC4', '#45B7D1', '#FFA07A', '#98D8C8', '#F7DC6F', '#BB8FCE']
-        bars = plt.bar(dias_labels, dias_valores, color=colores, edgecolor='black', linewidth=1.5)
-        
-        # Añadir valores encima de las barras
-        for bar in bars:
-            height = bar.get_height()
-            plt.text(bar.get_x() + bar.get_width()/2., height,
-                    f'{int(height)}',
-                    ha='center', va='bottom', fontsize=12, fontweight='bold')
-        
-        plt.xlabel('Día de la Semana', fontsize=12, fontweight='bold')
-        plt.ylabel('Número de Reservas', fontsize=12, fontweight='bold')
-        plt.title('Reservas por Día de la Semana', fontsize=14, fontweight='bold', pad=20)
-        plt.xticks(rotation=45, ha='right')
-        plt.grid(axis='y', alpha=0.3, linestyle='--')
-        plt.tight_layout()
-        
-        # Convertir a base64 para enviar al frontend
-        buffer = io.BytesIO()
-        plt.savefig(buffer, format='png', dpi=100, bbox_inches='tight')
-        buffer.seek(0)
-        image_base64 = base64.b64encode(buffer.getvalue()).decode()
-        plt.close()
-        
+        formato = leer_formato_grafico()
+        datos = datos_dias_semana(conexion.cursor(), id_restaurante)
         return jsonify({
-            'imagen': image_base64,
-            'dias': dias_labels,
-            'valores': dias_valores
+            'imagen_url': url_for('.grafico_dias_semana_imagen', id_restaurante=id_restaurante, formato=formato),
+            'dias': datos['dias'],
+            'valores': datos['valores']
         })
+    except ValueError as ex:
+        return jsonify({'mensaje': str(ex)}), 400
     except Exception as ex:
-        print(f"Error en grafico_dias_semana: {ex}")
-        import traceback
-        traceback.print_exc()
+        current_app.logger.exception("Error en grafico_dias_semana")
+        return jsonify({'mensaje': f'Error: {str(ex)}'}), 500
+
+@api_bp.route('/api/restaurantes/<id_restaurante>/analytics/grafico-dias.<any(png, svg):formato>', methods=['GET'])
+def grafico_dias_semana_imagen(id_restaurante, formato):
+    try:
+        datos = datos_dias_semana(conexion.cursor(), id_restaurante)
+        return respuesta_grafico('dias_semana', id_restaurante, datos, formato)
+    except Exception as ex:
+        current_app.logger.exception("Error en grafico_dias_semana_imagen")
         return jsonify({'mensaje': f'Error: {str(ex)}'}), 500
 
-@app.route('/api/restaurantes/<id_restaurante>/analytics/grafico-precio-comparativo', methods=['GET'])
+@api_bp.route('/api/restaurantes/<id_restaurante>/analytics/grafico-precio-comparativo', methods=['GET'])
 def grafico_precio_comparativo(id_restaurante):
     try:
-        import numpy as np
-        from scipy import stats
-        
-        cursor = conexion.connection.cursor()
-        
-        # Obtener el gasto medio por persona del restaurante actual
-        sql_restaurante = """SELECT AVG(f.PRECIO / r.NUM_PERSONAS) as gasto_medio
-                            FROM facturas f
-                            JOIN reservas r ON f.ID_RESERVA = r.ID_RESERVA
-                            WHERE f.ID_RESTAURANTE = %s"""
-        cursor.execute(sql_restaurante, (id_restaurante,))
-        resultado = cursor.fetchone()
-        gasto_restaurante = float(resultado[0]) if resultado[0] else None
-        
-        # Obtener todos los gastos medios por persona de todos los restaurantes
-        sql_todos = """SELECT r.ID_RESTAURANTE, AVG(f.PRECIO / res.NUM_PERSONAS) as gasto_medio
-                      FROM facturas f
-                      JOIN reservas res ON f.ID_RESERVA = res.ID_RESERVA
-                      JOIN restaurantes r ON f.ID_RESTAURANTE = r.ID_RESTAURANTE
-                      GROUP BY r.ID_RESTAURANTE
-                      HAVING gasto_medio IS NOT NULL"""
-        cursor.execute(sql_todos)
-        datos_todos = cursor.fetchall()
-        
-        if len(datos_todos) < 2:
+        formato = leer_formato_grafico()
+        ccaa, estrellas = leer_grupo_mercado()
+        datos = datos_precio_comparativo(id_restaurante, ccaa, estrellas)
+        if datos is None:
             return jsonify({'mensaje': 'No hay suficientes datos para generar el gráfico'}), 400
         
-        # Extraer los valores de gasto medio
-        gastos = [float(fila[1]) for fila in datos_todos]
-        
-        # Calcular media y desviación estándar
-        media = np.mean(gastos)
-        desviacion = np.std(gastos)
-        
-        # Crear rango de valores para la curva gaussiana
-        x_min = max(0, media - 4*desviacion)
-        x_max = media + 4*desviacion
-        x = np.linspace(x_min, x_max, 1000)
-        
-        # Calcular la distribución normal
-        y = stats.norm.pdf(x, media, desviacion)
-        
-        # Crear el gráfico
-        plt.figure(figsize=(12, 7))
-        
-        # Dibujar la curva gaussiana
-        plt.plot(x, y, 'b-', linewidth=2.5, label='Distribución de todos los restaurantes')
-        plt.fill_between(x, y, alpha=0.3, color='lightblue')
-        
-        # Añadir línea vertical para el restaurante actual
-        if gasto_restaurante:
-            plt.axvline(x=gasto_restaurante, color='red', linestyle='--', linewidth=3, 
-                       label=f'Este restaurante: {gasto_restaurante:.2f}€/persona')
-            
-            # Añadir texto con la posición del restaurante
-            y_max = max(y)
-            plt.text(gasto_restaurante, y_max * 0.9, f'{gasto_restaurante:.2f}€', 
-                    ha='center', va='bottom', fontsize=12, fontweight='bold',
-                    bbox=dict(boxstyle='round,pad=0.5', facecolor='yellow', alpha=0.7))
-        
-        # Añadir línea para la media
-        plt.axvline(x=media, color='green', linestyle=':', linewidth=2, 
-                   label=f'Media del mercado: {media:.2f}€/persona')
-        
-        # Configurar el gráfico
-        plt.xlabel('Precio por Persona (€)', fontsize=13, fontweight='bold')
-        plt.ylabel('Densidad de Probabilidad', fontsize=13, fontweight='bold')
-        plt.title('Comparativa de Precio por Persona con el Mercado', 
-                 fontsize=15, fontweight='bold', pad=20)
-        plt.legend(fontsize=11, loc='upper right')
-        plt.grid(True, alpha=0.3, linestyle='--')
-        
-        # Añadir información estadística
-        info_text = f'μ = {media:.2f}€\nσ = {desviacion:.2f}€\nN = {len(gastos)} restaurantes'
-        plt.text(0.02, 0.98, info_text, transform=plt.gca().transAxes,
-                fontsize=10, verticalalignment='top',
-                bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.5))
-        
-        plt.tight_layout()
-        
-        # Convertir a base64
-        buffer = io.BytesIO()
-        plt.savefig(buffer, format='png', dpi=100, bbox_inches='tight')
-        buffer.seek(0)
-        image_base64 = base64.b64encode(buffer.getvalue()).decode()
-        plt.close()
-        
-        # Calcular percentil del restaurante
-        percentil = None
-        if gasto_restaurante:
-            percentil = stats.percentileofscore(gastos, gasto_restaurante)
-        
-        return jsonify({
-            'imagen': image_base64,
-            'gasto_restaurante': round(gasto_restaurante, 2) if gasto_restaurante else None,
-            'media_mercado': round(media, 2),
-            'desviacion': round(desviacion, 2),
-            'percentil': round(percentil, 1) if percentil else None,
-            'total_restaurantes': len(gastos)
-        })
+        respuesta = {
+            'imagen_url': url_for('.grafico_precio_comparativo_imagen', id_restaurante=id_restaurante,
+                                  formato=formato, ccaa=ccaa, estrellas=estrellas),
+            'grupo': {'ccaa': ccaa, 'estrellas': estrellas}
+        }
+        respuesta.update(json_precio_comparativo(datos))
+        return jsonify(respuesta)
         
+    except ValueError as ex:
+        return jsonify({'mensaje': str(ex)}), 400
     except Exception as ex:
-        print(f"Error en grafico_precio_comparativo: {ex}")
-        import traceback
-        traceback.print_exc()
+        current_app.logger.exception("Error en grafico_precio_comparativo")
         return jsonify({'mensaje': f'Error: {str(ex)}'}), 500
 
+@api_bp.route('/api/restaurantes/<id_restaurante>/analytics/grafico-precio-comparativo.<any(png, svg):formato>',
+           methods=['GET'])
+def grafico_precio_comparativo_imagen(id_restaurante, formato):
+    try:
+        ccaa, estrellas = leer_grupo_mercado()
+        datos = datos_precio_comparativo(id_restaurante, ccaa, estrellas)
+        if datos is None:
+            return jsonify({'mensaje': 'No hay suficientes datos para generar el gráfico'}), 400
+        # Cada grupo de pares es un gráfico distinto en la caché
+        clave = id_restaurante if ccaa is None and estrellas is None else f'{id_restaurante}|{ccaa}|{estrellas}'
+        return respuesta_grafico('precio_comparativo', clave, spec_precio_comparativo(datos), formato)
+    except ValueError as ex:
+        return jsonify({'mensaje': str(ex)}), 400
+    except Exception as ex:
+        current_app.logger.exception("Error en grafico_precio_comparativo_imagen")
+        return jsonify({'mensaje': f'Error: {str(ex)}'}), 500
+
+@api_bp.route('/metrics', methods=['GET'])
+def exponer_metricas():
+    return current_app.response_class(metricas.exponer(), mimetype='text/plain; version=0.0.4')
+
 def pagina_no_encontrada(error):
     return "<h1>La pagina que intentas buscar no existe...</h1>", 404
 
 if __name__=="__main__":
-    app.register_error_handler(404, pagina_no_encontrada)
+    app = create_app()
     app.run()
\ No newline at end of file
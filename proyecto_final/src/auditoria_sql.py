@@ -0,0 +1,199 @@
+"""
+Auditoría de las sentencias SQL de cada petición, para desarrollo y pruebas.
+
+Con CONSULTAS_AUDITORIA activado, los cursores del pool (db.CursorMedido y
+db.SSCursorMedido) pasan cada sentencia a un UsoSQLAuditado en g.uso_sql,
+que:
+
+- agrupa las sentencias por su huella (el SQL con literales y parámetros
+  cambiados por ? y las listas IN/VALUES reducidas a una) y avisa de las que
+  se repiten más de CONSULTAS_REPETIDAS_MAX veces en la misma petición: el
+  patrón N+1 de una consulta por cada fila de un listado. Los endpoints que
+  trabajan por lotes llaman a db.marcar_lote() al empezar cada uno, y cada
+  lote sube ese máximo en uno. CONSULTAS_REPETIDAS_PERMITIDAS lista, por
+  endpoint, el principio de las huellas que se repiten por fila a propósito
+  (los INSERT de cada factura del cierre de servicio);
+- escribe las sentencias que tardan más de CONSULTAS_LENTA_MS con sus
+  parámetros y la línea del código que las lanzó;
+- al terminar la petición deja en app.logger un resumen (sentencias, tiempo
+  en MySQL, filas y repeticiones).
+
+Si la app está en modo TESTING (config 'testing'), una petición con N+1 o con
+más sentencias que CONSULTAS_PRESUPUESTO lanza ConsultasExcesivas, que el
+cliente de pruebas de Flask propaga y hace fallar el test. Para un test
+concreto el presupuesto se ajusta con:
+
+    with auditoria.presupuesto(3):
+        cliente.get('/api/restaurantes/R0001/platos')
+
+Desactivado (lo normal en producción) no se registra nada y los cursores no
+hacen más trabajo que el de metricas.py.
+"""
+import logging
+import os
+import re
+import sys
+from contextlib import contextmanager
+from functools import lru_cache
+
+from flask import current_app, g, request
+
+import db
+from db import UsoSQL
+
+# Sentencias de control de transacción: se repiten por diseño en los lotes
+SIN_HUELLA = re.compile(r'\s*(SAVEPOINT|RELEASE\s+SAVEPOINT|ROLLBACK|COMMIT|START\s+TRANSACTION)\b', re.I)
+
+_LITERALES = re.compile(r"""'(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.)*"|%\(\w+\)s|%s|\b\d+(?:\.\d+)?\b""")
+_LISTA = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_FILAS = re.compile(r'\(\?\)(?:\s*,\s*\(\?\))+')
+_ESPACIOS = re.compile(r'\s+')
+
+# Ficheros que no cuentan como origen de una sentencia al buscar quién la lanzó
+_INTERNOS = (os.path.abspath(db.__file__), os.path.abspath(__file__))
+_MAX_PARAMETROS = 300  # caracteres de los parámetros en el aviso de sentencia lenta
+
+
+class ConsultasExcesivas(AssertionError):
+    """Petición con N+1 o por encima del presupuesto de sentencias (solo en TESTING)."""
+
+
+@lru_cache(maxsize=1024)
+def huella(sql):
+    """SQL normalizado para agrupar sentencias iguales con distintos valores. None si no se agrupa."""
+    if isinstance(sql, bytes):
+        sql = sql.decode('utf-8', 'replace')
+    if SIN_HUELLA.match(sql):
+        return None
+    sql = _LITERALES.sub('?', sql)
+    sql = _FILAS.sub('(?)', _LISTA.sub('(?)', sql))
+    return _ESPACIOS.sub(' ', sql).strip()
+
+
+def lugar_llamada():
+    """'fichero:línea (función)' del primer marco de la pila fuera de db.py, MySQLdb y este módulo."""
+    marco = sys._getframe(1)
+    while marco is not None:
+        fichero = marco.f_code.co_filename
+        if fichero not in _INTERNOS and f'{os.sep}MySQLdb{os.sep}' not in fichero:
+            return f'{os.path.basename(fichero)}:{marco.f_lineno} ({marco.f_code.co_name})'
+        marco = marco.f_back
+    return '?'
+
+
+def _abreviar(texto, limite):
+    texto = _ESPACIOS.sub(' ', texto).strip()
+    return texto if len(texto) <= limite else texto[:limite - 1] + '…'
+
+
+class UsoSQLAuditado(UsoSQL):
+    """UsoSQL que además agrupa las sentencias por huella y avisa de las lentas."""
+    __slots__ = ('auditoria', 'huellas', 'repetidas', 'lentas', 'lotes')
+
+    def __init__(self, auditoria):
+        super().__init__()
+        self.auditoria = auditoria
+        self.huellas = {}     # huella -> veces en la petición
+        self.repetidas = {}   # huella -> lugar desde el que se pasó del máximo
+        self.lentas = 0
+        self.lotes = 0
+
+    def nuevo_lote(self):
+        self.lotes += 1
+
+    def anotar(self, segundos, filas, sentencias=1, query=None, args=None):
+        super().anotar(segundos, filas, sentencias, query, args)
+        if query is None:
+            return
+        auditoria = self.auditoria
+        if segundos * 1000 >= auditoria.lenta_ms:
+            self.lentas += 1
+            sql = query.decode('utf-8', 'replace') if isinstance(query, bytes) else query
+            auditoria.logger.warning("[SQL lenta] %.1f ms en %s: %s parámetros=%s", segundos * 1000,
+                                     lugar_llamada(), _abreviar(sql, 500), _abreviar(repr(args), _MAX_PARAMETROS))
+        clave = huella(query)
+        if clave is None:
+            return
+        veces = self.huellas.get(clave, 0) + 1
+        self.huellas[clave] = veces
+        if veces == auditoria.repetidas_max + 1:
+            self.repetidas[clave] = lugar_llamada()
+
+
+class AuditoriaSQL:
+    def __init__(self):
+        self.repetidas_max = 5
+        self.lenta_ms = 100
+        self.presupuesto_sentencias = None
+        self.repetidas_permitidas = {}
+        self._presupuesto_prueba = None
+        self.logger = logging.getLogger(__name__)
+
+    def init_app(self, app):
+        """Registrar antes que metricas.init_app(): las dos comparten g.uso_sql."""
+        if not app.config['CONSULTAS_AUDITORIA']:
+            return
+        self.repetidas_max = app.config['CONSULTAS_REPETIDAS_MAX']
+        self.lenta_ms = app.config['CONSULTAS_LENTA_MS']
+        self.presupuesto_sentencias = app.config['CONSULTAS_PRESUPUESTO']
+        self.repetidas_permitidas = {endpoint: tuple(huellas) for endpoint, huellas
+                                     in app.config['CONSULTAS_REPETIDAS_PERMITIDAS'].items()}
+        self.logger = app.logger
+        app.before_request(self._empezar)
+        app.after_request(self._terminar)
+
+    @contextmanager
+    def presupuesto(self, sentencias):
+        """Fija el presupuesto de sentencias por petición dentro del bloque (para tests)."""
+        anterior, self._presupuesto_prueba = self._presupuesto_prueba, sentencias
+        try:
+            yield
+        finally:
+            self._presupuesto_prueba = anterior
+
+    def _empezar(self):
+        g.uso_sql = UsoSQLAuditado(self)
+
+    def _terminar(self, respuesta):
+        uso = g.get('uso_sql')
+        if not isinstance(uso, UsoSQLAuditado):
+            return respuesta
+        descripcion = f'{request.method} {request.path} {respuesta.status_code}'
+        endpoint = request.endpoint
+        presupuesto = self._presupuesto_prueba
+        if presupuesto is None:
+            presupuesto = self.presupuesto_sentencias
+        estricto = current_app.testing
+
+        def cerrar():
+            self.resumir(descripcion, endpoint, uso, presupuesto, estricto)
+
+        if respuesta.is_streamed:
+            # Las respuestas en streaming siguen lanzando sentencias al enviarse
+            respuesta.call_on_close(cerrar)
+        else:
+            cerrar()
+        return respuesta
+
+    def resumir(self, descripcion, endpoint, uso, presupuesto, estricto):
+        if uso.sentencias == 0:
+            return
+        self.logger.info("[SQL] %s: %d sentencias, %.1f ms, %d filas%s", descripcion, uso.sentencias,
+                         uso.segundos * 1000, uso.filas, f", {uso.lentas} lentas" if uso.lentas else "")
+        problemas = []
+        # Las sentencias de cada lote pueden repetirse una vez más por lote
+        maximo = self.repetidas_max + uso.lotes
+        permitidas = self.repetidas_permitidas.get(endpoint, ())
+        for clave, lugar in uso.repetidas.items():
+            veces = uso.huellas[clave]
+            if veces <= maximo or clave.startswith(permitidas):
+                continue
+            self.logger.warning("[SQL] N+1 en %s: %d veces desde %s: %s", descripcion,
+                                veces, lugar, _abreviar(clave, 200))
+            problemas.append(f"{veces} veces la misma sentencia desde {lugar}")
+        if presupuesto is not None and uso.sentencias > presupuesto:
+            self.logger.warning("[SQL] %s: %d sentencias, el presupuesto es %d", descripcion,
+                                uso.sentencias, presupuesto)
+            problemas.append(f"{uso.sentencias} sentencias con un presupuesto de {presupuesto}")
+        if problemas and estricto:
+            raise ConsultasExcesivas(f"{descripcion}: " + '; '.join(problemas))
@@ -0,0 +1,94 @@
+"""
+Benchmark del arranque de la API.
+
+Lanza un intérprete nuevo por medida (así no hay nada ya importado) y mide:
+- el tiempo de importar app.py,
+- el de create_app() (pool MySQL, catálogo en memoria, blueprints),
+- la latencia de la primera y la segunda petición a varios endpoints.
+
+Como referencia mide también lo que costaría importar el stack de gráficos
+(matplotlib, numpy, scipy) en cada proceso. Necesita la BD configurada en
+config.py para que los endpoints respondan con datos.
+
+Uso: python bench_arranque.py [ID_RESTAURANTE] [repeticiones]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+
+MEDIR_APP = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import app as modulo
+t1 = time.perf_counter()
+app = modulo.create_app()
+t2 = time.perf_counter()
+cliente = app.test_client()
+peticiones = {}
+for url in sys.argv[1:]:
+    tiempos = []
+    for _ in range(2):
+        inicio = time.perf_counter()
+        estado = cliente.get(url).status_code
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    peticiones[url] = {'estado': estado, 'primera_ms': tiempos[0], 'segunda_ms': tiempos[1]}
+pesados = sorted(m for m in ('matplotlib', 'numpy', 'scipy') if m in sys.modules)
+print(json.dumps({'import_ms': (t1 - t0) * 1000, 'create_app_ms': (t2 - t1) * 1000,
+                  'peticiones': peticiones, 'modulos_pesados': pesados}))
+"""
+
+MEDIR_STACK_GRAFICOS = r"""
+import json, time
+t0 = time.perf_counter()
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot
+import numpy
+from scipy import stats
+print(json.dumps({'import_ms': (time.perf_counter() - t0) * 1000}))
+"""
+
+
+def ejecutar(codigo, *argumentos):
+    salida = subprocess.run([sys.executable, '-c', codigo, *argumentos], cwd=DIRECTORIO,
+                            capture_output=True, text=True, check=True).stdout
+    # app.py imprime avisos al arrancar: el resultado es la última línea
+    return json.loads(salida.strip().splitlines()[-1])
+
+
+def main():
+    id_restaurante = sys.argv[1] if len(sys.argv) > 1 else 'AB001MD'
+    repeticiones = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    base = f'/api/restaurantes/{id_restaurante}'
+    urls = [
+        '/api/restaurantes',
+        f'{base}/platos',
+        f'{base}/analytics/gasto-medio',
+        f'{base}/analytics/grafico-precio-comparativo',
+        f'{base}/analytics/grafico-precio-comparativo.svg',
+    ]
+
+    medidas = [ejecutar(MEDIR_APP, *urls) for _ in range(repeticiones)]
+
+    print(f"Arranque ({repeticiones} procesos nuevos, mediana)")
+    print(f"  import app:   {statistics.median([m['import_ms'] for m in medidas]):8.1f} ms")
+    print(f"  create_app(): {statistics.median([m['create_app_ms'] for m in medidas]):8.1f} ms")
+    print(f"  módulos pesados cargados: {medidas[-1]['modulos_pesados'] or 'ninguno'}\n")
+
+    print(f"{'endpoint':<70}{'estado':>7}{'1ª ms':>10}{'2ª ms':>10}")
+    for url in urls:
+        datos = [m['peticiones'][url] for m in medidas]
+        print(f"{url:<70}{datos[-1]['estado']:>7}"
+              f"{statistics.median([d['primera_ms'] for d in datos]):>10.1f}"
+              f"{statistics.median([d['segunda_ms'] for d in datos]):>10.1f}")
+
+    stack = statistics.median([ejecutar(MEDIR_STACK_GRAFICOS)['import_ms'] for _ in range(repeticiones)])
+    print(f"\nReferencia: importar matplotlib + numpy + scipy.stats cuesta {stack:.0f} ms por proceso")
+
+
+if __name__ == '__main__':
+    main()
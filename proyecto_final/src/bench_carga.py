@@ -0,0 +1,586 @@
+"""
+Benchmark de carga HTTP de la API.
+
+Tres pasos, para tener números antes y después de cada cambio de rendimiento:
+
+- sembrar: crea la BD de la config 'benchmark' (theknife_bench, nunca la de
+  desarrollo) con el esquema y el catálogo de theknife_db.sql (restaurantes,
+  platos y alérgenos) y con clientes, reservas, facturas, reseñas y comandas
+  generados con los scripts de databases_csv a la escala pedida. La misma
+  semilla da los mismos datos, salvo las fechas, que los generadores
+  reparten hasta el día de hoy. Necesita Faker, como gen_tabla_clientes.py.
+- carga: arranca la API contra esa BD (o usa --url si ya está levantada, p.
+  ej. con gunicorn) y la somete a tráfico mixto desde varios hilos, cada uno
+  con su conexión keep-alive: explorar restaurantes y cartas, filtrar por
+  alérgenos, reservar, facturar y valorar, el área de cliente, analytics e
+  importaciones. Escribe en JSON las peticiones por segundo y la latencia
+  p50/p95/p99 de cada endpoint (por defecto en la salida estándar; la tabla
+  legible va a la de errores).
+- comparar: compara dos de esos JSON y termina con código 1 si algún
+  endpoint ha empeorado más del umbral.
+
+La carga escribe en la BD (reservas, facturas y reseñas): para comparar dos
+ejecuciones, se siembra de nuevo antes de cada una.
+
+Uso: python bench_carga.py sembrar [--clientes 1000] [--semilla 1]
+     python bench_carga.py carga [--segundos 60] [--hilos 8] [--url URL] [--salida carga.json]
+     python bench_carga.py comparar antes.json despues.json [--umbral 10]
+"""
+import argparse
+import csv
+import http.client
+import json
+import math
+import os
+import random
+import re
+import runpy
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+from urllib.parse import quote, urlsplit
+
+import MySQLdb
+
+import disponibilidad
+from config import config
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+GENERADORES = os.path.join(DIRECTORIO, '..', 'databases_csv')
+VOLCADO = os.path.join(DIRECTORIO, '..', 'theknife_db.sql')
+LOG_API = os.path.join(tempfile.gettempdir(), 'bench_carga_api.log')
+
+# Tablas que se copian tal cual del volcado; las demás salen de los generadores
+TABLAS_CATALOGO = ('alergenos', 'restaurantes', 'platos', 'alergias')
+LOTE_INSERCION = 5000  # filas por INSERT al sembrar
+TIPOS_VISITA = ('SOLO', 'PAREJA', 'GRUPO', 'FAMILIA', 'EMPRESA')
+
+# (escenario, peso): de cada 100 sesiones, cuántas son de cada tipo
+ESCENARIOS = (
+    ('explorar', 35),
+    ('alergenos', 15),
+    ('reservar', 15),
+    ('facturar', 10),
+    ('cliente', 12),
+    ('analytics', 12),
+    ('importar', 1),
+)
+MUESTRA_CLIENTES = 1000  # clientes entre los que eligen los usuarios simulados
+FILAS_IMPORTACION = 20   # reservas por fichero importado
+PUERTO = 5077            # de la API que arranca la carga si no se da --url
+ESPERA_ARRANQUE = 600    # segundos (el primer arranque sobre una BD nueva crea resúmenes e índices)
+TIMEOUT = 60             # segundos por petición
+MINIMO_MS = 1.0          # en comparar, subidas de latencia menores se consideran ruido
+
+
+# ===== Sembrar =====
+
+def sentencias_volcado():
+    """CREATE TABLE de todas las tablas e INSERT de las del catálogo de theknife_db.sql."""
+    with open(VOLCADO, encoding='utf-16') as f:
+        texto = '\n'.join(linea for linea in f.read().splitlines() if not linea.startswith('--'))
+    for sentencia in re.split(r';\s*\n', texto):
+        sentencia = sentencia.strip()
+        if sentencia.startswith('CREATE TABLE'):
+            yield sentencia
+        elif sentencia.startswith('INSERT INTO') and sentencia.split('`')[1] in TABLAS_CATALOGO:
+            yield sentencia
+
+
+def generar_csv(directorio, clientes, semilla):
+    """Ejecuta los generadores de databases_csv dentro de directorio, empezando por `clientes` clientes."""
+    sys.path.insert(0, GENERADORES)
+    from faker import Faker
+    from gen_tabla_clientes import generar_clientes
+
+    random.seed(semilla)
+    Faker.seed(semilla)
+    shutil.copy(os.path.join(GENERADORES, 'restaurantes.csv'), directorio)
+    anterior = os.getcwd()
+    os.chdir(directorio)  # los generadores leen y escriben sus CSV en el directorio actual
+    try:
+        generar_clientes(num_clientes=clientes, archivo_salida='clientes.csv')
+        for script in ('gen_tabla_reservas.py', 'gen_tabla_facturas.py', 'gen_tabla_reseñas.py'):
+            runpy.run_path(os.path.join(GENERADORES, script), run_name='__main__')
+    finally:
+        os.chdir(anterior)
+
+
+def leer_csv(directorio, nombre):
+    with open(os.path.join(directorio, f'{nombre}.csv'), newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+
+def nulo(valor):
+    return None if valor in ('', 'NULL') else valor
+
+
+def filas_bd(tablas, carta, azar):
+    """[(tabla, columnas, filas)] a insertar a partir de los CSV generados.
+
+    Las reseñas van en VALORACION y TIPO_VISITA de su factura, como en la BD;
+    las facturas sin reserva no caben en el esquema (ID_RESERVA es NOT NULL)
+    y las comandas se generan aquí con platos de la carta del restaurante.
+    """
+    clientes = [(c['ID_CLIENTE'], c['NOMBRE'][:30], int(c['NUM_TELEFONO']), (nulo(c['EMAIL']) or '')[:50] or None,
+                 c['ESTUDIOS'], c['SEXO'], int(c['EDAD'])) for c in tablas['clientes']]
+    reservas = [(r['ID_RESERVA'], r['ID_CLIENTE'], int(r['NUM_PERSONAS']), r['FECHA_RESERVA'],
+                 r['HORA_RESERVA'], r['ID_RESTAURANTE'], r['ESTADO_RESERVA']) for r in tablas['reservas']]
+    resenas = {(r['ID_RESTAURANTE'], r['ID_CLIENTE'], r['FECHA_VISITA']): (round(float(r['VALORACION'])),
+                                                                          r['TIPO_VISITA'])
+               for r in tablas['reseñas']}
+    facturas, comandas = [], []
+    for f in tablas['facturas']:
+        if not f['ID_RESERVA']:
+            continue
+        valoracion, tipo = resenas.get((f['ID_RESTAURANTE'], f['ID_CLIENTE'], f['FECHA_FACTURA']), (None, None))
+        facturas.append((f['ID_FACTURA'], f['ID_CLIENTE'], f['ID_RESERVA'], f['PRECIO'], valoracion, tipo,
+                         f['FECHA_FACTURA'], f['ID_RESTAURANTE']))
+        platos = carta.get(f['ID_RESTAURANTE'])
+        if platos:
+            for plato in azar.sample(platos, azar.randint(1, min(4, len(platos)))):
+                comandas.append((plato, f['ID_FACTURA'], f['ID_RESTAURANTE'], azar.randint(1, 3)))
+    return [
+        ('clientes', ('ID_CLIENTE', 'N_CLIENTE', 'NUM_TELEFONO', 'EMAIL', 'ESTUDIOS', 'SEXO', 'EDAD'), clientes),
+        ('reservas', ('ID_RESERVA', 'ID_CLIENTE', 'NUM_PERSONAS', 'FECHA_RESERVA', 'HORA_RESERVA',
+                      'ID_RESTAURANTE', 'ESTADO_RESERVA'), reservas),
+        ('facturas', ('ID_FACTURA', 'ID_CLIENTE', 'ID_RESERVA', 'PRECIO', 'VALORACION', 'TIPO_VISITA',
+                      'FECHA_FACTURA', 'ID_RESTAURANTE'), facturas),
+        ('comandas', ('N_PLATO', 'ID_FACTURA', 'ID_RESTAURANTE', 'NUM_PEDIDOS'), comandas),
+    ]
+
+
+def insertar(cursor, tabla, columnas, filas):
+    # executemany de MySQLdb junta las filas de cada lote en un solo INSERT
+    sql = f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES ({', '.join(['%s'] * len(columnas))})"
+    for inicio in range(0, len(filas), LOTE_INSERCION):
+        cursor.executemany(sql, filas[inicio:inicio + LOTE_INSERCION])
+
+
+def sembrar(clientes, semilla, nombre_config):
+    ajustes = config[nombre_config]
+    if ajustes.MYSQL_DB == config['development'].MYSQL_DB:
+        raise SystemExit(f"La config '{nombre_config}' usa la BD de desarrollo ({ajustes.MYSQL_DB}): no se siembra")
+
+    inicio = time.perf_counter()
+    with tempfile.TemporaryDirectory() as directorio:
+        generar_csv(directorio, clientes, semilla)
+        tablas = {nombre: leer_csv(directorio, nombre) for nombre in ('clientes', 'reservas', 'facturas', 'reseñas')}
+    print(f"Datos generados en {time.perf_counter() - inicio:.1f} s")
+
+    inicio = time.perf_counter()
+    conn = MySQLdb.connect(host=ajustes.MYSQL_HOST, user=ajustes.MYSQL_USER, passwd=ajustes.MYSQL_PASSWORD,
+                           charset=ajustes.MYSQL_CHARSET, use_unicode=True)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"DROP DATABASE IF EXISTS `{ajustes.MYSQL_DB}`")
+        cursor.execute(f"CREATE DATABASE `{ajustes.MYSQL_DB}` "
+                       f"DEFAULT CHARACTER SET {ajustes.MYSQL_CHARSET} COLLATE {ajustes.MYSQL_COLLATION}")
+        cursor.execute(f"USE `{ajustes.MYSQL_DB}`")
+        cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+        for sentencia in sentencias_volcado():
+            cursor.execute(sentencia)
+        cursor.execute("SELECT ID_RESTAURANTE, N_PLATO FROM platos ORDER BY ID_RESTAURANTE, N_PLATO")
+        carta = {}
+        for id_restaurante, plato in cursor.fetchall():
+            carta.setdefault(id_restaurante, []).append(plato)
+        for tabla, columnas, filas in filas_bd(tablas, carta, random.Random(semilla)):
+            insertar(cursor, tabla, columnas, filas)
+            print(f"  {tabla}: {len(filas)} filas")
+        cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+    print(f"✓ {ajustes.MYSQL_DB} sembrada en {time.perf_counter() - inicio:.1f} s "
+          f"(los resúmenes e índices los crea la API al arrancar)")
+
+
+# ===== Carga =====
+
+def cargar_datos(ajustes, semilla):
+    """Restaurantes, cartas, alérgenos y una muestra de clientes con los que generar las peticiones."""
+    conn = MySQLdb.connect(host=ajustes.MYSQL_HOST, user=ajustes.MYSQL_USER, passwd=ajustes.MYSQL_PASSWORD,
+                           db=ajustes.MYSQL_DB, charset=ajustes.MYSQL_CHARSET, use_unicode=True)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT ID_RESTAURANTE, N_PLATO FROM platos ORDER BY ID_RESTAURANTE, N_PLATO")
+        carta = {}
+        for id_restaurante, plato in cursor.fetchall():
+            carta.setdefault(id_restaurante, []).append(plato)
+        cursor.execute("SELECT ALERGENO FROM alergenos ORDER BY NUM_ALERGENO")
+        alergenos = [fila[0] for fila in cursor.fetchall()]
+        cursor.execute("SELECT ID_CLIENTE, N_CLIENTE FROM clientes ORDER BY RAND(%s) LIMIT %s",
+                       (semilla, MUESTRA_CLIENTES))
+        clientes = list(cursor.fetchall())
+    finally:
+        cursor.close()
+        conn.close()
+    if not carta or not clientes:
+        raise SystemExit(f"{ajustes.MYSQL_DB} no tiene datos: ejecuta antes 'python bench_carga.py sembrar'")
+    return {'restaurantes': sorted(carta), 'carta': carta, 'alergenos': alergenos, 'clientes': clientes}
+
+
+class Usuario:
+    """Un hilo de carga: abre sesiones de los escenarios con su propia conexión keep-alive."""
+
+    def __init__(self, url, datos, horas, semilla):
+        partes = urlsplit(url)
+        self.host, self.puerto = partes.hostname, partes.port or 80
+        self.datos = datos
+        self.horas = horas
+        self.azar = random.Random(semilla)
+        self.conexion = None
+        self.medir = False
+        self.medidas = {}  # etiqueta -> [tiempos, errores, rechazos]
+
+    def pedir(self, etiqueta, metodo, ruta, cuerpo=None, tipo='application/json'):
+        """Hace la petición y anota su latencia bajo etiqueta. Devuelve (estado, JSON o None)."""
+        if cuerpo is not None and not isinstance(cuerpo, bytes):
+            cuerpo = json.dumps(cuerpo).encode('utf-8')
+        cabeceras = {'Content-Type': tipo} if cuerpo is not None else {}
+        inicio = time.perf_counter()
+        try:
+            if self.conexion is None:
+                self.conexion = http.client.HTTPConnection(self.host, self.puerto, timeout=TIMEOUT)
+            self.conexion.request(metodo, ruta, body=cuerpo, headers=cabeceras)
+            respuesta = self.conexion.getresponse()
+            contenido = respuesta.read()  # también las respuestas en streaming, enteras
+            estado = respuesta.status
+        except (OSError, http.client.HTTPException):
+            if self.conexion is not None:
+                self.conexion.close()
+            self.conexion = None
+            respuesta, contenido, estado = None, b'', 0
+        if self.medir:
+            medida = self.medidas.setdefault(etiqueta, [[], 0, 0])
+            medida[0].append(time.perf_counter() - inicio)
+            if estado == 0 or estado >= 500:
+                medida[1] += 1
+            elif estado >= 400:
+                medida[2] += 1  # 4xx esperables: sin sitio, ya valorado...
+        if respuesta is not None and (respuesta.getheader('Content-Type') or '').startswith('application/json'):
+            try:
+                return estado, json.loads(contenido)
+            except ValueError:
+                pass
+        return estado, None
+
+    def ejecutar(self, desde, hasta):
+        """Abre sesiones hasta el instante hasta; solo se mide a partir de desde (calentamiento)."""
+        escenarios = [getattr(self, nombre) for nombre, _ in ESCENARIOS]
+        pesos = [peso for _, peso in ESCENARIOS]
+        while True:
+            ahora = time.perf_counter()
+            if ahora >= hasta:
+                break
+            self.medir = ahora >= desde
+            self.azar.choices(escenarios, pesos)[0]()
+        if self.conexion is not None:
+            self.conexion.close()
+
+    # ----- Datos de las peticiones -----
+
+    def un_restaurante(self):
+        return self.azar.choice(self.datos['restaurantes'])
+
+    def un_cliente(self):
+        return self.azar.choice(self.datos['clientes'])
+
+    def fecha_futura(self):
+        return (date.today() + timedelta(days=self.azar.randint(1, 60))).isoformat()
+
+    def lineas(self, id_restaurante):
+        carta = self.datos['carta'][id_restaurante]
+        return [{'nombre': plato, 'cantidad': self.azar.randint(1, 3)}
+                for plato in self.azar.sample(carta, min(len(carta), self.azar.randint(1, 4)))]
+
+    def nueva_reserva(self, id_restaurante=None):
+        """POST /api/reservas. Devuelve (id_reserva, id_cliente, id_restaurante) o None si no hay sitio."""
+        id_cliente = self.un_cliente()[0]
+        id_restaurante = id_restaurante or self.un_restaurante()
+        estado, datos = self.pedir('POST /api/reservas', 'POST', '/api/reservas', {
+            'id_cliente': id_cliente, 'id_restaurante': id_restaurante, 'fecha': self.fecha_futura(),
+            'hora': self.azar.choice(self.horas), 'num_personas': self.azar.randint(1, 6)})
+        if estado != 200 or not isinstance(datos, dict):
+            return None
+        return datos['id_reserva'], id_cliente, id_restaurante
+
+    # ----- Escenarios -----
+
+    def explorar(self):
+        id_restaurante = self.un_restaurante()
+        self.pedir('GET /api/restaurantes', 'GET', '/api/restaurantes')
+        self.pedir('GET /api/restaurantes/<id>', 'GET', f'/api/restaurantes/{id_restaurante}')
+        self.pedir('GET /api/restaurantes/<id>/platos', 'GET', f'/api/restaurantes/{id_restaurante}/platos')
+        palabra = self.azar.choice(self.datos['carta'][id_restaurante]).split()[0]
+        self.pedir('GET /api/buscar', 'GET', f'/api/buscar?q={quote(palabra[:self.azar.randint(3, 6)])}')
+        self.pedir('GET /api/disponibilidad', 'GET',
+                   f'/api/disponibilidad?fecha={self.fecha_futura()}&personas={self.azar.randint(1, 6)}')
+
+    def alergenos(self):
+        elegidos = self.azar.sample(self.datos['alergenos'], min(len(self.datos['alergenos']),
+                                                                 self.azar.randint(1, 3)))
+        alergia = ','.join(quote(alergeno) for alergeno in elegidos)
+        self.pedir('GET /api/alergenos', 'GET', '/api/alergenos')
+        self.pedir('GET /api/restaurantes?alergia=', 'GET', f'/api/restaurantes?alergia={alergia}')
+        self.pedir('GET /api/restaurantes/<id>/platos?alergia=', 'GET',
+                   f'/api/restaurantes/{self.un_restaurante()}/platos?alergia={alergia}')
+
+    def reservar(self):
+        self.pedir('GET /api/disponibilidad?hora=', 'GET',
+                   f'/api/disponibilidad?fecha={self.fecha_futura()}&hora={self.azar.choice(self.horas)}'
+                   f'&personas={self.azar.randint(1, 6)}')
+        reserva = self.nueva_reserva()
+        if reserva is None:
+            return
+        id_reserva = reserva[0]
+        if self.azar.random() < 0.3:
+            self.pedir('PUT /api/reservas/update/<id>', 'PUT', f'/api/reservas/update/{id_reserva}', {
+                'fecha': self.fecha_futura(), 'hora': self.azar.choice(self.horas),
+                'num_personas': self.azar.randint(1, 6)})
+        if self.azar.random() < 0.15:
+            self.pedir('DELETE /api/reservas/cancel/<id>', 'DELETE', f'/api/reservas/cancel/{id_reserva}')
+
+    def facturar(self):
+        reserva = self.nueva_reserva()
+        if reserva is None:
+            return
+        id_reserva, id_cliente, id_restaurante = reserva
+        forma = self.azar.random()
+        if forma < 0.5:
+            self.pedir('POST /api/restaurantes/factura/crear', 'POST', '/api/restaurantes/factura/crear', {
+                'id_restaurante': id_restaurante, 'id_reserva': id_reserva, 'platos': self.lineas(id_restaurante)})
+        elif forma < 0.8:
+            self.pedir('POST /api/reservas/<id>/factura', 'POST', f'/api/reservas/{id_reserva}/factura')
+        else:
+            # Cierre de servicio: esta reserva y otras dos del mismo restaurante
+            reservas = [id_reserva] + [r[0] for r in (self.nueva_reserva(id_restaurante) for _ in range(2)) if r]
+            self.pedir('POST /api/restaurantes/<id>/facturas/lote', 'POST',
+                       f'/api/restaurantes/{id_restaurante}/facturas/lote',
+                       {'facturas': [{'id_reserva': r, 'platos': self.lineas(id_restaurante)} for r in reservas]})
+        if self.azar.random() < 0.6:
+            self.pedir('POST /api/resenas', 'POST', '/api/resenas', {
+                'id_cliente': id_cliente, 'id_restaurante': id_restaurante,
+                'valoracion': self.azar.randint(0, 5), 'tipo_visita': self.azar.choice(TIPOS_VISITA)})
+
+    def cliente(self):
+        id_cliente, nombre = self.un_cliente()
+        estado, datos = self.pedir('GET /api/reservas/<id_cliente>', 'GET', f'/api/reservas/{id_cliente}?limit=10')
+        if isinstance(datos, dict) and datos.get('siguiente'):
+            self.pedir('GET /api/reservas/<id_cliente>?after=', 'GET',
+                       f"/api/reservas/{id_cliente}?limit=10&after={quote(str(datos['siguiente']))}")
+        self.pedir('GET /api/facturas/<id_cliente>', 'GET', f'/api/facturas/{id_cliente}?limit=10')
+        self.pedir('GET /api/resenas/<id_cliente>', 'GET', f'/api/resenas/{id_cliente}')
+        apellido = nombre.split(',')[0].split()[0]
+        self.pedir('GET /api/clientes/buscar', 'GET', f'/api/clientes/buscar?q={quote(apellido)}')
+
+    def analytics(self):
+        id_restaurante = self.un_restaurante()
+        base = f'/api/restaurantes/{id_restaurante}'
+        self.pedir('GET /api/restaurantes/<id>/analytics/dashboard', 'GET', f'{base}/analytics/dashboard?format=svg')
+        for consulta in ('sin-valorar', 'gasto-medio', 'dia-mas-concurrido', 'top-platos'):
+            self.pedir(f'GET /api/restaurantes/<id>/analytics/{consulta}', 'GET', f'{base}/analytics/{consulta}')
+        grafico = self.azar.choice(('grafico-dias', 'grafico-precio-comparativo'))
+        formato = self.azar.choice(('svg', 'png'))
+        self.pedir(f'GET /api/restaurantes/<id>/analytics/{grafico}.{formato}', 'GET',
+                   f'{base}/analytics/{grafico}.{formato}')
+        self.pedir('GET /api/restaurantes/<id>/reservas', 'GET', f'{base}/reservas')
+        self.pedir('GET /api/restaurantes/<id>/facturas', 'GET', f'{base}/facturas')
+
+    def importar(self):
+        filas = [json.dumps({'ID_CLIENTE': self.un_cliente()[0], 'ID_RESTAURANTE': self.un_restaurante(),
+                             'NUM_PERSONAS': self.azar.randint(1, 6), 'FECHA_RESERVA': self.fecha_futura(),
+                             'HORA_RESERVA': self.azar.choice(self.horas)})
+                 for _ in range(FILAS_IMPORTACION)]
+        self.pedir('POST /api/reservas/importar', 'POST', '/api/reservas/importar?formato=ndjson',
+                   '\n'.join(filas).encode('utf-8'), 'application/x-ndjson')
+
+
+SERVIDOR = r"""
+import sys
+import app
+app.create_app(sys.argv[1]).run(host='127.0.0.1', port=int(sys.argv[2]), threaded=True)
+"""
+
+
+def arrancar_api(nombre_config, puerto):
+    """Lanza la API en otro proceso y espera a que responda. Su salida va a LOG_API."""
+    with open(LOG_API, 'w') as log:
+        proceso = subprocess.Popen([sys.executable, '-c', SERVIDOR, nombre_config, str(puerto)],
+                                   cwd=DIRECTORIO, stdout=log, stderr=subprocess.STDOUT)
+    limite = time.monotonic() + ESPERA_ARRANQUE
+    while time.monotonic() < limite:
+        if proceso.poll() is not None:
+            raise SystemExit(f"La API terminó al arrancar (código {proceso.returncode}), ver {LOG_API}")
+        conexion = http.client.HTTPConnection('127.0.0.1', puerto, timeout=5)
+        try:
+            conexion.request('GET', '/api/alergenos')
+            if conexion.getresponse().status == 200:
+                return proceso
+        except (OSError, http.client.HTTPException):
+            pass
+        finally:
+            conexion.close()
+        time.sleep(0.5)
+    proceso.terminate()
+    raise SystemExit(f"La API no respondió en {ESPERA_ARRANQUE} s, ver {LOG_API}")
+
+
+def percentil(ordenados, p):
+    """Percentil p (0-100) por el método del rango más cercano."""
+    return ordenados[max(0, math.ceil(p / 100 * len(ordenados)) - 1)]
+
+
+def resumir(tiempos, errores, rechazos, segundos):
+    ordenados = sorted(tiempos)
+    if not ordenados:
+        return {'peticiones': 0, 'por_segundo': 0.0, 'errores': errores, 'rechazos': rechazos}
+    return {
+        'peticiones': len(ordenados),
+        'por_segundo': round(len(ordenados) / segundos, 2),
+        'errores': errores,    # 5xx y fallos de conexión
+        'rechazos': rechazos,  # 4xx
+        'p50_ms': round(percentil(ordenados, 50) * 1000, 2),
+        'p95_ms': round(percentil(ordenados, 95) * 1000, 2),
+        'p99_ms': round(percentil(ordenados, 99) * 1000, 2),
+        'max_ms': round(ordenados[-1] * 1000, 2),
+    }
+
+
+def carga(segundos, hilos, calentamiento, semilla, url, nombre_config):
+    ajustes = config[nombre_config]
+    datos = cargar_datos(ajustes, semilla)
+    horas = [disponibilidad.hora(f) for f in disponibilidad.franjas_reservables(ajustes.HORARIO_RESERVAS)]
+    servidor = arrancar_api(nombre_config, PUERTO) if url is None else None
+    url = url or f'http://127.0.0.1:{PUERTO}'
+    try:
+        usuarios = [Usuario(url, datos, horas, f'{semilla}-{i}') for i in range(hilos)]
+        desde = time.perf_counter() + calentamiento
+        hasta = desde + segundos
+        trabajos = [threading.Thread(target=usuario.ejecutar, args=(desde, hasta)) for usuario in usuarios]
+        for trabajo in trabajos:
+            trabajo.start()
+        for trabajo in trabajos:
+            trabajo.join()
+        # Las últimas sesiones terminan después de hasta: se cuenta el tiempo real
+        medido = time.perf_counter() - desde
+    finally:
+        if servidor is not None:
+            servidor.terminate()
+            servidor.wait()
+
+    por_etiqueta = {}
+    for usuario in usuarios:
+        for etiqueta, (tiempos, errores, rechazos) in usuario.medidas.items():
+            total = por_etiqueta.setdefault(etiqueta, [[], 0, 0])
+            total[0] += tiempos
+            total[1] += errores
+            total[2] += rechazos
+    todos = [t for tiempos, _, _ in por_etiqueta.values() for t in tiempos]
+    return {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'parametros': {'url': url, 'config': nombre_config, 'segundos': segundos, 'hilos': hilos,
+                       'calentamiento': calentamiento, 'semilla': semilla, 'escenarios': dict(ESCENARIOS)},
+        'total': resumir(todos, sum(e for _, e, _ in por_etiqueta.values()),
+                         sum(r for _, _, r in por_etiqueta.values()), medido),
+        'endpoints': {etiqueta: resumir(*valores, medido) for etiqueta, valores in sorted(por_etiqueta.items())},
+    }
+
+
+def imprimir(resultado, salida):
+    print(f"{'endpoint':<70}{'pet.':>7}{'pet/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'5xx':>6}{'4xx':>6}",
+          file=salida)
+    filas = list(resultado['endpoints'].items()) + [('TOTAL', resultado['total'])]
+    for etiqueta, d in filas:
+        if not d['peticiones']:
+            continue
+        print(f"{etiqueta:<70}{d['peticiones']:>7}{d['por_segundo']:>9.1f}{d['p50_ms']:>9.1f}"
+              f"{d['p95_ms']:>9.1f}{d['p99_ms']:>9.1f}{d['errores']:>6}{d['rechazos']:>6}", file=salida)
+
+
+# ===== Comparar =====
+
+def variacion(antes, despues):
+    return (despues - antes) / antes * 100 if antes else 0.0
+
+
+def comparar(antes, despues, umbral):
+    """Imprime los cambios por endpoint y devuelve las regresiones de más de umbral %."""
+    regresiones = []
+    print(f"{'endpoint':<70}{'pet/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}")
+    filas = sorted(set(antes['endpoints']) | set(despues['endpoints'])) + ['TOTAL']
+    for etiqueta in filas:
+        a = antes['total'] if etiqueta == 'TOTAL' else antes['endpoints'].get(etiqueta)
+        d = despues['total'] if etiqueta == 'TOTAL' else despues['endpoints'].get(etiqueta)
+        if not a or not d or not a['peticiones'] or not d['peticiones']:
+            print(f"{etiqueta:<70}{'solo en ' + ('después' if not a or not a['peticiones'] else 'antes'):>36}")
+            continue
+        cambios = {clave: variacion(a[clave], d[clave]) for clave in ('por_segundo', 'p50_ms', 'p95_ms', 'p99_ms')}
+        motivos = []
+        if cambios['p95_ms'] > umbral and d['p95_ms'] - a['p95_ms'] >= MINIMO_MS:
+            motivos.append(f"p95 {a['p95_ms']:.1f} → {d['p95_ms']:.1f} ms")
+        if cambios['por_segundo'] < -umbral:
+            motivos.append(f"{a['por_segundo']:.1f} → {d['por_segundo']:.1f} pet/s")
+        if d['errores'] / d['peticiones'] > a['errores'] / a['peticiones']:
+            motivos.append(f"errores {a['errores']}/{a['peticiones']} → {d['errores']}/{d['peticiones']}")
+        print(f"{etiqueta:<70}" + ''.join(f"{cambios[c]:>+8.1f}%" for c in ('por_segundo', 'p50_ms', 'p95_ms', 'p99_ms'))
+              + ('  ✗ ' + '; '.join(motivos) if motivos else ''))
+        if motivos:
+            regresiones.append((etiqueta, motivos))
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de carga HTTP de la API de The Knife')
+    pasos = parser.add_subparsers(dest='paso', required=True)
+
+    p = pasos.add_parser('sembrar', help='crea y rellena la BD del benchmark')
+    p.add_argument('--clientes', type=int, default=1000, help='clientes generados (unas 2,5 reservas por cliente)')
+    p.add_argument('--semilla', type=int, default=1)
+    p.add_argument('--config', default='benchmark', help='config de config.py con la BD a sembrar')
+
+    p = pasos.add_parser('carga', help='lanza tráfico mixto y mide cada endpoint')
+    p.add_argument('--segundos', type=float, default=60, help='duración de la medida')
+    p.add_argument('--hilos', type=int, default=8, help='usuarios simulados a la vez')
+    p.add_argument('--calentamiento', type=float, default=5, help='segundos de tráfico sin medir al empezar')
+    p.add_argument('--semilla', type=int, default=1)
+    p.add_argument('--url', help='API ya arrancada (p. ej. http://127.0.0.1:5000); si no, se arranca una')
+    p.add_argument('--config', default='benchmark', help='config de config.py de la API y su BD')
+    p.add_argument('--salida', help='fichero JSON del resultado (por defecto, la salida estándar)')
+
+    p = pasos.add_parser('comparar', help='compara dos resultados de carga')
+    p.add_argument('antes')
+    p.add_argument('despues')
+    p.add_argument('--umbral', type=float, default=10, help='% de empeoramiento que cuenta como regresión')
+
+    args = parser.parse_args()
+    if args.paso == 'sembrar':
+        sembrar(args.clientes, args.semilla, args.config)
+    elif args.paso == 'carga':
+        resultado = carga(args.segundos, args.hilos, args.calentamiento, args.semilla, args.url, args.config)
+        imprimir(resultado, sys.stderr)
+        texto = json.dumps(resultado, ensure_ascii=False, indent=2)
+        if args.salida:
+            with open(args.salida, 'w', encoding='utf-8') as f:
+                f.write(texto + '\n')
+        else:
+            print(texto)
+    else:
+        with open(args.antes, encoding='utf-8') as f:
+            antes = json.load(f)
+        with open(args.despues, encoding='utf-8') as f:
+            despues = json.load(f)
+        regresiones = comparar(antes, despues, args.umbral)
+        if regresiones:
+            print(f"\n✗ {len(regresiones)} endpoints han empeorado más de un {args.umbral:g} %")
+            sys.exit(1)
+        print(f"\n✓ Ningún endpoint empeora más de un {args.umbral:g} %")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+Benchmark de los gráficos de analytics: matplotlib (PNG) frente a SVG nativo.
+
+Dibuja los dos gráficos con datos de ejemplo y muestra el tiempo medio por
+gráfico y el tamaño de la respuesta. No necesita base de datos.
+
+Uso: python bench_graficos.py [repeticiones]
+"""
+import sys
+import time
+
+from graficos import renderizar
+from graficos_svg import renderizar_svg
+
+SPECS = {
+    'dias_semana': {
+        'dias': ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo'],
+        'valores': [12, 9, 15, 21, 38, 45, 30],
+    },
+    'precio_comparativo': {
+        'media': 48.7, 'desviacion': 17.3, 'total': 120, 'gasto_restaurante': 63.2,
+    },
+}
+
+
+def medir(funcion, tipo, spec, repeticiones):
+    funcion(tipo, spec)  # Primera llamada fuera de la medida (imports y fuentes)
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        datos = funcion(tipo, spec)
+    return (time.perf_counter() - inicio) / repeticiones, len(datos)
+
+
+def main():
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    inicio = time.perf_counter()
+    renderizar('dias_semana', SPECS['dias_semana'])
+    print(f"Primer gráfico matplotlib (con imports): {(time.perf_counter() - inicio) * 1000:.0f} ms\n")
+
+    print(f"{'gráfico':<20}{'formato':<9}{'ms/gráfico':>12}{'bytes':>10}")
+    for tipo, spec in SPECS.items():
+        t_png, n_png = medir(renderizar, tipo, spec, repeticiones)
+        t_svg, n_svg = medir(renderizar_svg, tipo, spec, repeticiones * 50)
+        print(f"{tipo:<20}{'png':<9}{t_png * 1000:>12.2f}{n_png:>10}")
+        print(f"{tipo:<20}{'svg':<9}{t_svg * 1000:>12.3f}{n_svg:>10}")
+        print(f"{'':<20}{'x' + format(t_png / t_svg, '.0f') + ' más rápido en SVG':<30}\n")
+
+
+if __name__ == '__main__':
+    main()
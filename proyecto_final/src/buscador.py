@@ -0,0 +1,195 @@
+"""
+Buscador de restaurantes y platos para /api/buscar.
+
+Índice invertido en memoria sobre el nombre, ciudad, CCAA, tipo de comida y
+cadena de cada restaurante y sobre el nombre y el tipo de cada plato. Los
+términos se normalizan sin acentos ni mayúsculas (busqueda.normalizar) y
+cada palabra de la consulta se busca como prefijo, de modo que sirve para
+autocompletar mientras se escribe.
+
+Se mantiene con el mismo mecanismo de TTL + CHECKSUM que el catálogo, pero
+al recargar no se rehace el índice entero: solo se quitan y se vuelven a
+indexar los documentos que han cambiado, copiando únicamente las listas de
+los términos afectados.
+"""
+import bisect
+import logging
+from collections import Counter, namedtuple
+from types import MappingProxyType
+
+from busqueda import normalizar
+from catalogo import SQL_RESTAURANTES, CacheTablas, fila_a_restaurante
+
+log = logging.getLogger(__name__)
+
+SQL_PLATOS = "SELECT ID_RESTAURANTE, N_PLATO, T_PLATO, PRECIO FROM platos"
+
+# Peso de cada campo en la puntuación de un término
+PESOS_RESTAURANTE = {'nombre': 5, 'tipo_comida': 3, 'ciudad': 3, 'ccaa': 2, 'cadena': 2}
+PESOS_PLATO = {'n_plato': 4, 't_plato': 1}
+PESO_PREFIJO = 0.6  # una palabra que solo empieza por el texto buscado puntúa menos
+
+FACETAS = ('tipo', 'ccaa', 'ciudad', 'estrellas', 'presupuesto', 'tipo_comida', 't_plato')
+FACETAS_NUMERICAS = ('estrellas', 'presupuesto')
+
+Documento = namedtuple('Documento', [
+    'clave',     # 'R|<ID_RESTAURANTE>' o 'P|<ID_RESTAURANTE>|<N_PLATO>'
+    'tipo',      # 'restaurante' o 'plato'
+    'orden',     # desempate entre puntuaciones iguales
+    'facetas',   # tupla de (faceta, valor)
+    'datos',     # dict que se devuelve en la respuesta
+    'terminos',  # tupla de (término, peso)
+])
+
+SnapshotBuscador = namedtuple('SnapshotBuscador', [
+    'version',
+    'checksum',
+    'documentos',   # {clave: Documento}
+    'terminos',     # {término: {clave: peso}}
+    'vocabulario',  # términos ordenados, para buscar prefijos con bisect
+])
+
+
+def terminos_documento(campos, pesos):
+    terminos = {}
+    for campo, peso in pesos.items():
+        for termino in normalizar(campos.get(campo)).split():
+            terminos[termino] = max(terminos.get(termino, 0), peso)
+    return tuple(sorted(terminos.items()))
+
+
+def documento_restaurante(r):
+    facetas = {
+        'tipo': 'restaurante', 'ccaa': r.ccaa, 'ciudad': r.ciudad, 'estrellas': r.estrellas,
+        'presupuesto': r.presupuesto, 'tipo_comida': r.tipo_comida,
+    }
+    datos = {'tipo': 'restaurante', 'id_restaurante': r.id, 'nombre': r.nombre, 'ciudad': r.ciudad,
+             'ccaa': r.ccaa, 'tipo_comida': r.tipo_comida, 'presupuesto': r.presupuesto,
+             'estrellas': r.estrellas, 'cadena': r.cadena}
+    return Documento(f'R|{r.id.upper()}', 'restaurante', (0, -(r.estrellas or 0), normalizar(r.nombre)),
+                     tuple(facetas.items()), datos, terminos_documento(r._asdict(), PESOS_RESTAURANTE))
+
+
+def documento_plato(fila, restaurante):
+    id_restaurante, n_plato, t_plato, precio = fila
+    facetas = {
+        'tipo': 'plato', 'ccaa': restaurante.ccaa, 'ciudad': restaurante.ciudad,
+        'estrellas': restaurante.estrellas, 'presupuesto': restaurante.presupuesto,
+        'tipo_comida': restaurante.tipo_comida, 't_plato': t_plato,
+    }
+    datos = {'tipo': 'plato', 'id_restaurante': restaurante.id, 'n_plato': n_plato, 't_plato': t_plato,
+             'precio': float(precio) if precio is not None else None,
+             'restaurante_nombre': restaurante.nombre, 'ciudad': restaurante.ciudad,
+             'estrellas': restaurante.estrellas}
+    campos = {'n_plato': n_plato, 't_plato': t_plato}
+    return Documento(f'P|{id_restaurante.upper()}|{n_plato}', 'plato',
+                     (1, -(restaurante.estrellas or 0), normalizar(n_plato)),
+                     tuple(facetas.items()), datos, terminos_documento(campos, PESOS_PLATO))
+
+
+class Buscador(CacheTablas):
+    TABLAS = ('restaurantes', 'platos')
+    NOMBRE = 'Buscador'
+
+    def _leer_documentos(self, cursor):
+        cursor.execute(SQL_RESTAURANTES)
+        restaurantes = {}
+        documentos = {}
+        for fila in cursor.fetchall():
+            r = fila_a_restaurante(fila)
+            restaurantes[r.id.upper()] = r
+            doc = documento_restaurante(r)
+            documentos[doc.clave] = doc
+        cursor.execute(SQL_PLATOS)
+        for fila in cursor.fetchall():
+            restaurante = restaurantes.get(fila[0].upper())
+            if restaurante:
+                doc = documento_plato(fila, restaurante)
+                documentos[doc.clave] = doc
+        return documentos
+
+    def _construir(self, cursor, version, checksum):
+        nuevos = self._leer_documentos(cursor)
+        anterior = self._snapshot
+        documentos = dict(anterior.documentos) if anterior else {}
+        terminos = dict(anterior.terminos) if anterior else {}
+        copiados = set()  # listas ya copiadas en esta recarga (el snapshot anterior no se toca)
+
+        def lista(termino):
+            if termino not in copiados:
+                terminos[termino] = dict(terminos.get(termino, ()))
+                copiados.add(termino)
+            return terminos[termino]
+
+        quitados = [clave for clave, doc in documentos.items() if nuevos.get(clave) != doc]
+        for clave in quitados:
+            for termino, _ in documentos.pop(clave).terminos:
+                postings = lista(termino)
+                postings.pop(clave, None)
+                if not postings:
+                    del terminos[termino]
+        anadidos = [doc for clave, doc in nuevos.items() if clave not in documentos]
+        for doc in anadidos:
+            documentos[doc.clave] = doc
+            for termino, peso in doc.terminos:
+                lista(termino)[doc.clave] = peso
+
+        if anterior and set(terminos) == set(anterior.terminos):
+            vocabulario = anterior.vocabulario
+        else:
+            vocabulario = tuple(sorted(terminos))
+        if anterior:
+            log.info("%s: %d documentos quitados y %d indexados", self.NOMBRE, len(quitados), len(anadidos))
+        return SnapshotBuscador(version, checksum, MappingProxyType(documentos),
+                                MappingProxyType(terminos), vocabulario)
+
+    def buscar(self, snapshot, texto, filtros=None, limite=20):
+        """Documentos que contienen todas las palabras de texto (como prefijo), por relevancia.
+
+        filtros es {faceta: valor}; devuelve (resultados, total, recuento de facetas).
+        """
+        palabras = normalizar(texto).split()
+        if not palabras:
+            return [], 0, {}
+
+        puntuaciones = None
+        for palabra in palabras:
+            # Mejor peso de cada documento para esta palabra, entre todos los términos que empiezan por ella
+            mejores = {}
+            i = bisect.bisect_left(snapshot.vocabulario, palabra)
+            while i < len(snapshot.vocabulario) and snapshot.vocabulario[i].startswith(palabra):
+                termino = snapshot.vocabulario[i]
+                factor = 1.0 if termino == palabra else PESO_PREFIJO
+                for clave, peso in snapshot.terminos[termino].items():
+                    if peso * factor > mejores.get(clave, 0):
+                        mejores[clave] = peso * factor
+                i += 1
+            if puntuaciones is None:
+                puntuaciones = mejores
+            else:
+                puntuaciones = {clave: p + mejores[clave] for clave, p in puntuaciones.items() if clave in mejores}
+            if not puntuaciones:
+                return [], 0, {}
+
+        filtros = filtros or {}
+        recuento = {faceta: Counter() for faceta in FACETAS}
+        encontrados = []
+        for clave, puntuacion in puntuaciones.items():
+            doc = snapshot.documentos[clave]
+            facetas = dict(doc.facetas)
+            if all(cumple_faceta(facetas.get(f), v) for f, v in filtros.items()):
+                encontrados.append((-puntuacion, doc.orden, doc))
+                for faceta, valor in doc.facetas:
+                    if valor is not None:
+                        recuento[faceta][valor] += 1
+        encontrados.sort(key=lambda e: e[:2])
+        resultados = [dict(doc.datos, puntuacion=round(-p, 2)) for p, _, doc in encontrados[:limite]]
+        return resultados, len(encontrados), {f: dict(c.most_common()) for f, c in recuento.items() if c}
+
+
+def cumple_faceta(valor, buscado):
+    if valor is None:
+        return False
+    if isinstance(buscado, int):
+        return valor == buscado
+    return normalizar(valor) == normalizar(buscado)
@@ -0,0 +1,244 @@
+"""
+Búsqueda de clientes por nombre, email y teléfono.
+
+WHERE N_CLIENTE LIKE '%x%' no puede usar ningún índice, así que cada búsqueda
+recorría la tabla clientes entera. En su lugar se mantiene la tabla
+clientes_trigramas con los trigramas de cada palabra de los tres campos,
+normalizados sin acentos ni mayúsculas y guardados con el campo del que salen
+(CAMPO), para que ?nombre= solo mire los trigramas del nombre:
+
+- "  g", " ga", "gal", "alo" para la palabra "galo": los dos primeros (con
+  espacios delante) permiten buscar por prefijo con una o dos letras y el
+  resto, cualquier subcadena de tres o más.
+- La consulta necesita al menos una palabra de tres o más caracteres: un
+  prefijo de una o dos letras lo tiene buena parte de la tabla, y todos esos
+  clientes habría que leerlos y comprobarlos. Las palabras cortas solo
+  acompañan a otra más larga ("j garcia").
+- Un cliente es candidato si tiene todos los trigramas de la consulta en los
+  campos pedidos. Todos los candidatos se comprueban después en Python, por
+  lotes de LOTE_CANDIDATOS, y se ordenan por relevancia (coincidencia exacta,
+  prefijo del campo, prefijo de palabra, subcadena).
+
+Igual que los resúmenes de rollups.py, los endpoints que crean, modifican o
+borran clientes llaman a indexar_cliente/desindexar_cliente con el mismo
+cursor y antes del commit.
+
+Reconstrucción desde la tabla clientes: python busqueda.py
+"""
+import heapq
+import re
+import unicodedata
+
+TABLA = """CREATE TABLE IF NOT EXISTS clientes_trigramas (
+    TRIGRAMA varchar(3) NOT NULL,
+    CAMPO enum('nombre','email','telefono') NOT NULL,
+    ID_CLIENTE char(9) NOT NULL,
+    PRIMARY KEY (TRIGRAMA, CAMPO, ID_CLIENTE),
+    KEY CT_CLIENTE (ID_CLIENTE)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_bin"""
+
+CAMPOS_CLIENTE = ('nombre', 'email', 'telefono')  # en el orden de las columnas de COLUMNAS_CAMPOS
+COLUMNAS_CAMPOS = 'N_CLIENTE, EMAIL, NUM_TELEFONO'
+LOTE_CANDIDATOS = 500  # candidatos que se leen de clientes en cada sentencia
+LOTE_INDEXADO = 5000  # clientes por transacción al reconstruir el índice
+
+_NO_ALFANUMERICO = re.compile(r'[\W_]+')
+
+
+def normalizar(texto):
+    """Minúsculas, sin acentos y con cualquier separador convertido en un espacio."""
+    texto = unicodedata.normalize('NFKD', str(texto or '').lower())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return _NO_ALFANUMERICO.sub(' ', texto).strip()
+
+
+def trigramas_palabra(palabra):
+    relleno = '  ' + palabra
+    return {relleno[i:i + 3] for i in range(len(relleno) - 2)}
+
+
+def trigramas_texto(texto):
+    trigramas = set()
+    for palabra in normalizar(texto).split():
+        trigramas |= trigramas_palabra(palabra)
+    return trigramas
+
+
+def trigramas_consulta(palabras):
+    """Trigramas que debe tener un cliente para poder coincidir con la consulta.
+
+    ValueError si ninguna palabra tiene tres caracteres o más.
+    """
+    if all(len(palabra) < 3 for palabra in palabras):
+        raise ValueError('La búsqueda debe tener al menos una palabra de 3 caracteres o más')
+    trigramas = set()
+    for palabra in palabras:
+        if len(palabra) >= 3:
+            trigramas |= {palabra[i:i + 3] for i in range(len(palabra) - 2)}
+        else:
+            # Una o dos letras junto a otra palabra: solo como prefijo de palabra
+            trigramas.add(('  ' + palabra)[-3:])
+    return trigramas
+
+
+def _contiene(texto, palabra):
+    if len(palabra) >= 3:
+        return palabra in texto
+    return (' ' + texto).find(' ' + palabra) >= 0
+
+
+def puntuar(palabras, valores):
+    """Relevancia de un cliente (menor es mejor) o None si no coincide.
+
+    valores son los campos normalizados en orden de preferencia (nombre antes
+    que email antes que teléfono).
+    """
+    frase = ' '.join(palabras)
+    for peso, valor in enumerate(valores):
+        if valor == frase:
+            return (0, peso)
+    for peso, valor in enumerate(valores):
+        if valor.startswith(frase):
+            return (1, peso)
+    for peso, valor in enumerate(valores):
+        if (' ' + valor).find(' ' + frase) >= 0:
+            return (2, peso)
+    for peso, valor in enumerate(valores):
+        if frase in valor:
+            return (3, peso)
+    # Todas las palabras, aunque sea en otro orden o en campos distintos
+    todo = ' '.join(valores)
+    if all(_contiene(todo, palabra) for palabra in palabras):
+        return (4, 0)
+    return None
+
+
+def trigramas_cliente(id_cliente, valores):
+    """Filas (TRIGRAMA, CAMPO, ID_CLIENTE) de un cliente; valores en el orden de CAMPOS_CLIENTE."""
+    filas = []
+    for campo, valor in zip(CAMPOS_CLIENTE, valores):
+        if valor is not None:
+            filas.extend((t, campo, id_cliente) for t in sorted(trigramas_texto(valor)))
+    return filas
+
+
+# ===== Mantenimiento (mismo cursor y transacción que el endpoint) =====
+
+def indexar_cliente(cursor, id_cliente):
+    """Recalcula los trigramas de un cliente a partir de su fila actual en clientes."""
+    desindexar_cliente(cursor, id_cliente)
+    cursor.execute(f"SELECT {COLUMNAS_CAMPOS} FROM clientes WHERE ID_CLIENTE = %s", (id_cliente,))
+    fila = cursor.fetchone()
+    if fila:
+        cursor.executemany("INSERT INTO clientes_trigramas (TRIGRAMA, CAMPO, ID_CLIENTE) VALUES (%s, %s, %s)",
+                           trigramas_cliente(id_cliente, fila))
+
+
+def desindexar_cliente(cursor, id_cliente):
+    cursor.execute("DELETE FROM clientes_trigramas WHERE ID_CLIENTE = %s", (id_cliente,))
+
+
+# ===== Creación y reconstrucción =====
+
+def reconstruir(conn):
+    """Vacía el índice y lo rellena desde clientes por lotes, confirmando cada lote."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("DELETE FROM clientes_trigramas")
+        conn.commit()
+        ultimo, total = '', 0
+        while True:
+            cursor.execute(f"""SELECT ID_CLIENTE, {COLUMNAS_CAMPOS} FROM clientes
+                               WHERE ID_CLIENTE > %s ORDER BY ID_CLIENTE LIMIT %s""", (ultimo, LOTE_INDEXADO))
+            filas = cursor.fetchall()
+            if not filas:
+                return total
+            valores = []
+            for id_cliente, *campos in filas:
+                valores.extend(trigramas_cliente(id_cliente, campos))
+            cursor.executemany("""INSERT IGNORE INTO clientes_trigramas (TRIGRAMA, CAMPO, ID_CLIENTE)
+                                  VALUES (%s, %s, %s)""", valores)
+            conn.commit()
+            ultimo = filas[-1][0]
+            total += len(filas)
+    finally:
+        cursor.close()
+
+
+def crear_tabla(cursor):
+    """Crea clientes_trigramas vacía, borrando la anterior si la había."""
+    cursor.execute("DROP TABLE IF EXISTS clientes_trigramas")
+    cursor.execute(TABLA)
+
+
+def asegurar(conn):
+    """Crea y rellena el índice si no existe o es anterior a la columna CAMPO.
+
+    Devuelve True si lo ha (re)creado.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""SELECT COUNT(*) FROM information_schema.COLUMNS
+                          WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'clientes_trigramas'
+                            AND COLUMN_NAME = 'CAMPO'""")
+        if cursor.fetchone()[0]:
+            return False
+        crear_tabla(cursor)
+    finally:
+        cursor.close()
+    reconstruir(conn)
+    return True
+
+
+# ===== Búsqueda =====
+
+def buscar_clientes(cursor, texto, campos=CAMPOS_CLIENTE, limite=20):
+    """Clientes que coinciden con texto en los campos indicados, de más a menos relevante.
+
+    Devuelve filas (ID_CLIENTE, N_CLIENTE, NUM_TELEFONO, EMAIL, ESTUDIOS, SEXO, EDAD).
+    """
+    palabras = normalizar(texto).split()
+    if not palabras:
+        return []
+    trigramas = trigramas_consulta(palabras)
+    # Los trigramas pueden repetirse en varios campos: se cuentan una vez
+    cursor.execute("""SELECT ID_CLIENTE FROM clientes_trigramas
+                      WHERE TRIGRAMA IN %s AND CAMPO IN %s
+                      GROUP BY ID_CLIENTE
+                      HAVING COUNT(DISTINCT TRIGRAMA) = %s""", (tuple(trigramas), tuple(campos), len(trigramas)))
+    candidatos = [fila[0] for fila in cursor.fetchall()]
+
+    # Todos los candidatos pasan por puntuar(); solo se guardan los limite mejores
+    posicion = {'nombre': 1, 'email': 3, 'telefono': 2}
+    mejores = []
+    for inicio in range(0, len(candidatos), LOTE_CANDIDATOS):
+        lote = tuple(candidatos[inicio:inicio + LOTE_CANDIDATOS])
+        cursor.execute("""SELECT ID_CLIENTE, N_CLIENTE, NUM_TELEFONO, EMAIL, ESTUDIOS, SEXO, EDAD
+                          FROM clientes WHERE ID_CLIENTE IN %s""", (lote,))
+        for fila in cursor.fetchall():
+            valores = [normalizar(fila[posicion[campo]]) for campo in campos]
+            puntuacion = puntuar(palabras, valores)
+            if puntuacion is not None:
+                mejores.append((puntuacion, len(valores[0]), normalizar(fila[1]), fila[0], fila))
+        mejores = heapq.nsmallest(limite, mejores, key=lambda r: r[:4])
+    return [r[4] for r in mejores]
+
+
+if __name__ == '__main__':
+    import time
+
+    import MySQLdb
+
+    from config import config
+
+    ajustes = config['development']
+    conn = MySQLdb.connect(host=ajustes.MYSQL_HOST, user=ajustes.MYSQL_USER,
+                           passwd=ajustes.MYSQL_PASSWORD, db=ajustes.MYSQL_DB,
+                           charset=ajustes.MYSQL_CHARSET, use_unicode=True)
+    inicio = time.perf_counter()
+    cursor = conn.cursor()
+    crear_tabla(cursor)
+    cursor.close()
+    total = reconstruir(conn)
+    print(f"✓ clientes_trigramas: {total} clientes indexados en {time.perf_counter() - inicio:.1f}s")
+    conn.close()
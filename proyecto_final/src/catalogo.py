@@ -0,0 +1,230 @@
+"""
+Catálogo de restaurantes en memoria.
+
+La tabla restaurantes apenas cambia, así que se carga una vez en un snapshot
+inmutable y versionado que sirve /api/restaurantes y /api/restaurantes/<id>
+sin tocar la base de datos. Cada CATALOGO_TTL segundos se compara el
+CHECKSUM TABLE de restaurantes y, solo si ha cambiado, se recarga.
+
+Con el mismo mecanismo se mantienen las cartas de los restaurantes y el
+índice de alérgenos por plato, que responde al filtro ?alergia= con
+operaciones de bits en lugar de SQL.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+log = logging.getLogger(__name__)
+
+Restaurante = namedtuple('Restaurante', [
+    'id', 'nombre', 'ciudad', 'ccaa', 'tipo_comida', 'presupuesto', 'estrellas', 'cadena'
+])
+
+SnapshotCatalogo = namedtuple('SnapshotCatalogo', [
+    'version',         # Entero que crece con cada recarga
+    'checksum',        # CHECKSUM TABLE restaurantes en el momento de la carga
+    'restaurantes',    # Tupla de Restaurante ordenada por estrellas DESC, nombre
+    'por_id',          # {ID_RESTAURANTE en mayúsculas: Restaurante} de solo lectura
+    'json_listado',    # Cuerpo JSON ya serializado de /api/restaurantes
+    'etag',
+])
+
+SQL_RESTAURANTES = """SELECT ID_RESTAURANTE, NOMBRE, CIUDAD, CCAA, T_COMIDA,
+                      PRESUPUESTO, ESTRELLA_MICH, CADENA
+                      FROM restaurantes ORDER BY ESTRELLA_MICH DESC, NOMBRE"""
+
+
+def fila_a_restaurante(fila):
+    return Restaurante(
+        id=fila[0],
+        nombre=fila[1],
+        ciudad=fila[2],
+        ccaa=fila[3],
+        tipo_comida=fila[4],
+        presupuesto=fila[5],
+        estrellas=fila[6],
+        cadena=fila[7] if fila[7] and fila[7] != 'NULL' else None
+    )
+
+
+def serializar_listado(restaurantes):
+    cuerpo = {
+        'restaurantes': [r._asdict() for r in restaurantes],
+        'mensaje': 'Restaurantes listados'
+    }
+    return json.dumps(cuerpo, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+class CacheTablas:
+    """Base de los snapshots en memoria sobre tablas que casi no cambian.
+
+    Las subclases indican sus TABLAS e implementan _construir(); la base se
+    encarga del versionado, del TTL y de recargar solo si cambia el checksum.
+    """
+    TABLAS = ()
+    NOMBRE = 'cache'
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._snapshot = None
+        self._comprobado_en = 0.0
+        self._lock = threading.Lock()
+
+    def _checksum(self, cursor):
+        cursor.execute("CHECKSUM TABLE " + ", ".join(self.TABLAS))
+        return tuple(fila[1] for fila in cursor.fetchall())
+
+    def _construir(self, cursor, version, checksum):
+        raise NotImplementedError
+
+    def cargar(self, cursor):
+        """Lee las tablas y publica un snapshot nuevo."""
+        with self._lock:
+            checksum = self._checksum(cursor)
+            version = self._snapshot.version + 1 if self._snapshot else 1
+            self._snapshot = self._construir(cursor, version, checksum)
+            self._comprobado_en = time.monotonic()
+            log.info("%s v%d cargado", self.NOMBRE, version)
+            return self._snapshot
+
+    def invalidar(self):
+        """Fuerza que el próximo acceso vuelva a comprobar las tablas."""
+        self._comprobado_en = 0.0
+
+    def actual(self, abrir_cursor):
+        """Devuelve el snapshot vigente.
+
+        abrir_cursor solo se llama si no hay snapshot o si ha vencido el TTL,
+        de modo que la mayoría de peticiones no hacen ninguna consulta.
+        """
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._comprobado_en < self.ttl:
+            return snapshot
+
+        cursor = abrir_cursor()
+        if snapshot is None:
+            return self.cargar(cursor)
+        if self._checksum(cursor) != snapshot.checksum:
+            return self.cargar(cursor)
+        self._comprobado_en = time.monotonic()
+        return snapshot
+
+
+class CatalogoRestaurantes(CacheTablas):
+    TABLAS = ('restaurantes',)
+    NOMBRE = 'Catálogo de restaurantes'
+
+    def _construir(self, cursor, version, checksum):
+        cursor.execute(SQL_RESTAURANTES)
+        restaurantes = tuple(fila_a_restaurante(fila) for fila in cursor.fetchall())
+        json_listado = serializar_listado(restaurantes)
+        return SnapshotCatalogo(
+            version=version,
+            checksum=checksum,
+            restaurantes=restaurantes,
+            por_id=MappingProxyType({r.id.upper(): r for r in restaurantes}),
+            json_listado=json_listado,
+            etag=hashlib.sha1(json_listado).hexdigest(),
+        )
+
+    def buscar(self, snapshot, id_restaurante):
+        # La collation de MySQL no distingue mayúsculas al comparar IDs
+        return snapshot.por_id.get(id_restaurante.strip().upper())
+
+
+def mascaras_minimas(mascaras):
+    """Reduce las máscaras de los platos de un restaurante a las minimales.
+
+    Si un plato tiene un subconjunto de los alérgenos de otro, el segundo
+    nunca puede ser el único plato seguro, así que se descarta.
+    """
+    minimas = []
+    for mascara in sorted(set(mascaras), key=lambda m: bin(m).count('1')):
+        if not any(mascara & m == m for m in minimas):
+            minimas.append(mascara)
+    return tuple(minimas)
+
+
+Plato = namedtuple('Plato', ['nombre', 'tipo', 'precio', 'mascara', 'alergenos'])
+
+
+class SnapshotAlergenos(namedtuple('SnapshotAlergenos', [
+    'version',
+    'checksum',
+    'bits',                  # {nombre de alérgeno en minúsculas: bit}
+    'mascara_plato',         # {(ID_RESTAURANTE, N_PLATO): máscara de alérgenos}
+    'mascaras_restaurante',  # {ID_RESTAURANTE: máscaras minimales de sus platos}
+    'menus',                 # {ID_RESTAURANTE en mayúsculas: tupla de Plato ya ordenada}
+])):
+    __slots__ = ()
+
+    def mascara(self, nombres):
+        """Combina una lista de nombres de alérgenos en una máscara.
+
+        Los nombres desconocidos no aportan bits, igual que hacía la consulta SQL.
+        """
+        mascara = 0
+        for nombre in nombres:
+            mascara |= self.bits.get(nombre.strip().lower(), 0)
+        return mascara
+
+    def restaurante_seguro(self, id_restaurante, mascara):
+        """True si el restaurante tiene al menos un plato sin ninguno de esos alérgenos."""
+        return any(m & mascara == 0 for m in self.mascaras_restaurante.get(id_restaurante, ()))
+
+    def menu(self, id_restaurante):
+        return self.menus.get(id_restaurante.strip().upper(), ())
+
+
+class IndiceAlergenos(CacheTablas):
+    """Cartas de los restaurantes con la máscara de bits de alérgenos de cada plato.
+
+    Solo hay 14 filas en alergenos, así que los alérgenos de un plato caben en un entero.
+    """
+    TABLAS = ('alergenos', 'platos', 'alergias')
+    NOMBRE = 'Índice de alérgenos'
+
+    def _construir(self, cursor, version, checksum):
+        cursor.execute("SELECT ALERGENO, NUM_ALERGENO FROM alergenos ORDER BY NUM_ALERGENO")
+        alergenos = cursor.fetchall()
+        bit_por_num = {fila[1]: 1 << i for i, fila in enumerate(alergenos)}
+        bits = {fila[0].lower(): bit_por_num[fila[1]] for fila in alergenos}
+        nombres = [fila[0] for fila in alergenos]  # nombres[i] corresponde al bit 1 << i
+
+        # Una sola consulta con todas las cartas y sus alérgenos, en el orden de la carta
+        cursor.execute("""SELECT p.ID_RESTAURANTE, p.N_PLATO, p.T_PLATO, p.PRECIO, al.NUM_ALERGENO
+                          FROM platos p
+                          LEFT JOIN alergias al ON al.ID_RESTAURANTE = p.ID_RESTAURANTE
+                                                AND al.N_PLATO = p.N_PLATO
+                          ORDER BY p.ID_RESTAURANTE,
+                                   FIELD(p.T_PLATO, 'ENTRANTE', 'PRINCIPAL', 'POSTRE', 'BEBIDA'),
+                                   p.PRECIO DESC, p.N_PLATO""")
+        mascara_plato = {}
+        datos_plato = {}
+        for id_rest, n_plato, t_plato, precio, num_alergeno in cursor.fetchall():
+            clave = (id_rest, n_plato)
+            mascara_plato[clave] = mascara_plato.get(clave, 0) | bit_por_num.get(num_alergeno, 0)
+            datos_plato.setdefault(clave, (t_plato, float(precio)))
+
+        por_restaurante = {}
+        menus = {}
+        for (id_rest, n_plato), mascara in mascara_plato.items():
+            por_restaurante.setdefault(id_rest, []).append(mascara)
+            tipo, precio = datos_plato[(id_rest, n_plato)]
+            alergenos_plato = tuple(n for i, n in enumerate(nombres) if mascara >> i & 1)
+            menus.setdefault(id_rest.upper(), []).append(
+                Plato(n_plato, tipo, precio, mascara, alergenos_plato))
+
+        return SnapshotAlergenos(
+            version=version,
+            checksum=checksum,
+            bits=MappingProxyType(bits),
+            mascara_plato=MappingProxyType(mascara_plato),
+            mascaras_restaurante=MappingProxyType(
+                {id_rest: mascaras_minimas(m) for id_rest, m in por_restaurante.items()}),
+            menus=MappingProxyType({id_rest: tuple(platos) for id_rest, platos in menus.items()}),
+        )
@@ -0,0 +1,253 @@
+"""
+Comprobación de los planes de ejecución de las consultas de la API.
+
+Llama con el cliente de pruebas de Flask a todos los endpoints de app.py
+contra la BD de config.py (cargada con los datos de databases_csv), apunta
+cada sentencia que lanzan y le pasa EXPLAIN. Termina con código 1 si alguna
+recorre una tabla entera (type ALL) o tiene que ordenar con filesort, salvo
+las lecturas completas que se hacen a propósito (LECTURAS_COMPLETAS).
+
+- Antes de empezar, create_app() aplica las migraciones de índices pendientes
+  (migraciones.py), así que se comprueban los índices que tendrá producción.
+- Las escrituras (reservas, facturas, reseñas, borrado de un cliente) se
+  ejecutan de verdad pero no se guardan: durante la comprobación las
+  conexiones del pool hacen rollback() en lugar de commit().
+- Con las pocas filas de los datos generados MySQL prefiere recorrer la tabla
+  aunque haya un índice útil; la sesión de EXPLAIN fija max_seeks_for_key = 1
+  para que elija el plan que elegiría con una tabla grande.
+- Los endpoints del blueprint a los que no llama se listan como aviso, para
+  que un endpoint nuevo no se quede sin comprobar.
+
+Uso: python comprobar_planes.py [--json]
+"""
+import json
+import re
+import sys
+from datetime import date, timedelta
+
+import MySQLdb
+import MySQLdb.connections
+import MySQLdb.cursors
+from flask import has_request_context, request
+
+import app as modulo
+
+# Tablas que se leen enteras a propósito: {tabla: motivo}
+LECTURAS_COMPLETAS = {
+    'restaurantes': 'el catálogo en memoria se carga entero (catalogo.py)',
+    'platos': 'el índice de alérgenos carga todas las cartas (catalogo.py)',
+    'alergias': 'el índice de alérgenos carga todas las cartas (catalogo.py)',
+    'alergenos': 'catálogo fijo de alérgenos',
+    'capacidad_restaurantes': 'una fila por restaurante; se lee entera para comparar versiones (disponibilidad.py)',
+    'resumen_facturas_dia': 'el mercado de precios agrega el gasto de todos los restaurantes (mercado.py)',
+}
+# Lecturas completas de un endpoint concreto: {(endpoint, tabla): motivo}
+LECTURAS_COMPLETAS_ENDPOINT = {
+    ('api.listar_clientes', 'clientes'): 'exportación de todos los clientes',
+    ('api.importar_reservas', 'clientes'): 'ID de todos los clientes para validar el fichero',
+}
+
+SENTENCIA_EXPLICABLE = re.compile(r'\s*(SELECT|UPDATE|DELETE|INSERT\s+INTO\s+\w+\s*\([^)]*\)\s*SELECT)\b', re.I)
+# El filesort de una sentencia que agrupa o numera filas ordena el resultado ya agregado, no la tabla
+SENTENCIA_AGREGADA = re.compile(r'\bGROUP\s+BY\b|\bOVER\s*\(', re.I)
+
+
+class RegistroSentencias:
+    """Apunta (endpoint, SQL) de cada sentencia que se ejecuta dentro de una petición."""
+    sentencias = []
+
+    def execute(self, query, args=None):
+        resultado = super().execute(query, args)
+        if has_request_context() and SENTENCIA_EXPLICABLE.match(query):
+            sql = self._executed
+            if isinstance(sql, bytes):
+                sql = sql.decode('utf-8', 'replace')
+            self.sentencias.append((request.endpoint, sql))
+        return resultado
+
+
+class CursorRegistro(RegistroSentencias, MySQLdb.cursors.Cursor):
+    pass
+
+
+class CursorServidorRegistro(RegistroSentencias, MySQLdb.cursors.SSCursor):
+    pass
+
+
+class ConexionSinCommit(MySQLdb.connections.Connection):
+    """Conexión del pool durante la comprobación: commit() deshace la transacción."""
+
+    def commit(self):
+        self.rollback()
+
+
+def conectar():
+    ajustes = modulo.config['development']
+    return MySQLdb.connect(host=ajustes.MYSQL_HOST, user=ajustes.MYSQL_USER,
+                           passwd=ajustes.MYSQL_PASSWORD, db=ajustes.MYSQL_DB,
+                           charset=ajustes.MYSQL_CHARSET, use_unicode=True)
+
+
+def ejemplos(cursor):
+    """ID reales con los que llamar a los endpoints: los que más filas tienen detrás."""
+    def uno(sql, *params):
+        cursor.execute(sql, params)
+        fila = cursor.fetchone()
+        if fila is None:
+            raise RuntimeError(f'La BD no tiene datos para: {sql}')
+        return fila
+
+    restaurante, = uno("""SELECT ID_RESTAURANTE FROM reservas
+                          GROUP BY ID_RESTAURANTE ORDER BY COUNT(*) DESC LIMIT 1""")
+    cliente, = uno("""SELECT ID_CLIENTE FROM facturas
+                      GROUP BY ID_CLIENTE ORDER BY COUNT(*) DESC LIMIT 1""")
+    reserva, cliente_reserva = uno("""SELECT r.ID_RESERVA, r.ID_CLIENTE FROM reservas r
+                                      LEFT JOIN facturas f ON f.ID_RESERVA = r.ID_RESERVA
+                                      WHERE r.ID_RESTAURANTE = %s AND f.ID_FACTURA IS NULL
+                                      LIMIT 1""", restaurante)
+    plato, = uno("SELECT N_PLATO FROM platos WHERE ID_RESTAURANTE = %s LIMIT 1", restaurante)
+    alergeno, = uno("SELECT ALERGENO FROM alergenos LIMIT 1")
+    nombre, = uno("SELECT N_CLIENTE FROM clientes WHERE ID_CLIENTE = %s", cliente)
+    return {'restaurante': restaurante, 'cliente': cliente, 'reserva': reserva,
+            'cliente_reserva': cliente_reserva, 'plato': plato, 'alergeno': alergeno,
+            'nombre': nombre.split()[0]}
+
+
+def peticiones(e):
+    """[(método, URL, cuerpo JSON)] que cubren los endpoints de la API."""
+    r, c, rv = e['restaurante'], e['cliente'], e['reserva']
+    manana = (date.today() + timedelta(days=1)).isoformat()
+    reserva = {'id_cliente': e['cliente_reserva'], 'id_restaurante': r,
+               'fecha': manana, 'hora': '13:00', 'num_personas': 2}
+    factura = {'id_restaurante': r, 'id_reserva': rv, 'platos': [{'nombre': e['plato'], 'cantidad': 2}]}
+    analytics = f'/api/restaurantes/{r}/analytics'
+    return [
+        ('GET', '/api/restaurantes', None),
+        ('GET', f"/api/restaurantes?alergia={e['alergeno']}", None),
+        ('GET', f'/api/restaurantes/{r}', None),
+        ('GET', f"/api/restaurantes/{r}/platos?alergia={e['alergeno']}", None),
+        ('GET', f"/api/buscar?q={e['plato'].split()[0]}", None),
+        ('GET', f'/api/disponibilidad?fecha={manana}&personas=2', None),
+        ('GET', '/api/alergenos', None),
+        ('GET', '/metrics', None),
+        # Listados: primera página y, con su token, la siguiente
+        ('GET', f'/api/reservas/{c}?limit=1', None),
+        ('GET', f'/api/restaurantes/{r}/reservas?limit=1', None),
+        ('GET', f'/api/restaurantes/{r}/facturas?limit=1', None),
+        ('GET', f'/api/facturas/{c}?limit=1', None),
+        ('GET', f'/api/resenas/{c}', None),
+        ('GET', f'/api/clientes/buscar?id={c}', None),
+        ('GET', f"/api/clientes/buscar?q={e['nombre']}", None),
+        ('GET', '/clientes?formato=ndjson&campos=ID_CLIENTE', None),
+        ('GET', f"/clientes/'{c}'", None),
+        # Analytics
+        ('GET', f'{analytics}/dashboard?format=svg', None),
+        ('GET', f'{analytics}/sin-valorar', None),
+        ('GET', f'{analytics}/gasto-medio', None),
+        ('GET', f'{analytics}/dia-mas-concurrido', None),
+        ('GET', f'{analytics}/top-platos', None),
+        ('GET', f'{analytics}/top-platos?desde=2000-01-01&hasta={manana}&agrupar=tipo', None),
+        ('GET', f'{analytics}/grafico-dias?format=svg', None),
+        ('GET', f'{analytics}/grafico-dias.svg', None),
+        ('GET', f'{analytics}/grafico-precio-comparativo?format=svg', None),
+        ('GET', f'{analytics}/grafico-precio-comparativo.svg', None),
+        # Escrituras (se deshacen al terminar cada petición)
+        ('POST', '/api/reservas', reserva),
+        ('POST', '/api/reservas/importar?formato=ndjson', reserva),
+        ('PUT', f'/api/reservas/update/{rv}', reserva),
+        ('POST', '/api/restaurantes/factura/crear', factura),
+        ('POST', f'/api/restaurantes/{r}/facturas/lote', {'facturas': [factura]}),
+        ('POST', f'/api/reservas/{rv}/factura', None),
+        ('POST', '/api/resenas', {'id_cliente': c, 'id_restaurante': r, 'valoracion': 4.5,
+                                  'tipo_visita': 'PAREJA'}),
+        ('DELETE', f'/api/reservas/cancel/{rv}', None),
+        ('PUT', f'/api/clientes/{c}', {'nombre': e['nombre'], 'email': 'plan@example.com',
+                                       'telefono': 600000000, 'edad': 30, 'estudios': 'GRADO'}),
+        ('DELETE', f'/api/clientes/{c}', None),
+    ]
+
+
+def lanzar(cliente, metodo, url, cuerpo):
+    """Hace la petición (y la de la página siguiente si es un listado). Devuelve los errores 5xx."""
+    if metodo == 'POST' and url.startswith('/api/reservas/importar'):
+        respuesta = cliente.post(url, data=json.dumps(cuerpo) + '\n', content_type='application/x-ndjson')
+    else:
+        respuesta = cliente.open(url, method=metodo, json=cuerpo)
+    respuesta.get_data()  # consume las respuestas en streaming
+    errores = [f'{metodo} {url}: HTTP {respuesta.status_code}'] if respuesta.status_code >= 500 else []
+    datos = respuesta.get_json(silent=True)
+    if isinstance(datos, dict) and datos.get('siguiente') and 'after=' not in url:
+        errores += lanzar(cliente, metodo, f"{url}&after={datos['siguiente']}", cuerpo)
+    return errores
+
+
+def problemas_plan(cursor, endpoint, sql):
+    """[(tabla, problema, filas estimadas)] del EXPLAIN de una sentencia."""
+    cursor.execute("EXPLAIN " + sql)
+    columnas = [d[0].lower() for d in cursor.description]
+    problemas = []
+    for fila in cursor.fetchall():
+        plan = dict(zip(columnas, fila))
+        tabla, extra = plan.get('table') or '', plan.get('extra') or ''
+        if (plan.get('type') == 'ALL' and not tabla.startswith('<')
+                and tabla not in LECTURAS_COMPLETAS and (endpoint, tabla) not in LECTURAS_COMPLETAS_ENDPOINT):
+            problemas.append((tabla, 'recorre la tabla entera', plan.get('rows')))
+        if ('Using filesort' in extra and not tabla.startswith('<')
+                and not SENTENCIA_AGREGADA.search(sql)):
+            problemas.append((tabla, 'ordena con filesort', plan.get('rows')))
+    return problemas
+
+
+def comprobar():
+    app = modulo.create_app()
+    app.config['TESTING'] = True
+    pool = modulo.conexion.pool
+    # Las conexiones ya abiertas se cierran y las nuevas apuntan sus sentencias y no confirman nada
+    pool.cerrar()
+    pool._crear = lambda: ConexionSinCommit(**dict(pool.parametros, cursorclass=CursorRegistro))
+    modulo.conexion.cursor_servidor = lambda: modulo.conexion.cursor(CursorServidorRegistro)
+
+    probados = set()
+    app.before_request(lambda: probados.add(request.endpoint))
+
+    conn = conectar()
+    try:
+        cursor = conn.cursor()
+        datos = ejemplos(cursor)
+        cliente = app.test_client()
+        errores = []
+        for metodo, url, cuerpo in peticiones(datos):
+            errores += lanzar(cliente, metodo, url, cuerpo)
+
+        cursor.execute("SET SESSION max_seeks_for_key = 1")
+        resultados, vistas = [], set()
+        for endpoint, sql in RegistroSentencias.sentencias:
+            if (endpoint, sql) in vistas:
+                continue
+            vistas.add((endpoint, sql))
+            for tabla, problema, filas in problemas_plan(cursor, endpoint, sql):
+                resultados.append({'endpoint': endpoint, 'tabla': tabla, 'problema': problema,
+                                   'filas': filas, 'sql': ' '.join(sql.split())})
+    finally:
+        conn.close()
+
+    sin_probar = sorted({regla.endpoint for regla in app.url_map.iter_rules()
+                         if regla.endpoint.startswith('api.')} - probados)
+    return {'sentencias': len(vistas), 'problemas': resultados, 'errores': errores, 'sin_probar': sin_probar}
+
+
+if __name__ == '__main__':
+    informe = comprobar()
+    if '--json' in sys.argv[1:]:
+        print(json.dumps(informe, ensure_ascii=False, indent=2))
+    else:
+        print(f"\n{informe['sentencias']} sentencias distintas comprobadas con EXPLAIN")
+        for p in informe['problemas']:
+            print(f"✗ {p['endpoint']}: {p['tabla']} {p['problema']} (~{p['filas']} filas)\n    {p['sql'][:300]}")
+        for error in informe['errores']:
+            print(f"✗ {error}")
+        for endpoint in informe['sin_probar']:
+            print(f"⚠ {endpoint}: sin probar")
+        if not informe['problemas'] and not informe['errores']:
+            print("✓ Ningún recorrido completo ni filesort")
+    sys.exit(1 if informe['problemas'] or informe['errores'] else 0)
@@ -5,9 +5,59 @@ class DevelopmentConfig():
     MYSQL_PASSWORD = 'root'
     MYSQL_DB='theknife_db'
     MYSQL_CHARSET = 'utf8mb4'
+    MYSQL_COLLATION = 'utf8mb4_unicode_ci'
+    MYSQL_POOL_MIN_SIZE = 2
+    MYSQL_POOL_MAX_SIZE = 10
+    MYSQL_POOL_TIMEOUT = 5  # segundos esperando una conexión libre
+    MYSQL_POOL_PING_INTERVAL = 30  # ping al sacar conexiones paradas más de N segundos
+    CATALOGO_TTL = 60  # segundos entre comprobaciones de cambios en restaurantes
+    GRAFICOS_CACHE_MAX = 256  # PNGs de analytics guardados en memoria
+    GRAFICOS_PROCESOS = 2  # procesos de matplotlib para dibujar gráficos
+    GRAFICOS_MAX_PENDIENTES = 8  # gráficos en cola antes de responder 503
+    GRAFICOS_TIMEOUT = 10  # segundos máximos por gráfico
+    GRAFICOS_PRECALENTAR = False  # arrancar los procesos de gráficos con la app en vez de con el primer gráfico
+    PAGINA_LIMITE = 50  # filas por página en los listados de reservas y facturas
+    PAGINA_LIMITE_MAX = 200  # máximo que se puede pedir con ?limit=
+    EXPORTACION_LOTE = 1000  # filas leídas y enviadas por fragmento en las exportaciones en streaming
+    BUSQUEDA_LIMITE = 20  # resultados por defecto de las búsquedas
+    BUSQUEDA_LIMITE_MAX = 100  # máximo que se puede pedir con ?limit=
+    TOP_PLATOS_LIMITE = 3  # platos por defecto en el top de analytics
+    TOP_PLATOS_LIMITE_MAX = 50  # máximo que se puede pedir con ?limit=
+    FACTURAS_LOTE = 50  # facturas por transacción en el cierre de servicio
+    FACTURAS_LOTE_MAX = 1000  # facturas como máximo por petición de cierre
+    IMPORTACION_LOTE = 1000  # reservas por transacción en la importación masiva
+    METRICAS = True  # medir peticiones, SQL y gráficos por ruta y exponerlos en /metrics
+    CONSULTAS_AUDITORIA = False  # avisar de N+1 y sentencias lentas y resumir el SQL de cada petición
+    CONSULTAS_REPETIDAS_MAX = 5  # veces que puede repetirse la misma sentencia en una petición antes de avisar de N+1
+    CONSULTAS_LENTA_MS = 100  # milisegundos a partir de los que se escribe una sentencia con sus parámetros
+    CONSULTAS_PRESUPUESTO = None  # sentencias como máximo por petición (None: sin límite)
+    # Principio de las huellas que un endpoint repite por fila a propósito; las
+    # sentencias de cada lote ya se cuentan con db.marcar_lote()
+    CONSULTAS_REPETIDAS_PERMITIDAS = {
+        'api.crear_facturas_lote': ('INSERT INTO facturas ', 'INSERT INTO comandas '),  # una por factura
+    }
+    ID_BLOQUE = 100  # ID de reserva o factura que cada proceso se reserva de una vez
+    DISPONIBILIDAD_TTL = 5  # segundos entre comprobaciones de cambios en las reservas de otros workers
+    AFORO_POR_DEFECTO = 40  # comensales a la vez si el restaurante no tiene AFORO en capacidad_restaurantes
+    DURACION_RESERVA = 120  # minutos que ocupa la mesa una reserva si el restaurante no indica otra
+    HORARIO_RESERVAS = (('12:00', '14:45'), ('19:00', '21:45'))  # primera y última hora que ofrece la búsqueda de disponibilidad en cada turno
+
+
+class TestingConfig(DevelopmentConfig):
+    TESTING = True
+    CONSULTAS_AUDITORIA = True  # en TESTING los N+1 y los excesos de presupuesto hacen fallar el test
+    CONSULTAS_PRESUPUESTO = 25
+
+
+class BenchmarkConfig(DevelopmentConfig):
+    DEBUG = False
+    MYSQL_DB = 'theknife_bench'  # BD aparte que rellena bench_carga.py sembrar
+    MYSQL_POOL_MAX_SIZE = 20
 
 
 config = {
-    'development': DevelopmentConfig
+    'development': DevelopmentConfig,
+    'testing': TestingConfig,
+    'benchmark': BenchmarkConfig
 }
 
@@ -0,0 +1,311 @@
+"""
+Pool de conexiones MySQL para la API de The Knife.
+
+Sustituye a flask_mysqldb.MySQL: las conexiones se reutilizan entre peticiones
+y el charset utf8mb4 se fija una sola vez, al crear cada conexión, en lugar de
+lanzar los SET NAMES en cada petición.
+"""
+import logging
+import threading
+import time
+
+import MySQLdb
+import MySQLdb.cursors
+from flask import g, has_app_context
+
+log = logging.getLogger(__name__)
+
+
+class PoolAgotadoError(Exception):
+    """No hay conexiones libres y el pool ya está en su tamaño máximo."""
+
+
+class UsoSQL:
+    """Sentencias, segundos en MySQL y filas leídas por los cursores de una petición.
+
+    Las subclases pueden sobrescribir anotar() y nuevo_lote() para examinar
+    cada sentencia (ver auditoria_sql.py).
+    """
+    __slots__ = ('sentencias', 'segundos', 'filas')
+
+    def __init__(self):
+        self.sentencias = 0
+        self.segundos = 0.0
+        self.filas = 0
+
+    def anotar(self, segundos, filas, sentencias=1, query=None, args=None):
+        """query y args son los de execute(); None cuando solo se han leído filas."""
+        self.sentencias += sentencias
+        self.segundos += segundos
+        self.filas += filas
+
+    def nuevo_lote(self):
+        """Empieza un lote de un endpoint que procesa filas por lotes (ver marcar_lote())."""
+
+
+def marcar_lote():
+    """Avisa de que la petición empieza otro lote.
+
+    Las sentencias de cada lote se repiten una vez por lote sin que sea un N+1
+    (ver auditoria_sql.py).
+    """
+    uso = g.get('uso_sql') if has_app_context() else None
+    if uso is not None:
+        uso.nuevo_lote()
+
+
+def _anotar(segundos, filas, sentencias=1, query=None, args=None):
+    # Solo se mide si la petición lo ha pedido (g.uso_sql, ver metricas.py)
+    uso = g.get('uso_sql') if has_app_context() else None
+    if uso is not None:
+        uso.anotar(segundos, filas, sentencias, query, args)
+
+
+class CursorMedido(MySQLdb.cursors.Cursor):
+    """Cursor por defecto de las conexiones del pool: anota cada sentencia en g.uso_sql."""
+    _en_executemany = False
+
+    def execute(self, query, args=None):
+        if self._en_executemany:
+            return super().execute(query, args)
+        inicio = time.perf_counter()
+        try:
+            return super().execute(query, args)
+        finally:
+            # Un cursor con buffer ya ha leído todas las filas del resultado
+            _anotar(time.perf_counter() - inicio, len(self._rows or ()), 1, query, args)
+
+    def executemany(self, query, args):
+        # executemany puede llamar a execute por cada fila: cuenta como una sola sentencia
+        inicio = time.perf_counter()
+        self._en_executemany = True
+        try:
+            return super().executemany(query, args)
+        finally:
+            self._en_executemany = False
+            _anotar(time.perf_counter() - inicio, 0, 1, query, args)
+
+
+class SSCursorMedido(MySQLdb.cursors.SSCursor):
+    """SSCursor que anota en g.uso_sql la sentencia y las filas a medida que se leen."""
+
+    def execute(self, query, args=None):
+        inicio = time.perf_counter()
+        try:
+            return super().execute(query, args)
+        finally:
+            _anotar(time.perf_counter() - inicio, 0, 1, query, args)
+
+    def _leer(self, leer, *args):
+        inicio = time.perf_counter()
+        filas = leer(*args)
+        _anotar(time.perf_counter() - inicio, len(filas), sentencias=0)
+        return filas
+
+    def fetchone(self):
+        inicio = time.perf_counter()
+        fila = super().fetchone()
+        _anotar(time.perf_counter() - inicio, fila is not None, sentencias=0)
+        return fila
+
+    def fetchmany(self, size=None):
+        return self._leer(super().fetchmany, size)
+
+    def fetchall(self):
+        return self._leer(super().fetchall)
+
+
+class PoolConexiones:
+    """Pool thread-safe de conexiones MySQLdb con tamaño mínimo y máximo."""
+
+    def __init__(self, host, user, password, db, port=3306, charset='utf8mb4',
+                 collation='utf8mb4_unicode_ci', min_size=2, max_size=10,
+                 timeout=5, ping_interval=30):
+        self.parametros = {
+            'host': host,
+            'user': user,
+            'passwd': password,
+            'db': db,
+            'port': port,
+            'charset': charset,
+            'use_unicode': True,
+            'init_command': f"SET NAMES {charset} COLLATE {collation}",
+            'cursorclass': CursorMedido,
+        }
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.ping_interval = ping_interval
+        self._libres = []  # [(conexion, instante en que se liberó)]
+        self._total = 0
+        self._cond = threading.Condition()
+
+    def _crear(self):
+        return MySQLdb.connect(**self.parametros)
+
+    def conexion_dedicada(self):
+        """Conexión nueva con los mismos parámetros que no cuenta en el pool ni vuelve a él."""
+        return self._crear()
+
+    def precalentar(self):
+        """Abre conexiones hasta tener min_size disponibles."""
+        while True:
+            with self._cond:
+                if self._total >= self.min_size:
+                    return
+                self._total += 1
+            try:
+                conn = self._crear()
+            except Exception:
+                with self._cond:
+                    self._total -= 1
+                raise
+            with self._cond:
+                self._libres.append((conn, time.monotonic()))
+                self._cond.notify()
+
+    def _sana(self, conn, liberada_en):
+        # Solo se hace ping si la conexión lleva tiempo parada
+        if time.monotonic() - liberada_en < self.ping_interval:
+            return True
+        try:
+            conn.ping()
+            return True
+        except MySQLdb.Error:
+            return False
+
+    def _descartar(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._total -= 1
+            self._cond.notify()
+
+    def obtener(self):
+        """Saca una conexión del pool, creando una nueva si hay hueco."""
+        limite = time.monotonic() + self.timeout
+        while True:
+            with self._cond:
+                while not self._libres and self._total >= self.max_size:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        raise PoolAgotadoError(
+                            f'No hay conexiones libres (máximo {self.max_size})')
+                    self._cond.wait(restante)
+                if self._libres:
+                    # LIFO: la última conexión liberada es la que menos tiempo lleva parada
+                    conn, liberada_en = self._libres.pop()
+                else:
+                    conn, liberada_en = None, None
+                    self._total += 1
+
+            if conn is None:
+                try:
+                    return self._crear()
+                except Exception:
+                    with self._cond:
+                        self._total -= 1
+                        self._cond.notify()
+                    raise
+            if self._sana(conn, liberada_en):
+                return conn
+            self._descartar(conn)
+
+    def liberar(self, conn):
+        """Devuelve una conexión al pool, deshaciendo cualquier transacción abierta."""
+        try:
+            conn.rollback()
+        except MySQLdb.Error:
+            self._descartar(conn)
+            return
+        with self._cond:
+            self._libres.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def cerrar(self):
+        with self._cond:
+            libres, self._libres = self._libres, []
+        for conn, _ in libres:
+            self._descartar(conn)
+
+
+class MySQLPool:
+    """Extensión Flask compatible con flask_mysqldb.MySQL respaldada por un pool.
+
+    La conexión es perezosa y de ámbito de petición: solo se saca del pool
+    cuando un endpoint pide su primer cursor (o ``conexion.connection``), y al
+    terminar la petición se cierran sus cursores y se devuelve al pool. Las
+    páginas del frontend y los ficheros estáticos nunca llegan a tocar MySQL.
+    """
+
+    def __init__(self, app=None):
+        self.pool = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('MYSQL_HOST', 'localhost')
+        app.config.setdefault('MYSQL_USER', None)
+        app.config.setdefault('MYSQL_PASSWORD', None)
+        app.config.setdefault('MYSQL_DB', None)
+        app.config.setdefault('MYSQL_PORT', 3306)
+        app.config.setdefault('MYSQL_CHARSET', 'utf8mb4')
+        app.config.setdefault('MYSQL_COLLATION', 'utf8mb4_unicode_ci')
+        app.config.setdefault('MYSQL_POOL_MIN_SIZE', 2)
+        app.config.setdefault('MYSQL_POOL_MAX_SIZE', 10)
+        app.config.setdefault('MYSQL_POOL_TIMEOUT', 5)
+        app.config.setdefault('MYSQL_POOL_PING_INTERVAL', 30)
+
+        self.pool = PoolConexiones(
+            host=app.config['MYSQL_HOST'],
+            user=app.config['MYSQL_USER'],
+            password=app.config['MYSQL_PASSWORD'],
+            db=app.config['MYSQL_DB'],
+            port=app.config['MYSQL_PORT'],
+            charset=app.config['MYSQL_CHARSET'],
+            collation=app.config['MYSQL_COLLATION'],
+            min_size=app.config['MYSQL_POOL_MIN_SIZE'],
+            max_size=app.config['MYSQL_POOL_MAX_SIZE'],
+            timeout=app.config['MYSQL_POOL_TIMEOUT'],
+            ping_interval=app.config['MYSQL_POOL_PING_INTERVAL'],
+        )
+        try:
+            self.pool.precalentar()
+        except MySQLdb.Error as ex:
+            # La app puede arrancar sin BD; las conexiones se abrirán bajo demanda
+            log.warning("No se pudo precalentar el pool MySQL: %s", ex)
+
+        app.teardown_appcontext(self.teardown)
+
+    @property
+    def connection(self):
+        if 'mysql_conn' not in g:
+            g.mysql_conn = self.pool.obtener()
+            g.mysql_cursores = []
+        return g.mysql_conn
+
+    def cursor(self, *args):
+        """Abre un cursor sobre la conexión de la petición y lo registra para cerrarlo en el teardown."""
+        cursor = self.connection.cursor(*args)
+        g.mysql_cursores.append(cursor)
+        return cursor
+
+    def cursor_servidor(self):
+        """Cursor sin buffer (SSCursor): las filas se leen de MySQL a medida que se piden.
+
+        Para recorrer resultados enormes con memoria constante. Mientras no se
+        haya leído todo o cerrado el cursor, la conexión no admite otras consultas.
+        """
+        return self.cursor(SSCursorMedido)
+
+    def teardown(self, exception):
+        for cursor in g.pop('mysql_cursores', ()):
+            try:
+                cursor.close()
+            except Exception:
+                pass
+        conn = g.pop('mysql_conn', None)
+        if conn is not None:
+            self.pool.liberar(conn)
@@ -0,0 +1,230 @@
+"""
+Disponibilidad de mesas por franjas de 15 minutos.
+
+Modelo de capacidad: cada restaurante tiene en capacidad_restaurantes un AFORO
+(comensales a la vez) y una DURACION (minutos que ocupa la mesa una reserva);
+si son NULL se usan AFORO_POR_DEFECTO y DURACION_RESERVA de config.py. Una
+reserva de N personas a las HH:MM suma N comensales a todas las franjas que
+cubre, y otra cabe si en ninguna de ellas se pasa del aforo.
+
+- Búsqueda: IndiceDisponibilidad guarda en memoria, por restaurante y fecha
+  desde hoy, la ocupación de las 96 franjas del día, así que
+  /api/disponibilidad responde para todos los restaurantes sin leer reservas.
+- Reserva: comprobar() bloquea la fila del restaurante en
+  capacidad_restaurantes y calcula la ocupación de ese día desde reservas
+  (índice RV_RESTAURANTE_FECHA) antes de insertar, en la misma transacción.
+  La lectura de reservas es FOR SHARE: lee las últimas filas confirmadas y no
+  la foto de la transacción, que puede ser anterior al bloqueo si el endpoint
+  ya había consultado algo antes.
+  Dos peticiones al mismo restaurante, aunque lleguen a workers distintos, se
+  esperan una a otra y no pueden llenar la misma franja a la vez.
+- Sincronización: toda escritura en reservas llama a tocar_restaurantes()
+  antes del commit, que incrementa VERSION. Al vencer el TTL, el índice lee
+  las versiones (una fila por restaurante) y recarga solo los restaurantes
+  que han cambiado.
+"""
+import logging
+from collections import namedtuple
+from datetime import date, timedelta
+from types import MappingProxyType
+
+from catalogo import CacheTablas
+
+log = logging.getLogger(__name__)
+
+TABLA = """CREATE TABLE IF NOT EXISTS capacidad_restaurantes (
+    ID_RESTAURANTE char(7) NOT NULL,
+    AFORO int NULL,
+    DURACION int NULL,
+    VERSION bigint NOT NULL DEFAULT 0,
+    PRIMARY KEY (ID_RESTAURANTE),
+    CONSTRAINT FKCR FOREIGN KEY (ID_RESTAURANTE) REFERENCES restaurantes(ID_RESTAURANTE) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci"""
+
+MINUTOS_FRANJA = 15
+FRANJAS_DIA = 24 * 60 // MINUTOS_FRANJA
+
+EstadoRestaurante = namedtuple('EstadoRestaurante', [
+    'aforo',
+    'duracion',   # en franjas
+    'version',
+    'ocupacion',  # {fecha 'YYYY-MM-DD': tupla con los comensales de cada franja del día}
+])
+
+SnapshotDisponibilidad = namedtuple('SnapshotDisponibilidad', [
+    'version',
+    'checksum',       # ((ID_RESTAURANTE, AFORO, DURACION, VERSION), ...)
+    'restaurantes',   # {ID_RESTAURANTE en mayúsculas: EstadoRestaurante}
+])
+
+
+class SinDisponibilidad(Exception):
+    """No caben los comensales; alternativas son las horas de ese día en las que sí."""
+
+    def __init__(self, mensaje, alternativas):
+        super().__init__(mensaje)
+        self.alternativas = alternativas
+
+
+# ===== Franjas =====
+
+def franja(hora):
+    """Franja del día (0-95) de una hora 'HH:MM' o de un TIME leído de MySQL."""
+    if isinstance(hora, timedelta):
+        minutos = int(hora.total_seconds()) // 60
+    else:
+        horas, minutos = str(hora).split(':')[:2]
+        minutos = int(horas) * 60 + int(minutos)
+    return minutos // MINUTOS_FRANJA
+
+
+def hora(numero):
+    return f"{numero * MINUTOS_FRANJA // 60:02d}:{numero * MINUTOS_FRANJA % 60:02d}"
+
+
+def franjas_duracion(minutos):
+    return -(-minutos // MINUTOS_FRANJA)
+
+
+def franjas_reservables(horario):
+    """Franjas en las que se puede empezar una reserva; horario es ((primera, última), ...)."""
+    return tuple(f for inicio, fin in horario for f in range(franja(inicio), franja(fin) + 1))
+
+
+def leer_hora(texto, horario):
+    """Franja de una hora pedida por el cliente; ValueError si no es una hora de reserva."""
+    try:
+        horas, minutos = texto.split(':')
+        numero = franja(texto)
+        valida = len(minutos) == 2 and int(minutos) % MINUTOS_FRANJA == 0 and 0 <= int(horas) < 24
+    except (AttributeError, ValueError):
+        valida = False
+    if not valida or numero not in franjas_reservables(horario):
+        turnos = ' y '.join(f'{inicio} a {fin}' for inicio, fin in horario)
+        raise ValueError(f'La hora debe ir en pasos de {MINUTOS_FRANJA} minutos, de {turnos}')
+    return numero
+
+
+def sumar(ocupacion, inicio, duracion, personas):
+    for f in range(inicio, min(inicio + duracion, FRANJAS_DIA)):
+        ocupacion[f] += personas
+
+
+def libres(ocupacion, inicio, duracion, aforo):
+    """Plazas que quedan en todas las franjas que ocuparía una reserva que empieza en inicio."""
+    if not ocupacion:
+        return aforo
+    return aforo - max(ocupacion[inicio:min(inicio + duracion, FRANJAS_DIA)])
+
+
+# ===== Mantenimiento (mismo cursor y transacción que el endpoint) =====
+
+def tocar_restaurantes(cursor, ids_restaurante):
+    """Marca que han cambiado las reservas de estos restaurantes (crea su fila si falta)."""
+    ids = sorted({i.upper() for i in ids_restaurante if i})
+    if ids:
+        cursor.execute("INSERT INTO capacidad_restaurantes (ID_RESTAURANTE) VALUES "
+                       + ", ".join(["(%s)"] * len(ids))
+                       + " ON DUPLICATE KEY UPDATE VERSION = VERSION + 1", ids)
+
+
+def asegurar(conn):
+    """Crea la tabla si no existe y añade con los valores por defecto los restaurantes que falten."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(TABLA)
+        cursor.execute("""INSERT IGNORE INTO capacidad_restaurantes (ID_RESTAURANTE)
+                          SELECT ID_RESTAURANTE FROM restaurantes""")
+        conn.commit()
+    finally:
+        cursor.close()
+
+
+class IndiceDisponibilidad(CacheTablas):
+    NOMBRE = 'Índice de disponibilidad'
+
+    def __init__(self, ttl=5, aforo=40, duracion=120, horario=(('12:00', '14:45'), ('19:00', '21:45'))):
+        super().__init__(ttl)
+        self.aforo = aforo
+        self.duracion = duracion
+        self.horario = horario
+
+    def _checksum(self, cursor):
+        # En vez de CHECKSUM TABLE reservas (que la recorre entera) se comparan las versiones
+        cursor.execute("SELECT ID_RESTAURANTE, AFORO, DURACION, VERSION FROM capacidad_restaurantes")
+        return tuple(sorted((fila[0].upper(), fila[1], fila[2], fila[3]) for fila in cursor.fetchall()))
+
+    def _construir(self, cursor, version, checksum):
+        anterior = self._snapshot.restaurantes if self._snapshot else {}
+        restaurantes, recargar = {}, {}
+        for id_restaurante, aforo, duracion, version_restaurante in checksum:
+            estado = EstadoRestaurante(aforo or self.aforo, franjas_duracion(duracion or self.duracion),
+                                       version_restaurante, {})
+            previo = anterior.get(id_restaurante)
+            if previo is not None and previo[:3] == estado[:3]:
+                restaurantes[id_restaurante] = previo
+            else:
+                recargar[id_restaurante] = estado
+        if recargar:
+            ocupacion = {id_restaurante: {} for id_restaurante in recargar}
+            cursor.execute("""SELECT ID_RESTAURANTE, FECHA_RESERVA, HORA_RESERVA, NUM_PERSONAS
+                              FROM reservas
+                              WHERE ID_RESTAURANTE IN %s AND FECHA_RESERVA >= %s
+                                AND ESTADO_RESERVA <> 'CANCELADA'""",
+                           (tuple(recargar), date.today().isoformat()))
+            for id_restaurante, fecha, hora_reserva, personas in cursor.fetchall():
+                id_restaurante = id_restaurante.upper()
+                dia = ocupacion[id_restaurante].setdefault(str(fecha), [0] * FRANJAS_DIA)
+                sumar(dia, franja(hora_reserva), recargar[id_restaurante].duracion, personas)
+            for id_restaurante, estado in recargar.items():
+                dias = {fecha: tuple(dia) for fecha, dia in ocupacion[id_restaurante].items()}
+                restaurantes[id_restaurante] = estado._replace(ocupacion=MappingProxyType(dias))
+            if anterior:
+                log.info("%s: %d restaurantes recargados", self.NOMBRE, len(recargar))
+        return SnapshotDisponibilidad(version, checksum, MappingProxyType(restaurantes))
+
+    def estado(self, snapshot, id_restaurante):
+        estado = snapshot.restaurantes.get(id_restaurante.upper())
+        # Un restaurante sin fila todavía no tiene reservas registradas en el índice
+        return estado or EstadoRestaurante(self.aforo, franjas_duracion(self.duracion), None, MappingProxyType({}))
+
+    def horas_libres(self, estado, fecha, personas):
+        """[(hora, plazas libres)] de las horas de reserva de ese día en las que caben."""
+        ocupacion = estado.ocupacion.get(fecha)
+        horas = []
+        for f in franjas_reservables(self.horario):
+            plazas = libres(ocupacion, f, estado.duracion, estado.aforo)
+            if plazas >= personas:
+                horas.append((hora(f), plazas))
+        return horas
+
+    def comprobar(self, cursor, id_restaurante, fecha, inicio, personas, excluir=None):
+        """Bloquea el restaurante hasta el commit y comprueba que caben personas a partir de la franja inicio.
+
+        excluir es la reserva que se está modificando, que no cuenta. Lanza
+        SinDisponibilidad con las horas alternativas de ese día si no caben.
+        """
+        cursor.execute("SELECT AFORO, DURACION FROM capacidad_restaurantes WHERE ID_RESTAURANTE = %s FOR UPDATE",
+                       (id_restaurante,))
+        fila = cursor.fetchone()
+        if fila is None:
+            tocar_restaurantes(cursor, [id_restaurante])  # la fila nueva queda bloqueada por el INSERT
+            fila = (None, None)
+        aforo, duracion = fila[0] or self.aforo, franjas_duracion(fila[1] or self.duracion)
+
+        cursor.execute("""SELECT ID_RESERVA, HORA_RESERVA, NUM_PERSONAS FROM reservas
+                          WHERE ID_RESTAURANTE = %s AND FECHA_RESERVA = %s AND ESTADO_RESERVA <> 'CANCELADA'
+                          FOR SHARE""",
+                       (id_restaurante, fecha))
+        ocupacion = [0] * FRANJAS_DIA
+        for id_reserva, hora_reserva, comensales in cursor.fetchall():
+            if excluir is None or id_reserva.upper() != excluir.upper():
+                sumar(ocupacion, franja(hora_reserva), duracion, comensales)
+
+        if libres(ocupacion, inicio, duracion, aforo) < personas:
+            alternativas = [hora(f) for f in franjas_reservables(self.horario)
+                            if libres(ocupacion, f, duracion, aforo) >= personas]
+            mensaje = f'No hay sitio para {personas} personas a las {hora(inicio)}'
+            if alternativas:
+                mensaje += f". Horas con sitio ese día: {', '.join(alternativas)}"
+            raise SinDisponibilidad(mensaje, alternativas)
@@ -0,0 +1,14 @@
+"""
+Densidad de la normal para los gráficos de analytics, en Python puro.
+
+Sustituye a scipy.stats.norm.pdf en graficos.py y graficos_svg.py y evita
+importar scipy (más de un segundo) en cada proceso. Las medias, desviaciones
+y percentiles del mercado se calculan en mercado.py.
+"""
+import math
+
+
+def pdf_normal(x, media, desviacion):
+    """Función de densidad de la normal N(media, desviacion), como scipy.stats.norm.pdf."""
+    z = (x - media) / desviacion
+    return math.exp(-0.5 * z * z) / (desviacion * math.sqrt(2 * math.pi))
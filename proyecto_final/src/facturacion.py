@@ -0,0 +1,101 @@
+"""
+Alta de facturas con sus comandas.
+
+El importe de una factura se calcula en el servidor con los precios de la
+tabla platos, dentro de la misma transacción en que se insertan la factura y
+sus comandas, y todas las comandas se escriben con un único INSERT de varias
+filas. Lo usan POST /api/restaurantes/factura/crear (una factura) y
+POST /api/restaurantes/<id>/facturas/lote (cierre de servicio).
+
+Ninguna función hace commit: quien llama decide cuándo confirmar.
+"""
+from datetime import datetime
+from decimal import Decimal
+
+import identificadores
+
+
+def leer_lineas(platos):
+    """[{'nombre', 'cantidad'}] del cuerpo de la petición → {nombre: unidades}."""
+    if not isinstance(platos, list) or not platos:
+        raise ValueError('La factura debe tener al menos un plato')
+    lineas = {}
+    for plato in platos:
+        nombre = plato.get('nombre') if isinstance(plato, dict) else None
+        if not nombre or not isinstance(nombre, str):
+            raise ValueError('Cada plato debe tener nombre')
+        cantidad = plato.get('cantidad', 1)
+        if isinstance(cantidad, bool) or not isinstance(cantidad, int) or cantidad < 1:
+            raise ValueError(f'La cantidad de {nombre} debe ser un entero positivo')
+        lineas[nombre] = lineas.get(nombre, 0) + cantidad
+    return lineas
+
+
+def precios_platos(cursor, id_restaurante, nombres=None):
+    """{nombre en minúsculas: (N_PLATO, PRECIO)} de la carta, o solo de los platos indicados.
+
+    Las filas quedan bloqueadas en modo compartido hasta el commit, así que
+    el precio no puede cambiar mientras se factura.
+    """
+    sql = "SELECT N_PLATO, PRECIO FROM platos WHERE ID_RESTAURANTE = %s"
+    params = [id_restaurante]
+    if nombres is not None:
+        sql += " AND N_PLATO IN %s"
+        params.append(tuple(nombres))
+    cursor.execute(sql + " FOR SHARE", params)
+    # La collation de MySQL no distingue mayúsculas en N_PLATO
+    return {fila[0].lower(): (fila[0], Decimal(fila[1])) for fila in cursor.fetchall()}
+
+
+def estado_reservas(cursor, id_restaurante, ids_reserva):
+    """{ID_RESERVA: [ID_CLIENTE, ID_FACTURA o None]} de las reservas del restaurante.
+
+    Bloquea las reservas hasta el commit para que dos cierres simultáneos no
+    facturen la misma reserva.
+    """
+    if not ids_reserva:
+        return {}
+    cursor.execute("""SELECT r.ID_RESERVA, r.ID_CLIENTE, f.ID_FACTURA
+                      FROM reservas r
+                      LEFT JOIN facturas f ON f.ID_RESERVA = r.ID_RESERVA
+                      WHERE r.ID_RESTAURANTE = %s AND r.ID_RESERVA IN %s
+                      FOR UPDATE OF r""", (id_restaurante, tuple(ids_reserva)))
+    return {fila[0]: [fila[1], fila[2]] for fila in cursor.fetchall()}
+
+
+def validar_reserva(reservas, id_reserva, id_cliente=None):
+    """Comprueba que la reserva se puede facturar y devuelve su cliente."""
+    if not id_reserva or not isinstance(id_reserva, str):
+        raise ValueError('Cada factura debe indicar id_reserva')
+    if id_reserva not in reservas:
+        raise ValueError(f'La reserva {id_reserva} no existe o no es de este restaurante')
+    cliente, factura = reservas[id_reserva]
+    if factura:
+        raise ValueError(f'La reserva {id_reserva} ya tiene la factura {factura}')
+    if id_cliente and id_cliente != cliente:
+        raise ValueError(f'El cliente {id_cliente} no es el de la reserva {id_reserva}')
+    return cliente
+
+
+def insertar_factura(cursor, id_restaurante, id_reserva, id_cliente, lineas, precios):
+    """Inserta la factura y sus comandas con dos sentencias. Devuelve (id_factura, precio)."""
+    comandas = {}
+    for nombre, cantidad in lineas.items():
+        plato = precios.get(nombre.lower())
+        if plato is None:
+            raise ValueError(f'El plato {nombre} no está en la carta del restaurante')
+        comandas[plato[0]] = comandas.get(plato[0], 0) + cantidad
+    precio = sum((precios[n.lower()][1] * c for n, c in comandas.items()), Decimal('0'))
+
+    id_factura = identificadores.facturas.siguiente()
+    cursor.execute("""INSERT INTO facturas (ID_FACTURA, ID_CLIENTE, ID_RESERVA,
+                      PRECIO, FECHA_FACTURA, ID_RESTAURANTE, TIPO_VISITA)
+                      VALUES (%s, %s, %s, %s, %s, %s, NULL)""",
+                   (id_factura, id_cliente, id_reserva, precio,
+                    datetime.now().strftime('%Y-%m-%d'), id_restaurante))
+    valores = []
+    for n_plato, cantidad in comandas.items():
+        valores.extend((id_factura, n_plato, id_restaurante, cantidad))
+    cursor.execute("INSERT INTO comandas (ID_FACTURA, N_PLATO, ID_RESTAURANTE, NUM_PEDIDOS) VALUES "
+                   + ", ".join(["(%s, %s, %s, %s)"] * len(comandas)), valores)
+    return id_factura, precio
@@ -0,0 +1,267 @@
+"""
+Renderizado y caché de los gráficos de analytics del área de restaurante.
+
+Cada gráfico se describe con un "spec" (tipo + datos de entrada). La huella
+del spec sirve a la vez de clave de versión en la caché y de ETag, de modo
+que un gráfico cuyos datos no han cambiado no se vuelve a dibujar y el
+navegador recibe un 304 si ya lo tiene.
+
+El dibujo se hace en un pool de procesos aparte (ServicioGraficos): la API
+de pyplot no es thread-safe y retiene el GIL cientos de milisegundos, así que
+los hilos que atienden peticiones nunca llegan a importar matplotlib.
+"""
+import hashlib
+import io
+import json
+import multiprocessing
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturoTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+COLORES_DIAS = ['#FF6B6B', '#4ECDC4', '#45B7D1', '#FFA07A', '#98D8C8', '#F7DC6F', '#BB8FCE']
+
+
+def huella(spec):
+    """Huella estable de los datos de un gráfico."""
+    datos = json.dumps(spec, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(datos.encode('utf-8')).hexdigest()
+
+
+class ServicioGraficosOcupado(Exception):
+    """Hay demasiados gráficos en cola; el cliente debe reintentar más tarde."""
+
+
+class TimeoutGrafico(Exception):
+    """El gráfico no se ha dibujado dentro del tiempo máximo."""
+
+
+def _pyplot():
+    import matplotlib
+    matplotlib.use('Agg')  # Backend sin GUI
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def _figura_a_png():
+    plt = _pyplot()
+    buffer = io.BytesIO()
+    plt.savefig(buffer, format='png', dpi=100, bbox_inches='tight')
+    plt.close()
+    return buffer.getvalue()
+
+
+def render_dias_semana(dias, valores):
+    """Gráfico de barras de reservas por día de la semana."""
+    plt = _pyplot()
+    plt.figure(figsize=(10, 6))
+    bars = plt.bar(dias, valores, color=COLORES_DIAS, edgecolor='black', linewidth=1.5)
+
+    # Añadir valores encima de las barras
+    for bar in bars:
+        height = bar.get_height()
+        plt.text(bar.get_x() + bar.get_width()/2., height,
+                 f'{int(height)}',
+                 ha='center', va='bottom', fontsize=12, fontweight='bold')
+
+    plt.xlabel('Día de la Semana', fontsize=12, fontweight='bold')
+    plt.ylabel('Número de Reservas', fontsize=12, fontweight='bold')
+    plt.title('Reservas por Día de la Semana', fontsize=14, fontweight='bold', pad=20)
+    plt.xticks(rotation=45, ha='right')
+    plt.grid(axis='y', alpha=0.3, linestyle='--')
+    plt.tight_layout()
+    return _figura_a_png()
+
+
+def render_precio_comparativo(media, desviacion, total, gasto_restaurante=None):
+    """Curva normal del gasto por persona del mercado con la posición del restaurante."""
+    from estadistica import pdf_normal
+
+    plt = _pyplot()
+    plt.figure(figsize=(12, 7))
+
+    if desviacion > 0:
+        # Crear rango de valores para la curva gaussiana y dibujarla
+        x_min = max(0, media - 4*desviacion)
+        x_max = media + 4*desviacion
+        x = [x_min + (x_max - x_min) * i / 999 for i in range(1000)]
+        y = [pdf_normal(v, media, desviacion) for v in x]
+        plt.plot(x, y, 'b-', linewidth=2.5, label='Distribución de todos los restaurantes')
+        plt.fill_between(x, y, alpha=0.3, color='lightblue')
+    else:
+        # Todos los restaurantes gastan lo mismo: no hay curva, solo las líneas verticales
+        y = [1.0]
+        extremos = (media, gasto_restaurante or media)
+        plt.xlim(max(0, min(extremos) - 1), max(extremos) + 1)
+        plt.ylim(0, 1.1)
+
+    # Añadir línea vertical para el restaurante actual
+    if gasto_restaurante:
+        plt.axvline(x=gasto_restaurante, color='red', linestyle='--', linewidth=3,
+                    label=f'Este restaurante: {gasto_restaurante:.2f}€/persona')
+
+        # Añadir texto con la posición del restaurante
+        y_max = max(y)
+        plt.text(gasto_restaurante, y_max * 0.9, f'{gasto_restaurante:.2f}€',
+                 ha='center', va='bottom', fontsize=12, fontweight='bold',
+                 bbox=dict(boxstyle='round,pad=0.5', facecolor='yellow', alpha=0.7))
+
+    # Añadir línea para la media
+    plt.axvline(x=media, color='green', linestyle=':', linewidth=2,
+                label=f'Media del mercado: {media:.2f}€/persona')
+
+    plt.xlabel('Precio por Persona (€)', fontsize=13, fontweight='bold')
+    plt.ylabel('Densidad de Probabilidad', fontsize=13, fontweight='bold')
+    plt.title('Comparativa de Precio por Persona con el Mercado',
+              fontsize=15, fontweight='bold', pad=20)
+    plt.legend(fontsize=11, loc='upper right')
+    plt.grid(True, alpha=0.3, linestyle='--')
+
+    # Añadir información estadística
+    info_text = f'μ = {media:.2f}€\nσ = {desviacion:.2f}€\nN = {total} restaurantes'
+    plt.text(0.02, 0.98, info_text, transform=plt.gca().transAxes,
+             fontsize=10, verticalalignment='top',
+             bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.5))
+
+    plt.tight_layout()
+    return _figura_a_png()
+
+
+RENDERIZADORES = {
+    'dias_semana': render_dias_semana,
+    'precio_comparativo': render_precio_comparativo,
+}
+
+
+def renderizar(tipo, spec):
+    """Punto de entrada en los procesos del pool: spec → bytes PNG."""
+    return RENDERIZADORES[tipo](**spec)
+
+
+def _calentar_proceso():
+    # Importa matplotlib y dibuja una figura mínima para que la caché de
+    # fuentes ya esté cargada cuando llegue el primer gráfico real
+    plt = _pyplot()
+    plt.figure(figsize=(1, 1))
+    plt.text(0.5, 0.5, 'ok')
+    _figura_a_png()
+
+
+class ServicioGraficos:
+    """Pool acotado de procesos que dibujan gráficos a partir de su spec.
+
+    - max_procesos: procesos de matplotlib precalentados.
+    - max_pendientes: gráficos en vuelo (en cola o dibujándose); por encima
+      se rechaza con ServicioGraficosOcupado en lugar de acumular peticiones.
+    - timeout: segundos de espera por gráfico antes de TimeoutGrafico.
+    """
+
+    def __init__(self, max_procesos=2, max_pendientes=8, timeout=10):
+        self.configurar(max_procesos, max_pendientes, timeout)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def configurar(self, max_procesos, max_pendientes, timeout):
+        self.max_procesos = max_procesos
+        self.timeout = timeout
+        self._huecos = threading.BoundedSemaphore(max_pendientes)
+
+    def init_app(self, app):
+        app.config.setdefault('GRAFICOS_PROCESOS', 2)
+        app.config.setdefault('GRAFICOS_MAX_PENDIENTES', 8)
+        app.config.setdefault('GRAFICOS_TIMEOUT', 10)
+        app.config.setdefault('GRAFICOS_PRECALENTAR', False)
+        self.configurar(app.config['GRAFICOS_PROCESOS'],
+                        app.config['GRAFICOS_MAX_PENDIENTES'],
+                        app.config['GRAFICOS_TIMEOUT'])
+        if app.config['GRAFICOS_PRECALENTAR']:
+            self.precalentar()
+
+    def precalentar(self):
+        """Arranca ya los procesos del pool sin esperar a que terminen de calentarse.
+
+        Por defecto los procesos se crean con el primer gráfico; así el
+        arranque de la app no paga la importación de matplotlib.
+        """
+        executor = self._pool()
+        for _ in range(self.max_procesos):
+            # Cualquier tarea obliga a crear un proceso, que se calienta en su initializer
+            executor.submit(int)
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn: nunca se hace fork de un proceso con hilos y conexiones MySQL abiertas
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_procesos,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_calentar_proceso,
+                )
+            return self._executor
+
+    def _reiniciar(self, executor):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def renderizar(self, tipo, spec):
+        if not self._huecos.acquire(blocking=False):
+            raise ServicioGraficosOcupado('Demasiados gráficos en cola, inténtalo de nuevo')
+        executor = self._pool()
+        try:
+            futuro = executor.submit(renderizar, tipo, spec)
+        except BrokenProcessPool:
+            self._huecos.release()
+            self._reiniciar(executor)
+            raise
+        except Exception:
+            self._huecos.release()
+            raise
+        # El hueco se libera cuando el proceso termina, aunque el cliente ya no espere
+        futuro.add_done_callback(lambda _: self._huecos.release())
+        try:
+            return futuro.result(timeout=self.timeout)
+        except FuturoTimeoutError:
+            raise TimeoutGrafico(f'El gráfico {tipo} ha tardado más de {self.timeout}s')
+        except BrokenProcessPool:
+            self._reiniciar(executor)
+            raise
+
+    def cerrar(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+class CacheGraficos:
+    """Caché LRU de PNGs por (tipo de gráfico, restaurante), versionada por la huella de los datos."""
+
+    def __init__(self, renderizar=renderizar, max_entradas=256):
+        self.renderizar = renderizar
+        self.max_entradas = max_entradas
+        self._entradas = OrderedDict()  # (tipo, id_restaurante) -> (huella, png)
+        self._lock = threading.Lock()
+
+    def obtener(self, tipo, id_restaurante, spec, etiqueta=None):
+        """Devuelve el PNG del gráfico, dibujándolo solo si los datos han cambiado.
+
+        etiqueta es la huella del spec si ya se ha calculado.
+        """
+        etiqueta = etiqueta or huella(spec)
+        clave = (tipo, id_restaurante)
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada and entrada[0] == etiqueta:
+                self._entradas.move_to_end(clave)
+                return entrada[1]
+
+        png = self.renderizar(tipo, spec)
+
+        with self._lock:
+            self._entradas[clave] = (etiqueta, png)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+        return png
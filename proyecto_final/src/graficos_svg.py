@@ -0,0 +1,182 @@
+"""
+Versión SVG nativa de los gráficos de analytics.
+
+Los dos gráficos del área de restaurante son formas sencillas (barras con
+su valor y una curva normal con líneas de referencia), así que se pueden
+generar directamente como texto SVG a partir de listas de Python, sin
+matplotlib, numpy ni scipy. Se dibujan en microsegundos, ocupan unos pocos
+KB y el navegador los escala sin perder calidad.
+"""
+import math
+from xml.sax.saxutils import escape
+
+from estadistica import pdf_normal
+from graficos import COLORES_DIAS
+
+FUENTE = 'font-family="DejaVu Sans, Arial, sans-serif"'
+
+
+def _n(valor):
+    """Coordenada con un decimal como máximo, para que el SVG ocupe poco."""
+    return f'{valor:.1f}'.rstrip('0').rstrip('.')
+
+
+def _paso_redondo(maximo, divisiones=5):
+    """Paso 1, 2 o 5 × 10^k que reparte [0, maximo] en unas `divisiones` marcas."""
+    if maximo <= 0:
+        return 1
+    bruto = maximo / divisiones
+    magnitud = 10 ** math.floor(math.log10(bruto))
+    for factor in (1, 2, 5, 10):
+        if bruto <= factor * magnitud:
+            return factor * magnitud
+    return 10 * magnitud
+
+
+def _marcas(inicio, fin, divisiones=6):
+    paso = _paso_redondo(fin - inicio, divisiones)
+    marca = math.ceil(inicio / paso) * paso
+    marcas = []
+    while marca <= fin + 1e-9:
+        marcas.append(marca)
+        marca += paso
+    return marcas
+
+
+def _texto(x, y, contenido, tamano=12, anchor='middle', negrita=False, extra=''):
+    peso = ' font-weight="bold"' if negrita else ''
+    return (f'<text x="{_n(x)}" y="{_n(y)}" font-size="{tamano}" text-anchor="{anchor}"'
+            f'{peso}{extra}>{escape(str(contenido))}</text>')
+
+
+def _documento(ancho, alto, elementos):
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" width="{ancho}" height="{alto}" '
+            f'viewBox="0 0 {ancho} {alto}" {FUENTE}>'
+            f'<rect width="{ancho}" height="{alto}" fill="white"/>'
+            + ''.join(elementos) + '</svg>')
+
+
+def svg_dias_semana(dias, valores):
+    """Barras de reservas por día de la semana con el valor encima de cada barra."""
+    ancho, alto = 800, 480
+    izq, der, arriba, abajo = 70, 20, 60, 90
+    area_w = ancho - izq - der
+    area_h = alto - arriba - abajo
+    base = arriba + area_h
+
+    # Un 10 % de margen por encima de la barra más alta para su etiqueta
+    y_max = max(max(valores, default=0), 1) * 1.1
+    marcas = _marcas(0, y_max, 5)
+    escala = area_h / y_max
+
+    elementos = [_texto(ancho / 2, 30, 'Reservas por Día de la Semana', 16, negrita=True)]
+    # Rejilla horizontal y marcas del eje Y
+    for marca in marcas:
+        y = base - marca * escala
+        elementos.append(f'<line x1="{izq}" y1="{_n(y)}" x2="{ancho - der}" y2="{_n(y)}" '
+                         f'stroke="#ccc" stroke-dasharray="4 3"/>')
+        elementos.append(_texto(izq - 8, y + 4, f'{marca:g}', 11, anchor='end'))
+
+    hueco = area_w / max(len(dias), 1)
+    for i, (dia, valor) in enumerate(zip(dias, valores)):
+        x = izq + i * hueco + hueco * 0.1
+        w = hueco * 0.8
+        h = valor * escala
+        color = COLORES_DIAS[i % len(COLORES_DIAS)]
+        elementos.append(f'<rect x="{_n(x)}" y="{_n(base - h)}" width="{_n(w)}" height="{_n(h)}" '
+                         f'fill="{color}" stroke="black" stroke-width="1.5"/>')
+        elementos.append(_texto(x + w / 2, base - h - 6, int(valor), 13, negrita=True))
+        cx = x + w / 2
+        elementos.append(_texto(cx, base + 18, dia, 12, anchor='end',
+                                extra=f' transform="rotate(-45 {_n(cx)} {_n(base + 18)})"'))
+
+    elementos.append(f'<line x1="{izq}" y1="{base}" x2="{ancho - der}" y2="{base}" stroke="black"/>')
+    elementos.append(f'<line x1="{izq}" y1="{arriba}" x2="{izq}" y2="{base}" stroke="black"/>')
+    elementos.append(_texto(ancho / 2, alto - 10, 'Día de la Semana', 13, negrita=True))
+    elementos.append(_texto(18, arriba + area_h / 2, 'Número de Reservas', 13, negrita=True,
+                            extra=f' transform="rotate(-90 18 {_n(arriba + area_h / 2)})"'))
+    return _documento(ancho, alto, elementos)
+
+
+def svg_precio_comparativo(media, desviacion, total, gasto_restaurante=None, puntos=200):
+    """Curva normal del gasto por persona del mercado con la media y el restaurante marcados."""
+    ancho, alto = 900, 520
+    izq, der, arriba, abajo = 80, 30, 60, 60
+    area_w = ancho - izq - der
+    area_h = alto - arriba - abajo
+    base = arriba + area_h
+
+    x_min = max(0, media - 4 * desviacion)
+    x_max = media + 4 * desviacion
+    if x_max <= x_min:
+        x_min, x_max = max(0, media - 1), media + 1
+    xs = [x_min + (x_max - x_min) * i / (puntos - 1) for i in range(puntos)]
+    ys = [pdf_normal(x, media, desviacion) for x in xs] if desviacion > 0 else [0.0] * puntos
+    y_max = max(ys) * 1.1 or 1.0
+
+    def px(x):
+        return izq + (x - x_min) / (x_max - x_min) * area_w
+
+    def py(y):
+        return base - y / y_max * area_h
+
+    elementos = [_texto(ancho / 2, 30, 'Comparativa de Precio por Persona con el Mercado', 17, negrita=True)]
+    for marca in _marcas(x_min, x_max, 8):
+        x = px(marca)
+        elementos.append(f'<line x1="{_n(x)}" y1="{arriba}" x2="{_n(x)}" y2="{base}" '
+                         f'stroke="#ddd" stroke-dasharray="4 3"/>')
+        elementos.append(_texto(x, base + 18, f'{marca:g}', 11))
+
+    trazo = ' '.join(f'{_n(px(x))},{_n(py(y))}' for x, y in zip(xs, ys))
+    elementos.append(f'<polygon points="{_n(px(x_min))},{base} {trazo} {_n(px(x_max))},{base}" '
+                     f'fill="lightblue" fill-opacity="0.3"/>')
+    elementos.append(f'<polyline points="{trazo}" fill="none" stroke="blue" stroke-width="2.5"/>')
+
+    leyenda = [('blue', '', 'Distribución de todos los restaurantes')]
+    if gasto_restaurante:
+        x = px(min(max(gasto_restaurante, x_min), x_max))
+        elementos.append(f'<line x1="{_n(x)}" y1="{arriba}" x2="{_n(x)}" y2="{base}" '
+                         f'stroke="red" stroke-width="3" stroke-dasharray="10 5"/>')
+        etiqueta_y = py(max(ys) * 0.9)
+        elementos.append(f'<rect x="{_n(x - 38)}" y="{_n(etiqueta_y - 20)}" width="76" height="26" rx="6" '
+                         f'fill="yellow" fill-opacity="0.7" stroke="black" stroke-width="0.5"/>')
+        elementos.append(_texto(x, etiqueta_y - 2, f'{gasto_restaurante:.2f}€', 13, negrita=True))
+        leyenda.append(('red', ' stroke-dasharray="10 5"', f'Este restaurante: {gasto_restaurante:.2f}€/persona'))
+
+    x = px(media)
+    elementos.append(f'<line x1="{_n(x)}" y1="{arriba}" x2="{_n(x)}" y2="{base}" '
+                     f'stroke="green" stroke-width="2" stroke-dasharray="2 4"/>')
+    leyenda.append(('green', ' stroke-dasharray="2 4"', f'Media del mercado: {media:.2f}€/persona'))
+
+    # Leyenda arriba a la derecha
+    ley_w, ley_x, ley_y = 330, ancho - der - 340, arriba + 10
+    elementos.append(f'<rect x="{ley_x}" y="{ley_y}" width="{ley_w}" height="{18 + 20 * len(leyenda)}" '
+                     f'fill="white" fill-opacity="0.85" stroke="#aaa" rx="4"/>')
+    for i, (color, estilo, texto) in enumerate(leyenda):
+        y = ley_y + 20 + 20 * i
+        elementos.append(f'<line x1="{ley_x + 10}" y1="{y - 4}" x2="{ley_x + 40}" y2="{y - 4}" '
+                         f'stroke="{color}" stroke-width="2.5"{estilo}/>')
+        elementos.append(_texto(ley_x + 48, y, texto, 12, anchor='start'))
+
+    # Información estadística arriba a la izquierda
+    elementos.append(f'<rect x="{izq + 10}" y="{arriba + 10}" width="150" height="62" rx="6" '
+                     f'fill="wheat" fill-opacity="0.5"/>')
+    for i, linea in enumerate((f'μ = {media:.2f}€', f'σ = {desviacion:.2f}€', f'N = {total} restaurantes')):
+        elementos.append(_texto(izq + 18, arriba + 28 + 18 * i, linea, 11, anchor='start'))
+
+    elementos.append(f'<line x1="{izq}" y1="{base}" x2="{ancho - der}" y2="{base}" stroke="black"/>')
+    elementos.append(f'<line x1="{izq}" y1="{arriba}" x2="{izq}" y2="{base}" stroke="black"/>')
+    elementos.append(_texto(ancho / 2, alto - 12, 'Precio por Persona (€)', 14, negrita=True))
+    elementos.append(_texto(22, arriba + area_h / 2, 'Densidad de Probabilidad', 14, negrita=True,
+                            extra=f' transform="rotate(-90 22 {_n(arriba + area_h / 2)})"'))
+    return _documento(ancho, alto, elementos)
+
+
+RENDERIZADORES_SVG = {
+    'dias_semana': svg_dias_semana,
+    'precio_comparativo': svg_precio_comparativo,
+}
+
+
+def renderizar_svg(tipo, spec):
+    return RENDERIZADORES_SVG[tipo](**spec).encode('utf-8')
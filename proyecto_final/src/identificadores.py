@@ -0,0 +1,145 @@
+"""
+ID_RESERVA e ID_FACTURA sin colisiones.
+
+Antes cada endpoint generaba 8 caracteres al azar y los insertaba a ciegas,
+así que una colisión acababa en un error de clave única y un 500. Ahora cada
+tipo de ID tiene una fila en la tabla secuencias y cada proceso se reserva
+un bloque de números con una sola sentencia atómica (LAST_INSERT_ID),
+confirmada en su propia conexión. Los ID del bloque se reparten después en
+memoria, sin consultas ni reintentos, y dos workers nunca reciben el mismo
+bloque.
+
+Cada secuencia abre una conexión dedicada fuera del pool (no cuenta en su
+máximo): si la pidiera al pool mientras tiene el lock, con el pool agotado
+por las mismas peticiones que esperan un ID se quedaría esperando hasta
+PoolAgotadoError. Si la conexión se ha cortado se abre otra y se reintenta
+una vez: como mucho queda un hueco en la secuencia, nunca un número
+repetido.
+
+Formato: los mismos 8 caracteres [0-9A-Z] de siempre, una letra fija por
+tipo (R para reservas, F para facturas) y el número de la secuencia en base
+36 con 7 cifras. Como los dígitos van antes que las letras, ordenar los ID
+de un tipo es ordenarlos por número, y el número crece con el tiempo.
+
+Al reservar un bloque se descartan los ID que ya estén en la tabla (los
+aleatorios de antes de las secuencias) con una consulta por rango sobre la
+clave.
+"""
+import os
+import threading
+from collections import deque
+
+import MySQLdb
+
+TABLA = """CREATE TABLE IF NOT EXISTS secuencias (
+    NOMBRE varchar(30) NOT NULL,
+    SIGUIENTE bigint NOT NULL,
+    PRIMARY KEY (NOMBRE)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci"""
+
+ALFABETO = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+CIFRAS = 7
+
+
+def codificar(prefijo, numero):
+    """prefijo + numero en base 36 con CIFRAS cifras."""
+    cifras = []
+    for _ in range(CIFRAS):
+        numero, resto = divmod(numero, len(ALFABETO))
+        cifras.append(ALFABETO[resto])
+    if numero:
+        raise OverflowError(f'La secuencia {prefijo} no cabe en {CIFRAS} cifras')
+    return prefijo + ''.join(reversed(cifras))
+
+
+class Secuencia:
+    """Reparte los ID de un tipo a partir de bloques reservados en la tabla secuencias."""
+
+    def __init__(self, nombre, prefijo, tabla, columna, bloque=100):
+        self.nombre = nombre
+        self.prefijo = prefijo
+        self.tabla = tabla
+        self.columna = columna
+        self.bloque = bloque
+        self.pool = None  # db.PoolConexiones, se asigna en configurar()
+        self._conn = None  # conexión dedicada, se abre al reservar el primer bloque
+        self._libres = deque()
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def siguiente(self):
+        with self._lock:
+            # Un proceso hijo no puede seguir repartiendo el bloque que reservó su padre
+            if self._pid != os.getpid():
+                self._libres.clear()
+                # Ni la conexión: el socket es compartido con el padre, así que no se cierra
+                self._conn = None
+                self._pid = os.getpid()
+            while not self._libres:
+                self._reservar()
+            return self._libres.popleft()
+
+    def _reservar(self):
+        if self.pool is None:
+            raise RuntimeError(f'La secuencia {self.nombre} no está configurada')
+        if self._conn is None:
+            self._conn = self.pool.conexion_dedicada()
+            ids, existentes = self._leer_bloque(self._conn)
+        else:
+            try:
+                ids, existentes = self._leer_bloque(self._conn)
+            except MySQLdb.OperationalError:
+                # Conexión cortada (wait_timeout, reinicio de MySQL...): se abre otra
+                self._cerrar_conexion()
+                self._conn = self.pool.conexion_dedicada()
+                ids, existentes = self._leer_bloque(self._conn)
+        self._libres.extend(i for i in ids if i not in existentes)
+
+    def _leer_bloque(self, conn):
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("""INSERT INTO secuencias (NOMBRE, SIGUIENTE) VALUES (%s, LAST_INSERT_ID(%s))
+                                  ON DUPLICATE KEY UPDATE SIGUIENTE = LAST_INSERT_ID(SIGUIENTE + %s)""",
+                               (self.nombre, self.bloque, self.bloque))
+                cursor.execute("SELECT LAST_INSERT_ID()")
+                fin = cursor.fetchone()[0]
+                ids = [codificar(self.prefijo, numero) for numero in range(fin - self.bloque, fin)]
+                cursor.execute(f"SELECT {self.columna} FROM {self.tabla} WHERE {self.columna} BETWEEN %s AND %s",
+                               (ids[0], ids[-1]))
+                existentes = {fila[0].upper() for fila in cursor.fetchall()}
+                conn.commit()
+            finally:
+                cursor.close()
+        except Exception:
+            try:
+                conn.rollback()
+            except MySQLdb.Error:
+                pass
+            raise
+        return ids, existentes
+
+    def _cerrar_conexion(self):
+        conn, self._conn = self._conn, None
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+reservas = Secuencia('reservas', 'R', 'reservas', 'ID_RESERVA')
+facturas = Secuencia('facturas', 'F', 'facturas', 'ID_FACTURA')
+
+
+def configurar(pool, bloque):
+    for secuencia in (reservas, facturas):
+        secuencia.pool = pool
+        secuencia.bloque = bloque
+
+
+def asegurar(conn):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(TABLA)
+    finally:
+        cursor.close()
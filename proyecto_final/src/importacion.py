@@ -0,0 +1,216 @@
+"""
+Importación masiva de reservas (POST /api/reservas/importar).
+
+Acepta CSV con la misma cabecera que databases_csv/reservas.csv o NDJSON con
+esas mismas claves, y lo procesa sin cargar el fichero entero en memoria:
+
+- Los clientes y restaurantes se validan contra conjuntos de IDs en memoria
+  (una consulta al principio), no con una consulta por fila.
+- Las filas válidas se insertan por lotes: una consulta para descartar las
+  reservas que ya existen, un único INSERT de varias filas y la suma a
+  resumen_reservas_dia (rollups.py), todo en la misma transacción. La
+  importación no comprueba el aforo, pero sí avisa al índice de
+  disponibilidad de los restaurantes que cambian.
+- Cada lote se confirma por separado y el resultado de sus filas se genera
+  en cuanto se confirma, así que el informe llega mientras se importa.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+
+import MySQLdb
+
+import identificadores
+import rollups
+from db import marcar_lote
+from disponibilidad import tocar_restaurantes
+
+COLUMNAS = ('ID_RESERVA', 'ID_CLIENTE', 'NUM_PERSONAS', 'FECHA_RESERVA',
+            'HORA_RESERVA', 'ID_RESTAURANTE', 'ESTADO_RESERVA')
+ESTADOS = ('CONFIRMADA', 'CANCELADA')
+
+
+# ===== Lectura =====
+
+def leer_filas(flujo, formato):
+    """Generador de (línea, fila) de un flujo binario CSV o NDJSON.
+
+    fila es un dict con las claves en mayúsculas, o el texto original si la
+    línea NDJSON no es un objeto JSON. La cabecera del CSV se comprueba al
+    llamar, antes de empezar a importar.
+    """
+    texto = io.TextIOWrapper(flujo, encoding='utf-8-sig', newline='')
+    if formato != 'csv':
+        return _filas_ndjson(texto)
+    lector = csv.DictReader(texto)
+    faltan = set(COLUMNAS) - {'ID_RESERVA', 'ESTADO_RESERVA'} - {c.strip().upper() for c in lector.fieldnames or ()}
+    if faltan:
+        raise ValueError(f"Faltan columnas en el CSV: {', '.join(sorted(faltan))}")
+    return ((lector.line_num, {(k or '').strip().upper(): v for k, v in fila.items()}) for fila in lector)
+
+
+def _filas_ndjson(texto):
+    for linea, crudo in enumerate(texto, start=1):
+        if not crudo.strip():
+            continue
+        try:
+            fila = json.loads(crudo)
+        except ValueError:
+            fila = None
+        if isinstance(fila, dict):
+            yield linea, {str(k).strip().upper(): v for k, v in fila.items()}
+        else:
+            yield linea, crudo
+
+
+def ids_clientes(cursor):
+    """Conjunto de ID_CLIENTE en mayúsculas; cursor debe ser de servidor (db.cursor_servidor)."""
+    cursor.execute("SELECT ID_CLIENTE FROM clientes")
+    ids = set()
+    while True:
+        filas = cursor.fetchmany(10000)
+        if not filas:
+            return ids
+        ids.update(fila[0].upper() for fila in filas)
+
+
+# ===== Validación =====
+
+def _texto(fila, columna):
+    valor = fila.get(columna)
+    return str(valor).strip() if valor is not None else ''
+
+
+def validar_fila(fila, clientes, restaurantes, vistos):
+    """Valores de la fila en el orden de COLUMNAS; ValueError con el motivo si no es válida.
+
+    restaurantes es {ID en mayúsculas: ID tal como está en la BD}; vistos, los
+    ID_RESERVA ya leídos del fichero.
+    """
+    if not isinstance(fila, dict):
+        raise ValueError('La línea no es un objeto JSON')
+    id_reserva = _texto(fila, 'ID_RESERVA').upper()
+    if len(id_reserva) > 8:
+        raise ValueError('ID_RESERVA tiene más de 8 caracteres')
+    if id_reserva in vistos:
+        raise ValueError(f'ID_RESERVA {id_reserva} repetido en el fichero')
+
+    id_cliente = _texto(fila, 'ID_CLIENTE')
+    if id_cliente.upper() not in clientes:
+        raise ValueError(f'El cliente {id_cliente} no existe')
+    id_restaurante = restaurantes.get(_texto(fila, 'ID_RESTAURANTE').upper())
+    if id_restaurante is None:
+        raise ValueError(f"El restaurante {_texto(fila, 'ID_RESTAURANTE')} no existe")
+
+    try:
+        num_personas = int(_texto(fila, 'NUM_PERSONAS'))
+    except ValueError:
+        num_personas = 0
+    if num_personas < 1:
+        raise ValueError('NUM_PERSONAS debe ser un entero positivo')
+    fecha = _texto(fila, 'FECHA_RESERVA')
+    hora = _texto(fila, 'HORA_RESERVA')
+    try:
+        datetime.strptime(fecha, '%Y-%m-%d')
+        hora = datetime.strptime(hora, '%H:%M').strftime('%H:%M')
+    except ValueError:
+        raise ValueError('FECHA_RESERVA debe ser YYYY-MM-DD y HORA_RESERVA HH:MM')
+    estado = _texto(fila, 'ESTADO_RESERVA').upper() or 'CONFIRMADA'
+    if estado not in ESTADOS:
+        raise ValueError(f"ESTADO_RESERVA debe ser {' o '.join(ESTADOS)}")
+
+    if id_reserva:
+        vistos.add(id_reserva)
+    return [id_reserva, id_cliente, num_personas, fecha, hora, id_restaurante, estado]
+
+
+# ===== Inserción =====
+
+def _insertar_lote(conn, cursor, pendientes, vistos):
+    """Inserta un lote de (línea, valores) y lo confirma. Devuelve los resultados de sus filas."""
+    resultados = {}
+    marcar_lote()
+    # Los ID que faltan se generan aquí; los del fichero que ya están en la BD se descartan
+    for _, valores in pendientes:
+        if not valores[0]:
+            valores[0] = identificadores.reservas.siguiente()
+            while valores[0] in vistos:
+                valores[0] = identificadores.reservas.siguiente()
+            vistos.add(valores[0])
+    cursor.execute("SELECT ID_RESERVA FROM reservas WHERE ID_RESERVA IN %s",
+                   (tuple(v[0] for _, v in pendientes),))
+    existentes = {fila[0].upper() for fila in cursor.fetchall()}
+    nuevas = []
+    for linea, valores in pendientes:
+        if valores[0] in existentes:
+            resultados[linea] = {'linea': linea, 'exito': False,
+                                 'mensaje': f'La reserva {valores[0]} ya existe'}
+        else:
+            nuevas.append((linea, valores))
+
+    if nuevas:
+        try:
+            _insertar(cursor, [v for _, v in nuevas])
+        except MySQLdb.IntegrityError:
+            # Otra petición ha insertado alguna de estas reservas mientras tanto:
+            # se repite el lote fila a fila para saber cuáles fallan
+            conn.rollback()
+            return _insertar_filas(conn, cursor, pendientes, existentes)
+        rollups.sumar_reservas(cursor, [v[0] for _, v in nuevas])
+        tocar_restaurantes(cursor, {v[5] for _, v in nuevas})
+    conn.commit()
+    for linea, valores in nuevas:
+        resultados[linea] = {'linea': linea, 'exito': True, 'id_reserva': valores[0]}
+    return [resultados[linea] for linea, _ in pendientes]
+
+
+def _insertar(cursor, filas):
+    valores = [v for fila in filas for v in fila]
+    cursor.execute(f"INSERT INTO reservas ({', '.join(COLUMNAS)}) VALUES "
+                   + ", ".join(["(%s, %s, %s, %s, %s, %s, %s)"] * len(filas)), valores)
+
+
+def _insertar_filas(conn, cursor, pendientes, existentes):
+    resultados, insertadas = [], []
+    for linea, valores in pendientes:
+        if valores[0] in existentes:
+            resultados.append({'linea': linea, 'exito': False, 'mensaje': f'La reserva {valores[0]} ya existe'})
+            continue
+        cursor.execute("SAVEPOINT reserva")
+        try:
+            _insertar(cursor, [valores])
+        except MySQLdb.Error as ex:
+            cursor.execute("ROLLBACK TO SAVEPOINT reserva")
+            resultados.append({'linea': linea, 'exito': False, 'mensaje': str(ex)})
+            continue
+        insertadas.append(valores)
+        resultados.append({'linea': linea, 'exito': True, 'id_reserva': valores[0]})
+    rollups.sumar_reservas(cursor, [v[0] for v in insertadas])
+    tocar_restaurantes(cursor, {v[5] for v in insertadas})
+    conn.commit()
+    return resultados
+
+
+def importar(conn, cursor, filas, clientes, restaurantes, lote):
+    """Valida e inserta las filas por lotes; genera listas con el resultado de cada línea, en orden.
+
+    filas viene de leer_filas. Las filas no válidas no llegan a la BD y las de
+    cada lote se confirman juntas.
+    """
+    vistos, pendientes, resultados = set(), [], []
+    for linea, fila in filas:
+        try:
+            pendientes.append((linea, validar_fila(fila, clientes, restaurantes, vistos)))
+        except ValueError as ex:
+            resultados.append({'linea': linea, 'exito': False, 'mensaje': str(ex)})
+        if len(pendientes) >= lote:
+            resultados.extend(_insertar_lote(conn, cursor, pendientes, vistos))
+            pendientes = []
+        if not pendientes and len(resultados) >= lote:
+            yield sorted(resultados, key=lambda r: r['linea'])
+            resultados = []
+    if pendientes:
+        resultados.extend(_insertar_lote(conn, cursor, pendientes, vistos))
+    if resultados:
+        yield sorted(resultados, key=lambda r: r['linea'])
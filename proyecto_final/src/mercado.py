@@ -0,0 +1,186 @@
+"""
+Distribución de mercado del gasto por persona.
+
+El gráfico comparativo de precios necesita la media, la desviación y el
+percentil del restaurante dentro del gasto medio por persona de todos los
+restaurantes. En lugar de recalcularlo con un GROUP BY en cada petición se
+mantiene en memoria un histograma de cuantiles por grupo de pares:
+
+- todo el mercado,
+- cada comunidad autónoma (CCAA),
+- cada número de estrellas Michelin,
+- cada combinación CCAA + estrellas.
+
+Los histogramas se pueden fusionar y restar, así que cuando cambia el gasto
+de un restaurante solo se tocan sus cuatro grupos. El snapshot completo se
+reconstruye con el mismo mecanismo de TTL + CHECKSUM que el catálogo.
+"""
+import math
+from collections import namedtuple
+from types import MappingProxyType
+
+from catalogo import CacheTablas
+import rollups
+
+
+class HistogramaCuantiles:
+    """Histograma con cubos logarítmicos (tipo DDSketch) y momentos exactos.
+
+    - Cada cubo cubre valores con un error relativo máximo ALFA, de modo
+      que el percentil de un gasto se obtiene con un acceso a la tabla de
+      acumulados, sin ordenar ni recorrer los valores.
+    - n, suma y suma de cuadrados se guardan exactos: media y desviación
+      (poblacional, como numpy.std) son O(1).
+    - Dos histogramas se fusionan sumando cubo a cubo.
+    """
+    ALFA = 0.01
+    MINIMO = 0.5      # € por persona; por debajo va al primer cubo
+    MAXIMO = 5000.0   # por encima va al último
+    _LOG_GAMMA = math.log((1 + ALFA) / (1 - ALFA))
+    _DESPLAZAMIENTO = math.floor(math.log(MINIMO) / _LOG_GAMMA)
+    CUBOS = math.ceil(math.log(MAXIMO) / _LOG_GAMMA) - _DESPLAZAMIENTO + 1
+
+    def __init__(self):
+        self.conteos = [0] * self.CUBOS
+        self.n = 0
+        self.suma = 0.0
+        self.suma_cuadrados = 0.0
+        self._acumulado = None  # _acumulado[i] = valores en cubos < i; se rehace al consultar
+
+    @classmethod
+    def indice(cls, valor):
+        if valor <= cls.MINIMO:
+            return 0
+        if valor >= cls.MAXIMO:
+            return cls.CUBOS - 1
+        return math.ceil(math.log(valor) / cls._LOG_GAMMA) - cls._DESPLAZAMIENTO
+
+    def anadir(self, valor, veces=1):
+        self.conteos[self.indice(valor)] += veces
+        self.n += veces
+        self.suma += valor * veces
+        self.suma_cuadrados += valor * valor * veces
+        self._acumulado = None
+
+    def quitar(self, valor):
+        self.anadir(valor, -1)
+
+    def fusionar(self, otro):
+        for i, conteo in enumerate(otro.conteos):
+            if conteo:
+                self.conteos[i] += conteo
+        self.n += otro.n
+        self.suma += otro.suma
+        self.suma_cuadrados += otro.suma_cuadrados
+        self._acumulado = None
+        return self
+
+    def copia(self):
+        return HistogramaCuantiles().fusionar(self)
+
+    @property
+    def media(self):
+        return self.suma / self.n if self.n else None
+
+    @property
+    def desviacion(self):
+        if not self.n:
+            return None
+        media = self.suma / self.n
+        return math.sqrt(max(self.suma_cuadrados / self.n - media * media, 0.0))
+
+    def percentil(self, valor):
+        """Percentil (0-100) de valor, como scipy.stats.percentileofscore(kind='rank').
+
+        Los valores del mismo cubo se tratan como empates.
+        """
+        if not self.n:
+            return None
+        acumulado = self._acumulado
+        if acumulado is None:
+            acumulado = [0] * (self.CUBOS + 1)
+            for i, conteo in enumerate(self.conteos):
+                acumulado[i + 1] = acumulado[i] + conteo
+            self._acumulado = acumulado
+        i = self.indice(valor)
+        debajo = acumulado[i]
+        iguales = self.conteos[i]
+        return (2 * debajo + iguales + (1 if iguales else 0)) * 50.0 / self.n
+
+
+def clave_ccaa(ccaa):
+    return ccaa.strip().lower() if ccaa else None
+
+
+def claves_grupo(ccaa, estrellas):
+    """Grupos de pares a los que pertenece un restaurante."""
+    ccaa = clave_ccaa(ccaa)
+    return ((None, None), (ccaa, None), (None, estrellas), (ccaa, estrellas))
+
+
+class SnapshotMercado(namedtuple('SnapshotMercado', [
+    'version',
+    'checksum',
+    'restaurantes',  # {ID_RESTAURANTE en mayúsculas: (gasto, ccaa, estrellas)}
+    'grupos',        # {(clave ccaa o None, estrellas o None): HistogramaCuantiles}
+])):
+    __slots__ = ()
+
+    def grupo(self, ccaa=None, estrellas=None):
+        return self.grupos.get((clave_ccaa(ccaa), estrellas))
+
+    def gasto(self, id_restaurante):
+        datos = self.restaurantes.get(id_restaurante.strip().upper())
+        return datos[0] if datos else None
+
+
+class MercadoPrecios(CacheTablas):
+    """Histogramas del gasto medio por persona de cada restaurante, por grupo de pares."""
+    TABLAS = ('restaurantes', 'resumen_facturas_dia')
+    NOMBRE = 'Mercado de precios'
+
+    def _construir(self, cursor, version, checksum):
+        cursor.execute("""SELECT r.ID_RESTAURANTE, r.CCAA, r.ESTRELLA_MICH,
+                                 SUM(rf.SUMA_GASTO_PERSONA) / NULLIF(SUM(rf.FACTURAS_CON_PERSONAS), 0) AS gasto_medio
+                          FROM resumen_facturas_dia rf
+                          JOIN restaurantes r ON r.ID_RESTAURANTE = rf.ID_RESTAURANTE
+                          GROUP BY r.ID_RESTAURANTE, r.CCAA, r.ESTRELLA_MICH
+                          HAVING gasto_medio IS NOT NULL""")
+        restaurantes = {}
+        grupos = {}
+        for id_rest, ccaa, estrellas, gasto in cursor.fetchall():
+            gasto = float(gasto)
+            restaurantes[id_rest.upper()] = (gasto, ccaa, estrellas)
+            for clave in claves_grupo(ccaa, estrellas):
+                grupos.setdefault(clave, HistogramaCuantiles()).anadir(gasto)
+        return SnapshotMercado(version, checksum, MappingProxyType(restaurantes), MappingProxyType(grupos))
+
+    def actualizar_restaurante(self, cursor, restaurante):
+        """Aplica el gasto actual de un restaurante sin reconstruir el resto.
+
+        restaurante es el Restaurante del catálogo. Se llama tras confirmar una
+        escritura que cambia su gasto por persona; solo se copian y modifican
+        los histogramas de sus grupos. Los demás procesos lo verán al vencer
+        su TTL.
+        """
+        if self._snapshot is None:
+            return
+        gasto = rollups.gasto_medio(cursor, restaurante.id)
+        ccaa, estrellas = restaurante.ccaa, restaurante.estrellas
+        with self._lock:
+            snapshot = self._snapshot
+            clave_id = restaurante.id.upper()
+            restaurantes = dict(snapshot.restaurantes)
+            grupos = dict(snapshot.grupos)
+            anterior = restaurantes.pop(clave_id, None)
+            if anterior is not None:
+                for clave in claves_grupo(anterior[1], anterior[2]):
+                    grupos[clave] = grupos[clave].copia()
+                    grupos[clave].quitar(anterior[0])
+            if gasto is not None:
+                restaurantes[clave_id] = (gasto, ccaa, estrellas)
+                for clave in claves_grupo(ccaa, estrellas):
+                    grupos[clave] = grupos[clave].copia() if clave in grupos else HistogramaCuantiles()
+                    grupos[clave].anadir(gasto)
+            self._snapshot = snapshot._replace(restaurantes=MappingProxyType(restaurantes),
+                                               grupos=MappingProxyType(grupos))
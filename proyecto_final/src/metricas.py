@@ -0,0 +1,191 @@
+"""
+Métricas de la API en el formato de texto de Prometheus (GET /metrics).
+
+Por ruta (la plantilla de la URL, p. ej. /api/reservas/<id_cliente>) y método:
+
+- theknife_peticiones_total{estado="2xx|3xx|4xx|5xx"}: peticiones por clase
+  de código; la tasa de error es la de estado="5xx" sobre el total.
+- theknife_peticion_segundos: histograma de latencia, contada hasta que se ha
+  enviado la respuesta entera (también en las respuestas en streaming).
+- theknife_sql_sentencias_total, theknife_sql_segundos_total y
+  theknife_sql_filas_total: sentencias lanzadas, tiempo dentro de MySQL y
+  filas leídas, anotados por los cursores del pool (db.UsoSQL).
+- theknife_respuesta_bytes_total: bytes del cuerpo de las respuestas.
+
+Y por tipo y formato de gráfico, theknife_grafico_segundos: histograma del
+tiempo de dibujo de los gráficos que no estaban en caché.
+
+El coste por petición es un objeto, unas pocas llamadas a perf_counter y un
+lock al terminar. Cada proceso lleva sus propias métricas desde que arranca.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+from flask import g, request
+
+from db import UsoSQL
+
+LIMITES_PETICION = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LIMITES_GRAFICO = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTADORES_RUTA = (
+    ('theknife_sql_sentencias_total', 'sentencias', 'Sentencias SQL lanzadas'),
+    ('theknife_sql_segundos_total', 'segundos_sql', 'Segundos esperando a MySQL'),
+    ('theknife_sql_filas_total', 'filas', 'Filas leídas de MySQL'),
+    ('theknife_respuesta_bytes_total', 'bytes', 'Bytes del cuerpo de las respuestas'),
+)
+
+
+class Histograma:
+    __slots__ = ('limites', 'cuentas', 'suma', 'n')
+
+    def __init__(self, limites):
+        self.limites = limites
+        self.cuentas = [0] * len(limites)
+        self.suma = 0.0
+        self.n = 0
+
+    def observar(self, valor):
+        i = bisect_left(self.limites, valor)
+        if i < len(self.cuentas):
+            self.cuentas[i] += 1
+        self.suma += valor
+        self.n += 1
+
+    def muestras(self, nombre, etiquetas):
+        acumulado = 0
+        for limite, cuenta in zip(self.limites, self.cuentas):
+            acumulado += cuenta
+            yield f'{nombre}_bucket{{{etiquetas},le="{limite}"}} {acumulado}'
+        yield f'{nombre}_bucket{{{etiquetas},le="+Inf"}} {self.n}'
+        yield f'{nombre}_sum{{{etiquetas}}} {self.suma}'
+        yield f'{nombre}_count{{{etiquetas}}} {self.n}'
+
+
+class EstadisticasRuta:
+    __slots__ = ('estados', 'latencia', 'sentencias', 'segundos_sql', 'filas', 'bytes')
+
+    def __init__(self):
+        self.estados = {}  # '2xx' -> peticiones
+        self.latencia = Histograma(LIMITES_PETICION)
+        self.sentencias = 0
+        self.segundos_sql = 0.0
+        self.filas = 0
+        self.bytes = 0
+
+
+def etiqueta(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _contar_bytes(cuerpo, contador):
+    """Pasa los fragmentos de una respuesta en streaming sumando su tamaño."""
+    try:
+        for trozo in cuerpo:
+            if isinstance(trozo, str):
+                trozo = trozo.encode('utf-8')
+            contador[0] += len(trozo)
+            yield trozo
+    finally:
+        if hasattr(cuerpo, 'close'):
+            cuerpo.close()
+
+
+class Metricas:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rutas = {}     # (ruta, método) -> EstadisticasRuta
+        self._graficos = {}  # (tipo, formato) -> Histograma
+
+    def init_app(self, app):
+        if app.config['METRICAS']:
+            app.before_request(self._empezar)
+            app.after_request(self._terminar)
+
+    # ===== Peticiones =====
+
+    def _empezar(self):
+        g.metricas_inicio = time.perf_counter()
+        if g.get('uso_sql') is None:  # auditoria_sql.py puede haber puesto ya el suyo
+            g.uso_sql = UsoSQL()
+
+    def _terminar(self, respuesta):
+        inicio = g.get('metricas_inicio')
+        if inicio is None:
+            return respuesta
+        clave = (request.url_rule.rule if request.url_rule else '(sin ruta)', request.method)
+        estado = f'{respuesta.status_code // 100}xx'
+        uso = g.uso_sql
+        if respuesta.is_streamed and not respuesta.direct_passthrough:
+            contador = [0]
+            respuesta.response = _contar_bytes(respuesta.response, contador)
+        else:
+            contador = None
+
+        # Las respuestas en streaming siguen leyendo de MySQL después de esta
+        # función: se registran al cerrarse, cuando ya se ha enviado todo
+        def registrar():
+            tamano = contador[0] if contador is not None else respuesta.content_length or 0
+            self.registrar_peticion(clave, estado, time.perf_counter() - inicio, uso, tamano)
+
+        respuesta.call_on_close(registrar)
+        return respuesta
+
+    def registrar_peticion(self, clave, estado, segundos, uso, tamano):
+        with self._lock:
+            ruta = self._rutas.get(clave)
+            if ruta is None:
+                ruta = self._rutas[clave] = EstadisticasRuta()
+            ruta.estados[estado] = ruta.estados.get(estado, 0) + 1
+            ruta.latencia.observar(segundos)
+            ruta.sentencias += uso.sentencias
+            ruta.segundos_sql += uso.segundos
+            ruta.filas += uso.filas
+            ruta.bytes += tamano
+
+    # ===== Gráficos =====
+
+    def medir_grafico(self, formato, renderizar):
+        """Envuelve una función renderizar(tipo, spec) para anotar cuánto tarda cada gráfico."""
+        def renderizar_medido(tipo, spec):
+            inicio = time.perf_counter()
+            try:
+                return renderizar(tipo, spec)
+            finally:
+                segundos = time.perf_counter() - inicio
+                with self._lock:
+                    histograma = self._graficos.get((tipo, formato))
+                    if histograma is None:
+                        histograma = self._graficos[(tipo, formato)] = Histograma(LIMITES_GRAFICO)
+                    histograma.observar(segundos)
+        return renderizar_medido
+
+    # ===== Exposición =====
+
+    def exponer(self):
+        """Texto en el formato de exposición de Prometheus (text/plain; version=0.0.4)."""
+        lineas = []
+        with self._lock:
+            rutas = sorted(self._rutas.items())
+            lineas += ['# HELP theknife_peticiones_total Peticiones atendidas por clase de código de estado',
+                       '# TYPE theknife_peticiones_total counter']
+            for (ruta, metodo), datos in rutas:
+                for estado, n in sorted(datos.estados.items()):
+                    lineas.append(f'theknife_peticiones_total{{ruta="{etiqueta(ruta)}",metodo="{metodo}",'
+                                  f'estado="{estado}"}} {n}')
+            lineas += ['# HELP theknife_peticion_segundos Latencia de las peticiones hasta enviar la respuesta',
+                       '# TYPE theknife_peticion_segundos histogram']
+            for (ruta, metodo), datos in rutas:
+                lineas += datos.latencia.muestras('theknife_peticion_segundos',
+                                                  f'ruta="{etiqueta(ruta)}",metodo="{metodo}"')
+            for nombre, campo, ayuda in CONTADORES_RUTA:
+                lineas += [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} counter']
+                for (ruta, metodo), datos in rutas:
+                    lineas.append(f'{nombre}{{ruta="{etiqueta(ruta)}",metodo="{metodo}"}} {getattr(datos, campo)}')
+            lineas += ['# HELP theknife_grafico_segundos Tiempo de dibujo de los gráficos que no estaban en caché',
+                       '# TYPE theknife_grafico_segundos histogram']
+            for (tipo, formato), histograma in sorted(self._graficos.items()):
+                lineas += histograma.muestras('theknife_grafico_segundos',
+                                              f'tipo="{etiqueta(tipo)}",formato="{formato}"')
+        return '\n'.join(lineas) + '\n'
@@ -0,0 +1,109 @@
+"""
+Migraciones versionadas de los índices de la BD.
+
+Los scripts de creación (build_database.py, build_complete_sql.py,
+theknife_db.sql) solo definen claves primarias y las claves de las FK. Los
+índices que necesitan las consultas de la API se añaden aquí, cada grupo con
+su número de versión, y las versiones aplicadas se guardan en la tabla
+versiones_indices. create_app() aplica al arrancar las que falten.
+
+Cada índice indica la consulta a la que sirve. Las columnas que solo se leen
+van al final, para que la consulta se resuelva desde el índice (covering) sin
+ir a la fila; la clave primaria ya está incluida en todo índice de InnoDB.
+comprobar_planes.py verifica con EXPLAIN que ninguna consulta de los
+endpoints recorre una tabla entera ni ordena con filesort.
+
+Para añadir un índice se añade una migración nueva al final de MIGRACIONES;
+las ya publicadas no se modifican.
+"""
+import paginacion
+
+TABLA = """CREATE TABLE IF NOT EXISTS versiones_indices (
+    VERSION int NOT NULL,
+    DESCRIPCION varchar(200) NOT NULL,
+    APLICADA datetime NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (VERSION)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci"""
+
+# (versión, descripción, {nombre del índice: (tabla, columnas)})
+MIGRACIONES = (
+    (1, 'Listados paginados de reservas y facturas', paginacion.INDICES),
+    (2, 'Índices compuestos para las consultas de la API', {
+        # Clientes sin valorar del restaurante (/analytics/sin-valorar y dashboard):
+        # VALORACION IS NULL es una igualdad sobre el índice, así que ORDER BY FECHA_FACTURA sale ordenado
+        'FC_RESTAURANTE_VALORACION': ('facturas', 'ID_RESTAURANTE, VALORACION, FECHA_FACTURA, ID_CLIENTE'),
+        # Última factura del cliente en el restaurante (POST /api/resenas) y reseñas del cliente (GET /api/resenas)
+        'FC_CLIENTE_RESTAURANTE_FECHA': ('facturas',
+                                         'ID_CLIENTE, ID_RESTAURANTE, FECHA_FACTURA, VALORACION, TIPO_VISITA'),
+        # Ocupación de un día al reservar y del índice de disponibilidad (disponibilidad.py)
+        'RV_OCUPACION': ('reservas', 'ID_RESTAURANTE, FECHA_RESERVA, HORA_RESERVA, NUM_PERSONAS, ESTADO_RESERVA'),
+        # Líneas de una factura: top de platos por periodo y borrado de un cliente
+        'CM_FACTURA': ('comandas', 'ID_FACTURA, ID_RESTAURANTE, N_PLATO, NUM_PEDIDOS'),
+    }),
+)
+
+# Segundos que espera un worker a que otro termine de migrar
+ESPERA_BLOQUEO = 300
+
+
+def indices_existentes(cursor, nombres):
+    cursor.execute("""SELECT DISTINCT INDEX_NAME FROM information_schema.STATISTICS
+                      WHERE TABLE_SCHEMA = DATABASE() AND INDEX_NAME IN %s""", (tuple(nombres),))
+    return {fila[0] for fila in cursor.fetchall()}
+
+
+def aplicar(conn):
+    """Aplica las migraciones pendientes. Devuelve [(versión, índices creados)].
+
+    Si un índice ya existe (p. ej. los de paginación, que antes se creaban
+    sin versión) no se vuelve a crear. Los índices nuevos de una misma tabla
+    se añaden en un solo ALTER TABLE.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(TABLA)
+        # Varios workers arrancando a la vez: solo uno migra y los demás esperan
+        cursor.execute("SELECT GET_LOCK('versiones_indices', %s)", (ESPERA_BLOQUEO,))
+        if not cursor.fetchone()[0]:
+            raise RuntimeError('Otro proceso lleva demasiado tiempo aplicando las migraciones de índices')
+        try:
+            cursor.execute("SELECT VERSION FROM versiones_indices")
+            aplicadas = {fila[0] for fila in cursor.fetchall()}
+            resultado = []
+            for version, descripcion, indices in MIGRACIONES:
+                if version in aplicadas:
+                    continue
+                existentes = indices_existentes(cursor, indices)
+                por_tabla = {}
+                for nombre, (tabla, columnas) in indices.items():
+                    if nombre not in existentes:
+                        por_tabla.setdefault(tabla, []).append(f"ADD INDEX {nombre} ({columnas})")
+                for tabla, cambios in por_tabla.items():
+                    cursor.execute(f"ALTER TABLE {tabla} {', '.join(cambios)}")
+                cursor.execute("INSERT INTO versiones_indices (VERSION, DESCRIPCION) VALUES (%s, %s)",
+                               (version, descripcion))
+                conn.commit()
+                resultado.append((version, [n for n in indices if n not in existentes]))
+            return resultado
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK('versiones_indices')")
+            cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+if __name__ == '__main__':
+    import MySQLdb
+
+    from config import config
+
+    ajustes = config['development']
+    conn = MySQLdb.connect(host=ajustes.MYSQL_HOST, user=ajustes.MYSQL_USER,
+                           passwd=ajustes.MYSQL_PASSWORD, db=ajustes.MYSQL_DB,
+                           charset=ajustes.MYSQL_CHARSET, use_unicode=True)
+    aplicadas = aplicar(conn)
+    for version, creados in aplicadas:
+        print(f"✓ Migración {version}: {', '.join(creados) or 'índices ya existentes'}")
+    if not aplicadas:
+        print("✓ Índices al día")
+    conn.close()
@@ -0,0 +1,82 @@
+"""
+Paginación por clave (keyset) de los listados de reservas y facturas.
+
+Los listados se ordenan de más reciente a más antiguo por (fecha, hora, id).
+En lugar de OFFSET, cada página devuelve un token opaco `siguiente` con la
+clave de su última fila, y la página siguiente pide solo las filas con una
+clave menor. Con los índices compuestos de INDICES, MySQL salta directamente
+a esa posición del índice, así que el coste de una página no depende de
+cuántas reservas o facturas tenga el restaurante o el cliente.
+"""
+import base64
+import json
+from collections import namedtuple
+
+# Índices que recorren los listados en el mismo orden en que se paginan (los crea migraciones.py)
+INDICES = {
+    'RV_RESTAURANTE_FECHA': ('reservas', 'ID_RESTAURANTE, FECHA_RESERVA, HORA_RESERVA, ID_RESERVA'),
+    'RV_CLIENTE_FECHA': ('reservas', 'ID_CLIENTE, FECHA_RESERVA, HORA_RESERVA, ID_RESERVA'),
+    'FC_RESTAURANTE_FECHA': ('facturas', 'ID_RESTAURANTE, FECHA_FACTURA, ID_FACTURA'),
+    'FC_CLIENTE_FECHA': ('facturas', 'ID_CLIENTE, FECHA_FACTURA, ID_FACTURA'),
+}
+
+Pagina = namedtuple('Pagina', ['limite', 'despues', 'desde', 'hasta'])
+
+
+def codificar_token(valores):
+    crudo = json.dumps([str(v) for v in valores], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(crudo).decode('ascii').rstrip('=')
+
+
+def decodificar_token(token, columnas):
+    """Valores de la clave guardados en el token; ValueError si no es un token válido."""
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except ValueError:
+        valores = None
+    if (not isinstance(valores, list) or len(valores) != columnas
+            or not all(isinstance(v, str) for v in valores)):
+        raise ValueError('El parámetro after no es válido')
+    return valores
+
+
+def filtros(pagina, columnas):
+    """Condiciones WHERE y parámetros de una página.
+
+    columnas es la clave de orden, p. ej. ('r.FECHA_RESERVA', 'r.HORA_RESERVA',
+    'r.ID_RESERVA'); la primera es la fecha sobre la que se aplican desde/hasta.
+    La comparación (a, b, c) < (x, y, z) se escribe desarrollada porque MySQL no
+    usa el índice como rango con la forma de tupla.
+    """
+    condiciones, params = [], []
+    fecha = columnas[0]
+    if pagina.desde:
+        condiciones.append(f"{fecha} >= %s")
+        params.append(pagina.desde)
+    if pagina.hasta:
+        condiciones.append(f"{fecha} <= %s")
+        params.append(pagina.hasta)
+    if pagina.despues:
+        valores = decodificar_token(pagina.despues, len(columnas))
+        # La primera condición acota el rango del índice; el OR resuelve los empates
+        alternativas = []
+        params.append(valores[0])
+        for i, columna in enumerate(columnas):
+            partes = [f"{c} = %s" for c in columnas[:i]] + [f"{columna} < %s"]
+            alternativas.append('(' + ' AND '.join(partes) + ')')
+            params.extend(valores[:i + 1])
+        condiciones.append(f"{fecha} <= %s AND ({' OR '.join(alternativas)})")
+    return condiciones, params
+
+
+def orden(columnas):
+    return ', '.join(f"{c} DESC" for c in columnas)
+
+
+def cortar(filas, limite, clave):
+    """Separa la página (se piden limite + 1 filas) y calcula el token de la siguiente."""
+    if len(filas) <= limite:
+        return filas, None
+    filas = filas[:limite]
+    return filas, codificar_token(clave(filas[-1]))
+
@@ -0,0 +1,253 @@
+"""
+Tablas resumen (rollups) para las analytics del área de restaurante.
+
+En lugar de recorrer reservas, facturas y comandas completas en cada
+consulta, se mantienen tres tablas agregadas:
+
+- resumen_reservas_dia: reservas y comensales por restaurante y día.
+- resumen_facturas_dia: facturas, importe y gasto por persona por restaurante y día.
+- resumen_platos: total de pedidos de cada plato por restaurante.
+
+Los endpoints que escriben (crear/actualizar/cancelar reserva, crear factura,
+eliminar cliente) llaman a las funciones sumar_*/restar_* con el mismo cursor
+y antes del commit, así que el resumen cambia en la misma transacción que
+los datos. Los deltas se calculan en SQL a partir de las filas base con las
+mismas consultas que la reconstrucción completa, para que ambos caminos den
+exactamente el mismo resultado.
+
+Reconstrucción desde el histórico: python rollups.py
+"""
+
+TABLAS = {
+    'resumen_reservas_dia': """CREATE TABLE IF NOT EXISTS resumen_reservas_dia (
+        ID_RESTAURANTE char(7) NOT NULL,
+        FECHA date NOT NULL,
+        NUM_RESERVAS int NOT NULL DEFAULT 0,
+        NUM_PERSONAS int NOT NULL DEFAULT 0,
+        PRIMARY KEY (ID_RESTAURANTE, FECHA)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci""",
+    'resumen_facturas_dia': """CREATE TABLE IF NOT EXISTS resumen_facturas_dia (
+        ID_RESTAURANTE char(7) NOT NULL,
+        FECHA date NOT NULL,
+        NUM_FACTURAS int NOT NULL DEFAULT 0,
+        SUMA_PRECIO decimal(14,2) NOT NULL DEFAULT 0,
+        SUMA_GASTO_PERSONA decimal(18,6) NOT NULL DEFAULT 0,
+        FACTURAS_CON_PERSONAS int NOT NULL DEFAULT 0,
+        PRIMARY KEY (ID_RESTAURANTE, FECHA)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci""",
+    'resumen_platos': """CREATE TABLE IF NOT EXISTS resumen_platos (
+        ID_RESTAURANTE char(7) NOT NULL,
+        N_PLATO varchar(30) NOT NULL,
+        TOTAL_PEDIDOS int NOT NULL DEFAULT 0,
+        PRIMARY KEY (ID_RESTAURANTE, N_PLATO),
+        KEY RSP_TOTAL (ID_RESTAURANTE, TOTAL_PEDIDOS)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci""",
+}
+
+# Cada plantilla agrega las filas base que cumplen {filtro} y las suma
+# (signo=1) o las resta (signo=-1) del resumen
+SQL_RESERVAS = """INSERT INTO resumen_reservas_dia (ID_RESTAURANTE, FECHA, NUM_RESERVAS, NUM_PERSONAS)
+    SELECT * FROM (
+        SELECT r.ID_RESTAURANTE, r.FECHA_RESERVA, {signo} * COUNT(*) AS n, {signo} * SUM(r.NUM_PERSONAS) AS p
+        FROM reservas r
+        WHERE {filtro}
+        GROUP BY r.ID_RESTAURANTE, r.FECHA_RESERVA
+    ) AS nuevo
+    ON DUPLICATE KEY UPDATE NUM_RESERVAS = NUM_RESERVAS + nuevo.n,
+                            NUM_PERSONAS = NUM_PERSONAS + nuevo.p"""
+
+# Igual que AVG(f.PRECIO / r.NUM_PERSONAS): las facturas sin reserva o sin
+# comensales no cuentan para el gasto por persona
+SQL_FACTURAS = """INSERT INTO resumen_facturas_dia (ID_RESTAURANTE, FECHA, NUM_FACTURAS, SUMA_PRECIO,
+                                                   SUMA_GASTO_PERSONA, FACTURAS_CON_PERSONAS)
+    SELECT * FROM (
+        SELECT f.ID_RESTAURANTE, f.FECHA_FACTURA,
+               {signo} * COUNT(*) AS n,
+               {signo} * SUM(f.PRECIO) AS precio,
+               {signo} * COALESCE(SUM(f.PRECIO / NULLIF(r.NUM_PERSONAS, 0)), 0) AS gasto,
+               {signo} * COUNT(f.PRECIO / NULLIF(r.NUM_PERSONAS, 0)) AS con_personas
+        FROM facturas f
+        LEFT JOIN reservas r ON f.ID_RESERVA = r.ID_RESERVA
+        WHERE {filtro}
+        GROUP BY f.ID_RESTAURANTE, f.FECHA_FACTURA
+    ) AS nuevo
+    ON DUPLICATE KEY UPDATE NUM_FACTURAS = NUM_FACTURAS + nuevo.n,
+                            SUMA_PRECIO = SUMA_PRECIO + nuevo.precio,
+                            SUMA_GASTO_PERSONA = SUMA_GASTO_PERSONA + nuevo.gasto,
+                            FACTURAS_CON_PERSONAS = FACTURAS_CON_PERSONAS + nuevo.con_personas"""
+
+SQL_PLATOS = """INSERT INTO resumen_platos (ID_RESTAURANTE, N_PLATO, TOTAL_PEDIDOS)
+    SELECT * FROM (
+        SELECT c.ID_RESTAURANTE, c.N_PLATO, {signo} * SUM(c.NUM_PEDIDOS) AS pedidos
+        FROM comandas c
+        WHERE {filtro}
+        GROUP BY c.ID_RESTAURANTE, c.N_PLATO
+    ) AS nuevo
+    ON DUPLICATE KEY UPDATE TOTAL_PEDIDOS = TOTAL_PEDIDOS + nuevo.pedidos"""
+
+
+def _acumular(cursor, plantilla, filtro, params, signo):
+    cursor.execute(plantilla.format(filtro=filtro, signo=int(signo)), params)
+
+
+# ===== Mantenimiento incremental (mismo cursor y transacción que el endpoint) =====
+
+def sumar_reserva(cursor, id_reserva, signo=1):
+    """Suma (o resta con signo=-1) una reserva al resumen diario."""
+    _acumular(cursor, SQL_RESERVAS, "r.ID_RESERVA = %s", (id_reserva,), signo)
+
+
+def sumar_reservas(cursor, ids_reserva, signo=1):
+    """Suma o resta varias reservas con una sola sentencia."""
+    if ids_reserva:
+        _acumular(cursor, SQL_RESERVAS, "r.ID_RESERVA IN %s", (tuple(ids_reserva),), signo)
+
+
+def sumar_facturas_reserva(cursor, id_reserva, signo=1):
+    """Suma o resta las facturas de una reserva (su gasto por persona depende de NUM_PERSONAS)."""
+    _acumular(cursor, SQL_FACTURAS, "f.ID_RESERVA = %s", (id_reserva,), signo)
+
+
+def sumar_factura(cursor, id_factura, signo=1):
+    """Suma o resta una factura y sus comandas."""
+    sumar_facturas(cursor, [id_factura], signo)
+
+
+def sumar_facturas(cursor, ids_factura, signo=1):
+    """Suma o resta varias facturas y sus comandas con dos sentencias."""
+    if not ids_factura:
+        return
+    ids = tuple(ids_factura)
+    _acumular(cursor, SQL_FACTURAS, "f.ID_FACTURA IN %s", (ids,), signo)
+    _acumular(cursor, SQL_PLATOS, "c.ID_FACTURA IN %s", (ids,), signo)
+
+
+def restar_cliente(cursor, id_cliente):
+    """Resta todo lo de un cliente antes de borrar sus reservas, facturas y comandas."""
+    _acumular(cursor, SQL_PLATOS,
+              "c.ID_FACTURA IN (SELECT ID_FACTURA FROM facturas WHERE ID_CLIENTE = %s)",
+              (id_cliente,), -1)
+    _acumular(cursor, SQL_FACTURAS, "f.ID_CLIENTE = %s", (id_cliente,), -1)
+    _acumular(cursor, SQL_RESERVAS, "r.ID_CLIENTE = %s", (id_cliente,), -1)
+
+
+# ===== Creación y reconstrucción =====
+
+def crear_tablas(cursor):
+    for ddl in TABLAS.values():
+        cursor.execute(ddl)
+
+
+def reconstruir(cursor):
+    """Vacía los resúmenes y los recalcula desde reservas, facturas y comandas.
+
+    No hace commit: quien llama decide cuándo confirmar la transacción.
+    """
+    for tabla in TABLAS:
+        cursor.execute(f"DELETE FROM {tabla}")
+    _acumular(cursor, SQL_RESERVAS, "1 = 1", (), 1)
+    _acumular(cursor, SQL_FACTURAS, "1 = 1", (), 1)
+    _acumular(cursor, SQL_PLATOS, "1 = 1", (), 1)
+
+
+def asegurar(conn):
+    """Crea y rellena los resúmenes si falta alguna tabla. Devuelve True si los ha creado."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""SELECT COUNT(*) FROM information_schema.TABLES
+                          WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN %s""", (tuple(TABLAS),))
+        if cursor.fetchone()[0] == len(TABLAS):
+            return False
+        crear_tablas(cursor)
+        reconstruir(cursor)
+        conn.commit()
+        return True
+    finally:
+        cursor.close()
+
+
+# ===== Lecturas =====
+
+def gasto_medio(cursor, id_restaurante):
+    """Gasto medio por persona del restaurante, o None si no hay facturas con reserva."""
+    cursor.execute("""SELECT SUM(SUMA_GASTO_PERSONA) / NULLIF(SUM(FACTURAS_CON_PERSONAS), 0)
+                      FROM resumen_facturas_dia WHERE ID_RESTAURANTE = %s""", (id_restaurante,))
+    fila = cursor.fetchone()
+    return float(fila[0]) if fila and fila[0] is not None else None
+
+
+def _rango_fechas(desde, hasta):
+    condiciones, params = "", []
+    if desde:
+        condiciones += " AND FECHA >= %s"
+        params.append(desde)
+    if hasta:
+        condiciones += " AND FECHA <= %s"
+        params.append(hasta)
+    return condiciones, params
+
+
+def total_reservas(cursor, id_restaurante, desde=None, hasta=None):
+    """Número de reservas del restaurante, opcionalmente entre dos fechas."""
+    rango, params = _rango_fechas(desde, hasta)
+    cursor.execute(f"""SELECT COALESCE(SUM(NUM_RESERVAS), 0) FROM resumen_reservas_dia
+                       WHERE ID_RESTAURANTE = %s{rango}""", (id_restaurante, *params))
+    return int(cursor.fetchone()[0])
+
+
+def total_facturas(cursor, id_restaurante, desde=None, hasta=None):
+    """(número de facturas, importe total) del restaurante, opcionalmente entre dos fechas."""
+    rango, params = _rango_fechas(desde, hasta)
+    cursor.execute(f"""SELECT COALESCE(SUM(NUM_FACTURAS), 0), COALESCE(SUM(SUMA_PRECIO), 0)
+                       FROM resumen_facturas_dia
+                       WHERE ID_RESTAURANTE = %s{rango}""", (id_restaurante, *params))
+    numero, importe = cursor.fetchone()
+    return int(numero), float(importe)
+
+
+def reservas_por_dia_semana(cursor, id_restaurante):
+    """[(DAYOFWEEK, reservas)] del restaurante."""
+    cursor.execute("""SELECT DAYOFWEEK(FECHA), SUM(NUM_RESERVAS)
+                      FROM resumen_reservas_dia
+                      WHERE ID_RESTAURANTE = %s
+                      GROUP BY DAYOFWEEK(FECHA)""", (id_restaurante,))
+    return [(dia, int(total)) for dia, total in cursor.fetchall() if total]
+
+
+def top_platos(cursor, id_restaurante, limite=3, por_tipo=False):
+    """[(N_PLATO, T_PLATO, pedidos)] más pedidos, opcionalmente el top N de cada tipo."""
+    particion = "PARTITION BY p.T_PLATO " if por_tipo else ""
+    orden_tipo = "FIELD(T_PLATO, 'ENTRANTE', 'PRINCIPAL', 'POSTRE', 'BEBIDA'), " if por_tipo else ""
+    cursor.execute(f"""SELECT N_PLATO, T_PLATO, TOTAL_PEDIDOS FROM (
+                          SELECT rp.N_PLATO, p.T_PLATO, rp.TOTAL_PEDIDOS,
+                                 ROW_NUMBER() OVER ({particion}ORDER BY rp.TOTAL_PEDIDOS DESC, rp.N_PLATO) as puesto
+                          FROM resumen_platos rp
+                          LEFT JOIN platos p ON p.ID_RESTAURANTE = rp.ID_RESTAURANTE AND p.N_PLATO = rp.N_PLATO
+                          WHERE rp.ID_RESTAURANTE = %s AND rp.TOTAL_PEDIDOS > 0
+                      ) ranking
+                      WHERE puesto <= %s
+                      ORDER BY {orden_tipo}puesto""", (id_restaurante, limite))
+    return cursor.fetchall()
+
+
+if __name__ == '__main__':
+    import time
+
+    import MySQLdb
+
+    from config import config
+
+    ajustes = config['development']
+    conn = MySQLdb.connect(host=ajustes.MYSQL_HOST, user=ajustes.MYSQL_USER,
+                           passwd=ajustes.MYSQL_PASSWORD, db=ajustes.MYSQL_DB,
+                           charset=ajustes.MYSQL_CHARSET, use_unicode=True)
+    inicio = time.perf_counter()
+    cursor = conn.cursor()
+    crear_tablas(cursor)
+    reconstruir(cursor)
+    conn.commit()
+    for tabla in TABLAS:
+        cursor.execute(f"SELECT COUNT(*) FROM {tabla}")
+        print(f"✓ {tabla}: {cursor.fetchone()[0]} filas")
+    print(f"Resúmenes reconstruidos en {time.perf_counter() - inicio:.1f}s")
+    conn.close()
@@ -4,7 +4,9 @@ const state = {
   restaurantes: [],
   filteredRestaurantes: [],
   currentClientId: '99727933D', // Demo client
-  alergiaSeleccionada: null
+  alergiaSeleccionada: null,
+  menus: {}, // Cartas ya descargadas por id de restaurante
+  ultimaBusqueda: 0 // Para descartar respuestas de /api/buscar que llegan tarde
 };
 
 // ===== UTILITY FUNCTIONS =====
@@ -32,29 +34,30 @@ async function fetchRestaurantes() {
   }
 }
 
-async function fetchPlatosRestaurante(idRestaurante, alergia = null) {
+async function fetchPlatosRestaurante(idRestaurante) {
+  // Cada plato trae su lista de alérgenos, así que el filtro se aplica en local
+  if (state.menus[idRestaurante]) return state.menus[idRestaurante];
   try {
-    let url = `/api/restaurantes/${idRestaurante}/platos`;
-    if (alergia) {
-      url += `?alergia=${encodeURIComponent(alergia)}`;
-    }
-    const response = await fetch(url);
+    const response = await fetch(`/api/restaurantes/${idRestaurante}/platos`);
     const data = await response.json();
-    return data.platos || [];
+    state.menus[idRestaurante] = data.platos || [];
+    return state.menus[idRestaurante];
   } catch (error) {
     console.error('Error:', error);
     return [];
   }
 }
 
-async function fetchReservasCliente(idCliente) {
+// Una página de reservas del cliente; `siguiente` es el token para pedir la próxima
+async function fetchReservasCliente(idCliente, after = null) {
   try {
-    const response = await fetch(`/api/reservas/${idCliente}`);
+    const url = after ? `/api/reservas/${idCliente}?after=${encodeURIComponent(after)}` : `/api/reservas/${idCliente}`;
+    const response = await fetch(url);
     const data = await response.json();
-    return data.reservas || [];
+    return { reservas: data.reservas || [], siguiente: data.siguiente || null };
   } catch (error) {
     console.error('Error:', error);
-    return [];
+    return { reservas: [], siguiente: null };
   }
 }
 
@@ -125,11 +128,11 @@ function renderPlatos(platos, restauranteNombre, alergiaFiltro = null) {
     if (grouped[tipo].length > 0) {
       html += `<div class="mb-4"><h6 class="fw-bold text-primary">${icons[tipo]} ${tipo}</h6><div class="list-group">`;
       grouped[tipo].forEach(plato => {
-        const sinAlergeno = plato.sin_alergeno === true;
+        const sinAlergeno = !!alergiaFiltro && !(plato.alergenos || []).includes(alergiaFiltro);
         const bgColor = sinAlergeno ? 'rgba(212, 237, 218, 0.8)' : 'rgba(255,255,255,0.6)';
         const icon = sinAlergeno ? '✅ ' : '';
         html += `<div class="list-group-item d-flex justify-content-between align-items-center" style="background: ${bgColor}; border: 1px solid var(--glass-border);">
-          <span>${icon}${plato.nombre}</span><span class="badge bg-primary rounded-pill">${plato.precio.toFixed(2)}€</span>
+          <span>${icon}${plato.nombre}${plato.alergenos && plato.alergenos.length ? `<br><small class="text-muted">${plato.alergenos.join(', ')}</small>` : ''}</span><span class="badge bg-primary rounded-pill">${plato.precio.toFixed(2)}€</span>
         </div>`;
       });
       html += `</div></div>`;
@@ -153,7 +156,7 @@ async function showMenu(idRestaurante, nombre) {
   
   // Pasar alergia si hay filtro activo
   const alergia = state.alergiaSeleccionada || null;
-  const platos = await fetchPlatosRestaurante(idRestaurante, alergia);
+  const platos = await fetchPlatosRestaurante(idRestaurante);
   document.getElementById('menuModal').remove();
   document.body.insertAdjacentHTML('beforeend', renderPlatos(platos, nombre, alergia));
   const modal = new bootstrap.Modal(document.getElementById('menuModal'));
@@ -184,16 +187,34 @@ async function applyFilters() {
     const data = await response.json();
     state.restaurantes = data.restaurantes;
     state.filteredRestaurantes = state.restaurantes;
+  } else if (searchTerm.trim()) {
+    // El texto se busca en el servidor (restaurantes y platos, sin acentos);
+    // los filtros van como facetas
+    const idBusqueda = ++state.ultimaBusqueda;
+    const params = new URLSearchParams({ q: searchTerm, limit: 100 });
+    if (estrellas) params.set('estrellas', estrellas);
+    if (presupuesto) params.set('presupuesto', presupuesto);
+    if (tipoComida) params.set('tipo_comida', tipoComida);
+    try {
+      const response = await fetch(`/api/buscar?${params}`);
+      const data = await response.json();
+      // Si mientras tanto se ha escrito algo más, esta respuesta ya no sirve
+      if (idBusqueda !== state.ultimaBusqueda) return;
+      // Restaurantes en orden de relevancia, también los encontrados por uno de sus platos
+      const porId = Object.fromEntries(state.restaurantes.map(r => [r.id, r]));
+      const ids = [...new Set((data.resultados || []).map(r => r.id_restaurante))];
+      state.filteredRestaurantes = ids.map(id => porId[id]).filter(Boolean);
+    } catch (error) {
+      console.error('Error:', error);
+      return;
+    }
   } else {
-    // Aplicar filtros locales
+    state.ultimaBusqueda++;
     state.filteredRestaurantes = state.restaurantes.filter(rest => {
-      const matchSearch = rest.nombre.toLowerCase().includes(searchTerm) || 
-                         rest.tipo_comida.toLowerCase().includes(searchTerm) ||
-                         rest.ciudad.toLowerCase().includes(searchTerm);
       const matchEstrellas = !estrellas || rest.estrellas.toString() === estrellas;
       const matchPresupuesto = !presupuesto || rest.presupuesto.toString() === presupuesto;
       const matchTipo = !tipoComida || rest.tipo_comida === tipoComida;
-      return matchSearch && matchEstrellas && matchPresupuesto && matchTipo;
+      return matchEstrellas && matchPresupuesto && matchTipo;
     });
   }
   
@@ -248,7 +269,14 @@ document.addEventListener('DOMContentLoaded', async function() {
     renderRestaurantes();
     
     const searchInput = document.getElementById('search');
-    if (searchInput) searchInput.addEventListener('input', applyFilters);
+    if (searchInput) {
+      // Se espera a que se deje de escribir un momento antes de buscar
+      let espera = null;
+      searchInput.addEventListener('input', () => {
+        clearTimeout(espera);
+        espera = setTimeout(applyFilters, 150);
+      });
+    }
     
     ['filterEstrellas', 'filterPresupuesto', 'filterTipoComida', 'filterAlergia'].forEach(id => {
       const element = document.getElementById(id);
@@ -267,25 +295,43 @@ document.addEventListener('DOMContentLoaded', async function() {
   // RESERVATIONS PAGE
   if (document.getElementById('reservations-list')) {
     showLoading('reservations-list');
-    const reservas = await fetchReservasCliente(state.currentClientId);
+    const pagina = await fetchReservasCliente(state.currentClientId);
     const container = document.getElementById('reservations-list');
+    const tarjeta = reserva => `
+      <div class="col">
+        <div class="card">
+          <div class="card-body">
+            <h5 class="card-title">${reserva.restaurante_nombre}</h5>
+            <p class="text-muted-custom mb-2"><small>${reserva.restaurante_ciudad}</small></p>
+            <p class="mb-1"><strong>Fecha:</strong> ${reserva.fecha} a las ${reserva.hora}</p>
+            <p class="mb-1"><strong>Personas:</strong> ${reserva.num_personas}</p>
+            <p class="mb-0"><span class="badge ${reserva.estado === 'Confirmada' ? 'bg-success' : 'bg-warning'}">${reserva.estado}</span></p>
+          </div>
+        </div>
+      </div>
+    `;
     
-    if (reservas.length === 0) {
+    if (pagina.reservas.length === 0) {
       container.innerHTML = '<div class="alert alert-info" style="background: var(--glass-bg);">No tienes reservas. <a href="/book" class="alert-link">Haz una reserva</a></div>';
     } else {
-      container.innerHTML = reservas.map(reserva => `
-        <div class="col">
-          <div class="card">
-            <div class="card-body">
-              <h5 class="card-title">${reserva.restaurante_nombre}</h5>
-              <p class="text-muted-custom mb-2"><small>${reserva.restaurante_ciudad}</small></p>
-              <p class="mb-1"><strong>Fecha:</strong> ${reserva.fecha} a las ${reserva.hora}</p>
-              <p class="mb-1"><strong>Personas:</strong> ${reserva.num_personas}</p>
-              <p class="mb-0"><span class="badge ${reserva.estado === 'Confirmada' ? 'bg-success' : 'bg-warning'}">${reserva.estado}</span></p>
-            </div>
+      container.innerHTML = pagina.reservas.map(tarjeta).join('');
+      let siguiente = pagina.siguiente;
+      if (siguiente) {
+        container.insertAdjacentHTML('afterend', `
+          <div class="text-center mt-3">
+            <button class="btn btn-outline-primary" id="cargarMasReservasPagina">Cargar más reservas</button>
           </div>
-        </div>
-      `).join('');
+        `);
+        const boton = document.getElementById('cargarMasReservasPagina');
+        boton.addEventListener('click', async function() {
+          boton.disabled = true;
+          const mas = await fetchReservasCliente(state.currentClientId, siguiente);
+          container.insertAdjacentHTML('beforeend', mas.reservas.map(tarjeta).join(''));
+          siguiente = mas.siguiente;
+          boton.disabled = false;
+          if (!siguiente) boton.parentElement.remove();
+        });
+      }
     }
   }
   
@@ -332,6 +378,135 @@ document.addEventListener('DOMContentLoaded', async function() {
     });
   }
   
+  // Estado de la paginación del área de cliente: tokens de la siguiente página
+  let paginasCliente = { id: null, reservas: null, facturas: null };
+  let resenasMapCliente = {};
+  
+  function tarjetaReservaCliente(reserva) {
+    const hoy = new Date();
+    hoy.setHours(0, 0, 0, 0);
+    
+    // Normalizar formato de fecha - eliminar posibles horas si vienen en el string
+    let fechaStr = reserva.fecha;
+    if (fechaStr && fechaStr.includes(' ')) {
+      fechaStr = fechaStr.split(' ')[0]; // Tomar solo la parte de la fecha
+    }
+    
+    const fechaReserva = new Date(fechaStr + 'T00:00:00');
+    const esFechaPasada = fechaReserva < hoy;
+    const resenaExistente = resenasMapCliente[reserva.id_restaurante];
+    const facturaExistente = reserva.factura;
+    
+    // Verificar si la factura tiene valoración
+    const tieneValoracion = facturaExistente && facturaExistente.valoracion !== null && facturaExistente.valoracion !== undefined;
+    
+    return `
+      <div class="col">
+        <div class="card h-100" style="background: var(--glass-bg); border: 1px solid var(--glass-border);">
+          <div class="card-body">
+            <h5 class="card-title">${reserva.restaurante_nombre}</h5>
+            <p class="text-muted-custom mb-2"><small>${reserva.restaurante_ciudad}</small></p>
+            <p class="mb-1"><strong>Fecha:</strong> ${reserva.fecha} - ${reserva.hora}</p>
+            <p class="mb-1"><strong>Personas:</strong> ${reserva.num_personas}</p>
+            <p class="mb-2">
+              <span class="badge ${reserva.estado === 'CONFIRMADA' || reserva.estado === 'Confirmada' ? 'bg-success' : reserva.estado === 'CANCELADA' || reserva.estado === 'Cancelada' ? 'bg-danger' : 'bg-warning'}">
+                ${reserva.estado}
+              </span>
+              ${esFechaPasada ? '<span class="badge bg-secondary ms-2">Pasada</span>' : ''}
+              ${facturaExistente ? '<span class="badge bg-info ms-2">Con Factura</span>' : ''}
+            </p>
+            ${!esFechaPasada ? `
+              <button class="btn btn-sm btn-primary w-100" onclick="abrirModalEditar('${reserva.id_reserva}', '${reserva.restaurante_nombre}', '${reserva.fecha}', '${reserva.hora}', ${reserva.num_personas})">
+                ✏️ Modificar Reserva
+              </button>
+            ` : `
+              <div class="d-grid gap-2">
+                ${!facturaExistente ? `
+                  <button class="btn btn-sm btn-info" onclick="pedirFacturaFicticio()">
+                    📄 Pedir Factura
+                  </button>
+                ` : tieneValoracion ? `
+                  <div class="alert alert-success mb-0 py-2">
+                    <small><strong>✅ Ya valorado:</strong></small><br>
+                    <span style="font-size: 1.2rem;">${'⭐'.repeat(Math.round(facturaExistente.valoracion))}</span>
+                    <small class="d-block mt-1">${facturaExistente.tipo_visita || 'N/A'}</small>
+                  </div>
+                ` : `
+                  <button class="btn btn-sm btn-warning" onclick="abrirModalValorarFactura('${facturaExistente.id_factura}', '${reserva.id_reserva}', '${reserva.id_restaurante}', '${reserva.restaurante_nombre}')">
+                    ⭐ Valorar Restaurante
+                  </button>
+                `}
+              </div>
+            `}
+          </div>
+        </div>
+      </div>
+    `;
+  }
+  
+  function filaFacturaCliente(f) {
+    const tieneValoracion = f.valoracion !== null && f.valoracion !== undefined;
+    const stars = tieneValoracion ? '⭐'.repeat(Math.round(f.valoracion)) : '';
+    const botonValorar = !tieneValoracion ? 
+      `<button class="btn btn-sm btn-warning" onclick="abrirModalValorarFactura('${f.id_factura}', '${f.id_reserva}', '${f.id_restaurante}', '${f.restaurante_nombre}')">⭐ Valorar</button>` 
+      : stars;
+    
+    return `
+      <tr>
+        <td><code>${f.id_factura}</code></td>
+        <td>${f.restaurante_nombre}<br><small class="text-muted-custom">${f.restaurante_ciudad}</small></td>
+        <td>${f.fecha}</td>
+        <td><span class="badge bg-secondary">${f.tipo_visita || 'N/A'}</span></td>
+        <td><strong>${f.precio.toFixed(2)}€</strong></td>
+        <td>${botonValorar}</td>
+      </tr>
+    `;
+  }
+  
+  // Añade (o quita) el botón "cargar más" debajo de un listado
+  function botonCargarMas(contenedor, funcion, siguiente, texto) {
+    const id = `${funcion}Boton`;
+    document.getElementById(id)?.remove();
+    if (!siguiente) return;
+    contenedor.insertAdjacentHTML('afterend', `
+      <div class="text-center mt-3" id="${id}">
+        <button class="btn btn-outline-primary" onclick="${funcion}(this)">${texto}</button>
+      </div>
+    `);
+  }
+  
+  // Pide la página siguiente de un listado del cliente; devuelve sus filas
+  async function paginaSiguienteCliente(tipo, url, boton) {
+    boton.disabled = true;
+    try {
+      const response = await fetch(`${url}?after=${encodeURIComponent(paginasCliente[tipo])}`);
+      const data = await response.json();
+      paginasCliente[tipo] = data.siguiente || null;
+      return data[tipo] || [];
+    } catch (error) {
+      console.error('Error:', error);
+      alert('Error al cargar más resultados');
+      return [];
+    } finally {
+      boton.disabled = false;
+    }
+  }
+  
+  window.cargarMasReservasCliente = async function(boton) {
+    const reservas = await paginaSiguienteCliente('reservas', `/api/reservas/${paginasCliente.id}`, boton);
+    const contenedor = document.getElementById('clientReservas');
+    contenedor.insertAdjacentHTML('beforeend', reservas.map(tarjetaReservaCliente).join(''));
+    botonCargarMas(contenedor, 'cargarMasReservasCliente', paginasCliente.reservas, 'Cargar más reservas');
+  };
+  
+  window.cargarMasFacturasCliente = async function(boton) {
+    const facturas = await paginaSiguienteCliente('facturas', `/api/facturas/${paginasCliente.id}`, boton);
+    document.getElementById('clientFacturasBody')
+      .insertAdjacentHTML('beforeend', facturas.map(filaFacturaCliente).join(''));
+    botonCargarMas(document.getElementById('clientFacturas'), 'cargarMasFacturasCliente',
+                   paginasCliente.facturas, 'Cargar más facturas');
+  };
+  
   async function mostrarDatosCliente(cliente) {
     // Guardar cliente actual en sessionStorage
     sessionStorage.setItem('currentClient', JSON.stringify(cliente));
@@ -352,116 +527,46 @@ document.addEventListener('DOMContentLoaded', async function() {
       </div>
     `;
     
-    // Fetch reservas
+    // Primera página de reservas (cada una trae su factura, si la tiene) y de facturas
     const reservasResponse = await fetch(`/api/reservas/${cliente.id}`);
     const reservasData = await reservasResponse.json();
     const reservas = reservasData.reservas || [];
+    paginasCliente = {
+      id: cliente.id,
+      reservas: reservasData.siguiente || null,
+      facturas: null
+    };
     
-    // Fetch facturas
     const facturasResponse = await fetch(`/api/facturas/${cliente.id}`);
     const facturasData = await facturasResponse.json();
     const facturas = facturasData.facturas || [];
-    
-    // Crear un mapa de facturas por ID_RESERVA
-    const facturasMap = {};
-    facturas.forEach(f => {
-      if (f.id_reserva) {
-        facturasMap[f.id_reserva] = f;
-      }
-    });
+    paginasCliente.facturas = facturasData.siguiente || null;
     
     // Fetch reseñas del cliente
     const resenasResponse = await fetch(`/api/resenas/${cliente.id}`);
     const resenasData = await resenasResponse.json();
     const resenas = resenasData.resenas || [];
     
-    console.log('Reseñas obtenidas:', resenas);
-    
     // Crear un mapa de reseñas por restaurante
-    const resenasMap = {};
+    resenasMapCliente = {};
     resenas.forEach(r => {
       // Usar directamente el id_restaurante de la reseña
-      resenasMap[r.id_restaurante] = r;
+      resenasMapCliente[r.id_restaurante] = r;
     });
     
-    console.log('Mapa de reseñas:', resenasMap);
-    console.log('Mapa de facturas:', facturasMap);
-    
-    // Update stats
-    document.getElementById('totalReservas').textContent = reservas.length;
-    document.getElementById('totalFacturas').textContent = facturas.length;
-    const totalGastado = facturas.reduce((sum, f) => sum + f.precio, 0);
-    document.getElementById('totalGastado').textContent = totalGastado.toFixed(2) + '€';
+    // Update stats (totales de todo el histórico, calculados en el servidor)
+    document.getElementById('totalReservas').textContent = reservasData.total || 0;
+    document.getElementById('totalFacturas').textContent = facturasData.total || 0;
+    document.getElementById('totalGastado').textContent = (facturasData.importe_total || 0).toFixed(2) + '€';
     
     // Render reservas
     const reservasContainer = document.getElementById('clientReservas');
     if (reservas.length === 0) {
       reservasContainer.innerHTML = '<div class="col-12"><p class="text-muted-custom">No hay reservas registradas.</p></div>';
     } else {
-      const hoy = new Date();
-      hoy.setHours(0, 0, 0, 0);
-      
-      reservasContainer.innerHTML = reservas.map(reserva => {
-        // Normalizar formato de fecha - eliminar posibles horas si vienen en el string
-        let fechaStr = reserva.fecha;
-        if (fechaStr && fechaStr.includes(' ')) {
-          fechaStr = fechaStr.split(' ')[0]; // Tomar solo la parte de la fecha
-        }
-        
-        const fechaReserva = new Date(fechaStr + 'T00:00:00');
-        const esFechaPasada = fechaReserva < hoy;
-        const resenaExistente = resenasMap[reserva.id_restaurante];
-        const facturaExistente = facturasMap[reserva.id_reserva];
-        
-        // Verificar si la factura tiene valoración
-        const tieneValoracion = facturaExistente && facturaExistente.valoracion !== null && facturaExistente.valoracion !== undefined;
-        
-        console.log(`Reserva: ${reserva.restaurante_nombre}, Fecha original: "${reserva.fecha}", Fecha normalizada: "${fechaStr}", Fecha parseada: ${fechaReserva}, Hoy: ${hoy}, Es pasada: ${esFechaPasada}, Tiene factura:`, facturaExistente, 'Tiene valoración:', tieneValoracion);
-        
-        return `
-          <div class="col">
-            <div class="card h-100" style="background: var(--glass-bg); border: 1px solid var(--glass-border);">
-              <div class="card-body">
-                <h5 class="card-title">${reserva.restaurante_nombre}</h5>
-                <p class="text-muted-custom mb-2"><small>${reserva.restaurante_ciudad}</small></p>
-                <p class="mb-1"><strong>Fecha:</strong> ${reserva.fecha} - ${reserva.hora}</p>
-                <p class="mb-1"><strong>Personas:</strong> ${reserva.num_personas}</p>
-                <p class="mb-2">
-                  <span class="badge ${reserva.estado === 'CONFIRMADA' || reserva.estado === 'Confirmada' ? 'bg-success' : reserva.estado === 'CANCELADA' || reserva.estado === 'Cancelada' ? 'bg-danger' : 'bg-warning'}">
-                    ${reserva.estado}
-                  </span>
-                  ${esFechaPasada ? '<span class="badge bg-secondary ms-2">Pasada</span>' : ''}
-                  ${facturaExistente ? '<span class="badge bg-info ms-2">Con Factura</span>' : ''}
-                </p>
-                ${!esFechaPasada ? `
-                  <button class="btn btn-sm btn-primary w-100" onclick="abrirModalEditar('${reserva.id_reserva}', '${reserva.restaurante_nombre}', '${reserva.fecha}', '${reserva.hora}', ${reserva.num_personas})">
-                    ✏️ Modificar Reserva
-                  </button>
-                ` : `
-                  <div class="d-grid gap-2">
-                    ${!facturaExistente ? `
-                      <button class="btn btn-sm btn-info" onclick="pedirFacturaFicticio()">
-                        📄 Pedir Factura
-                      </button>
-                    ` : tieneValoracion ? `
-                      <div class="alert alert-success mb-0 py-2">
-                        <small><strong>✅ Ya valorado:</strong></small><br>
-                        <span style="font-size: 1.2rem;">${'⭐'.repeat(Math.round(facturaExistente.valoracion))}</span>
-                        <small class="d-block mt-1">${facturaExistente.tipo_visita || 'N/A'}</small>
-                      </div>
-                    ` : `
-                      <button class="btn btn-sm btn-warning" onclick="abrirModalValorarFactura('${facturaExistente.id_factura}', '${reserva.id_reserva}', '${reserva.id_restaurante}', '${reserva.restaurante_nombre}')">
-                        ⭐ Valorar Restaurante
-                      </button>
-                    `}
-                  </div>
-                `}
-              </div>
-            </div>
-          </div>
-        `;
-      }).join('');
+      reservasContainer.innerHTML = reservas.map(tarjetaReservaCliente).join('');
     }
+    botonCargarMas(reservasContainer, 'cargarMasReservasCliente', paginasCliente.reservas, 'Cargar más reservas');
     
     // Render facturas
     const facturasContainer = document.getElementById('clientFacturas');
@@ -481,30 +586,14 @@ document.addEventListener('DOMContentLoaded', async function() {
                 <th>Valoración</th>
               </tr>
             </thead>
-            <tbody>
-              ${facturas.map(f => {
-                const tieneValoracion = f.valoracion !== null && f.valoracion !== undefined;
-                const stars = tieneValoracion ? '⭐'.repeat(Math.round(f.valoracion)) : '';
-                const botonValorar = !tieneValoracion ? 
-                  `<button class="btn btn-sm btn-warning" onclick="abrirModalValorarFactura('${f.id_factura}', '${f.id_reserva}', '${f.id_restaurante}', '${f.restaurante_nombre}')">⭐ Valorar</button>` 
-                  : stars;
-                
-                return `
-                  <tr>
-                    <td><code>${f.id_factura}</code></td>
-                    <td>${f.restaurante_nombre}<br><small class="text-muted-custom">${f.restaurante_ciudad}</small></td>
-                    <td>${f.fecha}</td>
-                    <td><span class="badge bg-secondary">${f.tipo_visita || 'N/A'}</span></td>
-                    <td><strong>${f.precio.toFixed(2)}€</strong></td>
-                    <td>${botonValorar}</td>
-                  </tr>
-                `;
-              }).join('')}
+            <tbody id="clientFacturasBody">
+              ${facturas.map(filaFacturaCliente).join('')}
             </tbody>
           </table>
         </div>
       `;
     }
+    botonCargarMas(facturasContainer, 'cargarMasFacturasCliente', paginasCliente.facturas, 'Cargar más facturas');
     
     document.getElementById('clientResults').style.display = 'block';
     document.getElementById('noResults').style.display = 'none';
@@ -2,6 +2,7 @@
 let restauranteActual = null;
 let platosDisponibles = [];
 let platosFactura = []; // Array de {plato: objeto, cantidad: numero}
+let siguienteReservas = null; // token de la siguiente página de reservas
 
 document.addEventListener('DOMContentLoaded', function() {
   // Check if restaurant is already logged in
@@ -86,38 +87,26 @@ async function cargarDatosRestaurante(restaurante) {
   // Cargar platos del restaurante
   await cargarPlatos(restaurante.id);
 
-  // Cargar reservas
+  // Cargar la primera página de reservas (cada una trae su factura, si la tiene)
   const reservasResponse = await fetch(`/api/restaurantes/${restaurante.id}/reservas`);
   const reservasData = await reservasResponse.json();
   const reservas = reservasData.reservas || [];
+  siguienteReservas = reservasData.siguiente || null;
 
-  // Cargar facturas del restaurante
-  const facturasResponse = await fetch(`/api/restaurantes/${restaurante.id}/facturas`);
+  // De las facturas solo hacen falta los totales
+  const facturasResponse = await fetch(`/api/restaurantes/${restaurante.id}/facturas?limit=1`);
   const facturasData = await facturasResponse.json();
-  const facturas = facturasData.facturas || [];
 
-  // Crear mapa de facturas por id_reserva
-  const facturasMap = {};
-  facturas.forEach(f => {
-    if (f.id_reserva) {
-      facturasMap[f.id_reserva] = f;
-    }
-  });
-
-  // Calcular estadísticas
-  const ingresosTotales = facturas.reduce((sum, f) => sum + f.precio, 0);
-  document.getElementById('totalReservasRestaurante').textContent = reservas.length;
-  document.getElementById('totalFacturasRestaurante').textContent = facturas.length;
-  document.getElementById('ingresosTotales').textContent = ingresosTotales.toFixed(2) + '€';
+  // Estadísticas (calculadas en el servidor sobre todo el histórico)
+  document.getElementById('totalReservasRestaurante').textContent = reservasData.total || 0;
+  document.getElementById('totalFacturasRestaurante').textContent = facturasData.total || 0;
+  document.getElementById('ingresosTotales').textContent = (facturasData.importe_total || 0).toFixed(2) + '€';
 
   // Renderizar reservas
   const reservasContainer = document.getElementById('reservasRestaurante');
   if (reservas.length === 0) {
     reservasContainer.innerHTML = '<p class="text-muted-custom">No hay reservas registradas.</p>';
   } else {
-    const hoy = new Date();
-    hoy.setHours(0, 0, 0, 0);
-
     reservasContainer.innerHTML = `
       <div class="table-responsive">
         <table class="table table-hover">
@@ -132,43 +121,17 @@ async function cargarDatosRestaurante(restaurante) {
               <th>Acción</th>
             </tr>
           </thead>
-          <tbody>
-            ${reservas.map(r => {
-              const fechaReserva = new Date(r.fecha + 'T00:00:00');
-              const esPasada = fechaReserva < hoy;
-              const tieneFactura = facturasMap[r.id_reserva];
-              
-              return `
-                <tr>
-                  <td><code>${r.id_reserva}</code></td>
-                  <td>${r.nombre_cliente}</td>
-                  <td>${r.fecha}</td>
-                  <td>${r.hora}</td>
-                  <td>${r.num_personas}</td>
-                  <td>
-                    <span class="badge ${r.estado && (r.estado.toLowerCase() === 'confirmada') ? 'bg-success' : 'bg-secondary'}">
-                      ${r.estado ? r.estado.charAt(0).toUpperCase() + r.estado.slice(1).toLowerCase() : ''}
-                    </span>
-                    ${esPasada ? '<span class="badge bg-secondary ms-1">Pasada</span>' : ''}
-                    ${tieneFactura ? '<span class="badge bg-info ms-1">Facturada</span>' : ''}
-                  </td>
-                  <td>
-                    ${esPasada && !tieneFactura ? `
-                      <button class="btn btn-sm btn-primary" onclick="abrirModalCrearFactura('${r.id_reserva}', '${r.id_cliente}', '${r.nombre_cliente}', '${r.fecha}', '${r.hora}')">
-                        <i class="fas fa-receipt"></i> Crear Factura
-                      </button>
-                    ` : tieneFactura ? `
-                      <span class="text-success"><i class="fas fa-check-circle"></i> Factura: ${tieneFactura.id_factura} (${tieneFactura.precio.toFixed(2)}€)</span>
-                    ` : `
-                      <span class="text-muted">Pendiente</span>
-                    `}
-                  </td>
-                </tr>
-              `;
-            }).join('')}
+          <tbody id="reservasRestauranteBody">
+            ${reservas.map(filaReservaRestaurante).join('')}
           </tbody>
         </table>
       </div>
+      <div class="text-center">
+        <button class="btn btn-outline-primary" id="cargarMasReservas" onclick="cargarMasReservas()"
+                style="display: ${siguienteReservas ? 'inline-block' : 'none'};">
+          Cargar más reservas
+        </button>
+      </div>
     `;
   }
 
@@ -176,6 +139,62 @@ async function cargarDatosRestaurante(restaurante) {
   document.getElementById('noRestaurant').style.display = 'none';
 }
 
+function filaReservaRestaurante(r) {
+  const hoy = new Date();
+  hoy.setHours(0, 0, 0, 0);
+  const fechaReserva = new Date(r.fecha + 'T00:00:00');
+  const esPasada = fechaReserva < hoy;
+  const tieneFactura = r.factura;
+
+  return `
+    <tr>
+      <td><code>${r.id_reserva}</code></td>
+      <td>${r.nombre_cliente}</td>
+      <td>${r.fecha}</td>
+      <td>${r.hora}</td>
+      <td>${r.num_personas}</td>
+      <td>
+        <span class="badge ${r.estado && (r.estado.toLowerCase() === 'confirmada') ? 'bg-success' : 'bg-secondary'}">
+          ${r.estado ? r.estado.charAt(0).toUpperCase() + r.estado.slice(1).toLowerCase() : ''}
+        </span>
+        ${esPasada ? '<span class="badge bg-secondary ms-1">Pasada</span>' : ''}
+        ${tieneFactura ? '<span class="badge bg-info ms-1">Facturada</span>' : ''}
+      </td>
+      <td>
+        ${esPasada && !tieneFactura ? `
+          <button class="btn btn-sm btn-primary" onclick="abrirModalCrearFactura('${r.id_reserva}', '${r.id_cliente}', '${r.nombre_cliente}', '${r.fecha}', '${r.hora}')">
+            <i class="fas fa-receipt"></i> Crear Factura
+          </button>
+        ` : tieneFactura ? `
+          <span class="text-success"><i class="fas fa-check-circle"></i> Factura: ${tieneFactura.id_factura} (${tieneFactura.precio.toFixed(2)}€)</span>
+        ` : `
+          <span class="text-muted">Pendiente</span>
+        `}
+      </td>
+    </tr>
+  `;
+}
+
+// Pide la página siguiente de reservas y añade sus filas a la tabla
+async function cargarMasReservas() {
+  if (!restauranteActual || !siguienteReservas) return;
+  const boton = document.getElementById('cargarMasReservas');
+  boton.disabled = true;
+  try {
+    const response = await fetch(`/api/restaurantes/${restauranteActual.id}/reservas?after=${encodeURIComponent(siguienteReservas)}`);
+    const data = await response.json();
+    document.getElementById('reservasRestauranteBody')
+      .insertAdjacentHTML('beforeend', (data.reservas || []).map(filaReservaRestaurante).join(''));
+    siguienteReservas = data.siguiente || null;
+  } catch (error) {
+    console.error('Error:', error);
+    alert('Error al cargar más reservas');
+  } finally {
+    boton.disabled = false;
+    boton.style.display = siguienteReservas ? 'inline-block' : 'none';
+  }
+}
+
 async function cargarPlatos(idRestaurante) {
   try {
     const response = await fetch(`/api/restaurantes/${idRestaurante}/platos`);
@@ -325,7 +344,7 @@ async function generarFactura() {
     const data = await response.json();
     
     if (response.ok) {
-      alert(`Factura generada correctamente!\n\nID: ${data.id_factura}\nTotal: ${total.toFixed(2)}€`);
+      alert(`Factura generada correctamente!\n\nID: ${data.id_factura}\nTotal: ${data.precio.toFixed(2)}€`);
       
       // Cerrar modal
       const modal = bootstrap.Modal.getInstance(document.getElementById('crearFacturaModal'));
@@ -361,146 +380,117 @@ document.getElementById('analytics-tab')?.addEventListener('shown.bs.tab', async
 
 async function cargarAnalytics(idRestaurante) {
   try {
-    // Cargar clientes sin valorar
-    await cargarClientesSinValorar(idRestaurante);
-    
-    // Cargar gasto medio
-    await cargarGastoMedio(idRestaurante);
-    
-    // Cargar día más concurrido
-    await cargarDiaMasConcurrido(idRestaurante);
-    
-    // Cargar top platos
-    await cargarTopPlatos(idRestaurante);
+    // Todas las métricas llegan en una sola petición
+    const response = await fetch(`/api/restaurantes/${idRestaurante}/analytics/dashboard?format=svg`);
+    const data = await response.json();
+    if (!response.ok) {
+      throw new Error(data.mensaje || 'Error al cargar analytics');
+    }
     
-    // Cargar gráfico comparativo de precios
-    await cargarGraficoPrecioComparativo(idRestaurante);
+    pintarClientesSinValorar(data.sin_valorar);
+    pintarGastoMedio(data.gasto_medio);
+    pintarDiaMasConcurrido(data.reservas_por_dia);
+    pintarTopPlatos(data.top_platos);
+    pintarGraficoPrecioComparativo(data.precio_comparativo);
   } catch (error) {
     console.error('Error cargando analytics:', error);
+    document.getElementById('diaMasConcurrido').innerHTML = '<p class="text-danger">Error al cargar el gráfico.</p>';
+    document.getElementById('graficoPrecioComparativo').innerHTML = '<p class="text-danger">Error al cargar el gráfico comparativo.</p>';
   }
 }
 
-async function cargarClientesSinValorar(idRestaurante) {
-  try {
-    const response = await fetch(`/api/restaurantes/${idRestaurante}/analytics/sin-valorar`);
-    const data = await response.json();
-    
-    const container = document.getElementById('clientesSinValorar');
-    
-    if (!data.clientes || data.clientes.length === 0) {
-      container.innerHTML = '<p class="text-muted-custom">¡Genial! Todos los clientes han valorado tu restaurante.</p>';
-      return;
-    }
-    
-    container.innerHTML = `
-      <div class="table-responsive">
-        <table class="table table-hover">
-          <thead>
+function pintarClientesSinValorar(clientes) {
+  const container = document.getElementById('clientesSinValorar');
+  
+  if (!clientes || clientes.length === 0) {
+    container.innerHTML = '<p class="text-muted-custom">¡Genial! Todos los clientes han valorado tu restaurante.</p>';
+    return;
+  }
+  
+  container.innerHTML = `
+    <div class="table-responsive">
+      <table class="table table-hover">
+        <thead>
+          <tr>
+            <th>Cliente</th>
+            <th>Email</th>
+            <th>Fecha Visita</th>
+            <th>Acción</th>
+          </tr>
+        </thead>
+        <tbody>
+          ${clientes.map(c => `
             <tr>
-              <th>Cliente</th>
-              <th>Email</th>
-              <th>Fecha Visita</th>
-              <th>Acción</th>
+              <td>
+                <strong>${c.nombre}</strong><br>
+                <small class="text-muted-custom">ID: ${c.id_cliente}</small>
+              </td>
+              <td>${c.email}</td>
+              <td>${c.fecha_visita}</td>
+              <td>
+                <button class="btn btn-sm btn-warning" onclick="abrirModalEmail('${c.id_cliente}', '${c.nombre}', '${c.email}', '${restauranteActual.nombre}')">
+                  <i class="fas fa-envelope"></i> Enviar Recordatorio
+                </button>
+              </td>
             </tr>
-          </thead>
-          <tbody>
-            ${data.clientes.map(c => `
-              <tr>
-                <td>
-                  <strong>${c.nombre}</strong><br>
-                  <small class="text-muted-custom">ID: ${c.id_cliente}</small>
-                </td>
-                <td>${c.email}</td>
-                <td>${c.fecha_visita}</td>
-                <td>
-                  <button class="btn btn-sm btn-warning" onclick="abrirModalEmail('${c.id_cliente}', '${c.nombre}', '${c.email}', '${restauranteActual.nombre}')">
-                    <i class="fas fa-envelope"></i> Enviar Recordatorio
-                  </button>
-                </td>
-              </tr>
-            `).join('')}
-          </tbody>
-        </table>
-      </div>
-    `;
-  } catch (error) {
-    console.error('Error:', error);
-  }
+          `).join('')}
+        </tbody>
+      </table>
+    </div>
+  `;
 }
 
-async function cargarGastoMedio(idRestaurante) {
-  try {
-    const response = await fetch(`/api/restaurantes/${idRestaurante}/analytics/gasto-medio`);
-    const data = await response.json();
-    
-    const container = document.getElementById('gastoMedio');
+function pintarGastoMedio(gastoMedio) {
+  const container = document.getElementById('gastoMedio');
+  container.innerHTML = `
+    <div class="text-center py-4">
+      <h2 class="display-4" style="color: var(--primary);">${gastoMedio}€</h2>
+      <p class="text-muted-custom">por persona</p>
+    </div>
+  `;
+}
+
+function pintarDiaMasConcurrido(reservasPorDia) {
+  const container = document.getElementById('diaMasConcurrido');
+  
+  if (reservasPorDia && reservasPorDia.imagen_url) {
     container.innerHTML = `
-      <div class="text-center py-4">
-        <h2 class="display-4" style="color: var(--primary);">${data.gasto_medio}€</h2>
-        <p class="text-muted-custom">por persona</p>
+      <div class="text-center">
+        <img src="${reservasPorDia.imagen_url}" alt="Gráfico de reservas por día" class="img-fluid" style="max-width: 100%; height: auto;">
       </div>
     `;
-  } catch (error) {
-    console.error('Error:', error);
+  } else {
+    container.innerHTML = '<p class="text-muted-custom">No hay datos suficientes para generar el gráfico.</p>';
   }
 }
 
-async function cargarDiaMasConcurrido(idRestaurante) {
-  try {
-    const response = await fetch(`/api/restaurantes/${idRestaurante}/analytics/grafico-dias`);
-    const data = await response.json();
-    
-    const container = document.getElementById('diaMasConcurrido');
-    
-    if (data.imagen) {
-      container.innerHTML = `
-        <div class="text-center">
-          <img src="data:image/png;base64,${data.imagen}" alt="Gráfico de reservas por día" class="img-fluid" style="max-width: 100%; height: auto;">
-        </div>
-      `;
-    } else {
-      container.innerHTML = '<p class="text-muted-custom">No hay datos suficientes para generar el gráfico.</p>';
-    }
-  } catch (error) {
-    console.error('Error:', error);
-    document.getElementById('diaMasConcurrido').innerHTML = '<p class="text-danger">Error al cargar el gráfico.</p>';
+function pintarTopPlatos(platos) {
+  const container = document.getElementById('topPlatos');
+  
+  if (!platos || platos.length === 0) {
+    container.innerHTML = '<p class="text-muted-custom">No hay datos de platos pedidos aún.</p>';
+    return;
   }
-}
-
-async function cargarTopPlatos(idRestaurante) {
-  try {
-    const response = await fetch(`/api/restaurantes/${idRestaurante}/analytics/top-platos`);
-    const data = await response.json();
-    
-    const container = document.getElementById('topPlatos');
-    
-    if (!data.platos || data.platos.length === 0) {
-      container.innerHTML = '<p class="text-muted-custom">No hay datos de platos pedidos aún.</p>';
-      return;
-    }
-    
-    const medallas = ['🥇', '🥈', '🥉'];
-    const colores = ['#FFD700', '#C0C0C0', '#CD7F32'];
-    
-    container.innerHTML = `
-      <div class="row g-3">
-        ${data.platos.map((plato, idx) => `
-          <div class="col-md-4">
-            <div class="card text-center h-100" style="background: linear-gradient(135deg, ${colores[idx]}22, ${colores[idx]}11); border: 2px solid ${colores[idx]};">
-              <div class="card-body">
-                <div style="font-size: 3rem;">${medallas[idx]}</div>
-                <h5 class="card-title">${plato.nombre}</h5>
-                <span class="badge bg-secondary mb-2">${plato.tipo}</span>
-                <p class="mb-0"><strong>${plato.total_pedidos}</strong> pedidos</p>
-              </div>
+  
+  const medallas = ['🥇', '🥈', '🥉'];
+  const colores = ['#FFD700', '#C0C0C0', '#CD7F32'];
+  
+  container.innerHTML = `
+    <div class="row g-3">
+      ${platos.map((plato, idx) => `
+        <div class="col-md-4">
+          <div class="card text-center h-100" style="background: linear-gradient(135deg, ${colores[idx]}22, ${colores[idx]}11); border: 2px solid ${colores[idx]};">
+            <div class="card-body">
+              <div style="font-size: 3rem;">${medallas[idx]}</div>
+              <h5 class="card-title">${plato.nombre}</h5>
+              <span class="badge bg-secondary mb-2">${plato.tipo}</span>
+              <p class="mb-0"><strong>${plato.total_pedidos}</strong> pedidos</p>
             </div>
           </div>
-        `).join('')}
-      </div>
-    `;
-  } catch (error) {
-    console.error('Error:', error);
-  }
+        </div>
+      `).join('')}
+    </div>
+  `;
 }
 
 // Función para abrir modal de email
@@ -539,41 +529,33 @@ function enviarEmailRecordatorio() {
 }
 
 // Función para cargar gráfico comparativo de precios
-async function cargarGraficoPrecioComparativo(idRestaurante) {
-  try {
-    const response = await fetch(`/api/restaurantes/${idRestaurante}/analytics/grafico-precio-comparativo`);
-    const data = await response.json();
-    
-    const container = document.getElementById('graficoPrecioComparativo');
-    
-    if (data.imagen) {
-      let infoHtml = '';
-      if (data.percentil !== null) {
-        const interpretacion = data.percentil < 25 ? 'económico' : 
-                              data.percentil < 50 ? 'precio medio-bajo' :
-                              data.percentil < 75 ? 'precio medio-alto' : 'premium';
-        infoHtml = `
-          <div class="alert alert-info mt-3">
-            <strong>📊 Análisis:</strong> Tu restaurante está en el <strong>percentil ${data.percentil}</strong> del mercado (${interpretacion}).
-            <br>
-            <strong>Tu precio:</strong> ${data.gasto_restaurante}€/persona | 
-            <strong>Media del mercado:</strong> ${data.media_mercado}€/persona | 
-            <strong>Muestra:</strong> ${data.total_restaurantes} restaurantes
-          </div>
-        `;
-      }
-      
-      container.innerHTML = `
-        <div class="text-center">
-          <img src="data:image/png;base64,${data.imagen}" alt="Gráfico comparativo de precios" class="img-fluid" style="max-width: 100%; height: auto;">
-          ${infoHtml}
+function pintarGraficoPrecioComparativo(data) {
+  const container = document.getElementById('graficoPrecioComparativo');
+  
+  if (data && data.imagen_url) {
+    let infoHtml = '';
+    if (data.percentil !== null) {
+      const interpretacion = data.percentil < 25 ? 'económico' : 
+                            data.percentil < 50 ? 'precio medio-bajo' :
+                            data.percentil < 75 ? 'precio medio-alto' : 'premium';
+      infoHtml = `
+        <div class="alert alert-info mt-3">
+          <strong>📊 Análisis:</strong> Tu restaurante está en el <strong>percentil ${data.percentil}</strong> del mercado (${interpretacion}).
+          <br>
+          <strong>Tu precio:</strong> ${data.gasto_restaurante}€/persona | 
+          <strong>Media del mercado:</strong> ${data.media_mercado}€/persona | 
+          <strong>Muestra:</strong> ${data.total_restaurantes} restaurantes
         </div>
       `;
-    } else {
-      container.innerHTML = '<p class="text-muted-custom">No hay datos suficientes para generar el gráfico.</p>';
     }
-  } catch (error) {
-    console.error('Error:', error);
-    document.getElementById('graficoPrecioComparativo').innerHTML = '<p class="text-danger">Error al cargar el gráfico comparativo.</p>';
+    
+    container.innerHTML = `
+      <div class="text-center">
+        <img src="${data.imagen_url}" alt="Gráfico comparativo de precios" class="img-fluid" style="max-width: 100%; height: auto;">
+        ${infoHtml}
+      </div>
+    `;
+  } else {
+    container.innerHTML = '<p class="text-muted-custom">No hay datos suficientes para generar el gráfico.</p>';
   }
 }
@@ -0,0 +1,104 @@
+"""Presupuesto de sentencias y detección de N+1 de auditoria_sql con la config 'testing'."""
+import pytest
+from flask import Blueprint, Flask, request
+
+import db
+from auditoria_sql import AuditoriaSQL, ConsultasExcesivas, huella
+from config import config
+
+
+@pytest.fixture
+def auditoria():
+    return AuditoriaSQL()
+
+
+@pytest.fixture
+def cliente(auditoria):
+    app = Flask(__name__)
+    app.config.from_object(config['testing'])
+    auditoria.init_app(app)
+
+    # Anotan lo mismo que db.CursorMedido en cada execute(), sin necesitar MySQL
+    @app.route('/distintas/<int:n>')
+    def distintas(n):
+        for i in range(n):
+            db._anotar(0.001, 1, query=f"SELECT * FROM tabla_{i} WHERE ID = %s", args=(i,))
+        return 'ok'
+
+    @app.route('/repetida/<int:n>')
+    def repetida(n):
+        for i in range(n):
+            db._anotar(0.001, 1, query="SELECT * FROM platos WHERE ID_RESTAURANTE = %s", args=(i,))
+        return 'ok'
+
+    # Mismo endpoint que el cierre de servicio de app.py ('api.crear_facturas_lote')
+    api = Blueprint('api', __name__)
+
+    @api.route('/facturas/lote/<int:n>')
+    def crear_facturas_lote(n):
+        for inicio in range(0, n, 50):
+            db.marcar_lote()
+            db._anotar(0.001, 1, query="SELECT N_PLATO, PRECIO FROM platos WHERE ID_RESTAURANTE = %s",
+                       args=('R0001',))
+            for i in range(inicio, min(n, inicio + 50)):
+                db._anotar(0.001, 0, query="INSERT INTO facturas (ID_FACTURA, PRECIO) VALUES (%s, %s)",
+                           args=(i, 10))
+                db._anotar(0.001, 0, query="INSERT INTO comandas (ID_FACTURA, N_PLATO) VALUES (%s, %s), (%s, %s)",
+                           args=(i, 1, i, 2))
+                if 'cliente' in request.args:
+                    db._anotar(0.001, 1, query="SELECT * FROM clientes WHERE ID_CLIENTE = %s", args=(i,))
+        return 'ok'
+
+    app.register_blueprint(api)
+    return app.test_client()
+
+
+def test_dentro_del_presupuesto(cliente):
+    presupuesto = config['testing'].CONSULTAS_PRESUPUESTO
+    assert cliente.get(f'/distintas/{presupuesto}').status_code == 200
+
+
+def test_por_encima_del_presupuesto(cliente):
+    presupuesto = config['testing'].CONSULTAS_PRESUPUESTO
+    with pytest.raises(ConsultasExcesivas, match=f'presupuesto de {presupuesto}'):
+        cliente.get(f'/distintas/{presupuesto + 1}')
+
+
+def test_presupuesto_de_un_test(cliente, auditoria):
+    with auditoria.presupuesto(3):
+        assert cliente.get('/distintas/3').status_code == 200
+        with pytest.raises(ConsultasExcesivas):
+            cliente.get('/distintas/4')
+    assert cliente.get('/distintas/4').status_code == 200
+
+
+def test_n_mas_1(cliente):
+    assert cliente.get('/repetida/5').status_code == 200
+    with pytest.raises(ConsultasExcesivas, match='6 veces la misma sentencia'):
+        cliente.get('/repetida/6')
+
+
+def test_huella():
+    assert huella("SELECT * FROM t WHERE a = 5 AND b = 'x' AND c IN (%s, %s, %s)") == \
+        "SELECT * FROM t WHERE a = ? AND b = ? AND c IN (?)"
+    assert huella("INSERT INTO t VALUES (%s, %s), (%s, %s)") == "INSERT INTO t VALUES (?)"
+    assert huella("ROLLBACK TO SAVEPOINT lote") is None
+
+
+def test_lotes(cliente, auditoria):
+    # Los INSERT de cada factura están permitidos y la consulta de precios se repite una vez por lote
+    with auditoria.presupuesto(2000):
+        assert cliente.get('/facturas/lote/400').status_code == 200
+
+
+def test_n_mas_1_en_lotes(cliente, auditoria):
+    # Una consulta más por factura sigue siendo un N+1 aunque el endpoint trabaje por lotes
+    with auditoria.presupuesto(2000):
+        with pytest.raises(ConsultasExcesivas, match='400 veces la misma sentencia'):
+            cliente.get('/facturas/lote/400?cliente=1')
+
+
+def test_presupuesto_en_lotes(cliente):
+    presupuesto = config['testing'].CONSULTAS_PRESUPUESTO
+    with pytest.raises(ConsultasExcesivas, match=f'presupuesto de {presupuesto}'):
+        cliente.get('/facturas/lote/50')
@@ -0,0 +1,42 @@
+import pytest
+
+from busqueda import normalizar, puntuar, trigramas_consulta, trigramas_texto
+
+
+def test_normalizar():
+    assert normalizar('  José-María  PÉREZ_ ') == 'jose maria perez'
+
+
+def test_trigramas_consulta():
+    assert trigramas_consulta(['galo']) == {'gal', 'alo'}
+    # Una o dos letras solo se buscan como prefijo de palabra, junto a otra más larga
+    assert trigramas_consulta(['g', 'perez']) == {'  g', 'per', 'ere', 'rez'}
+    assert trigramas_consulta(['ga', 'pe', 'lopez']) == {' ga', ' pe', 'lop', 'ope', 'pez'}
+
+
+def test_consulta_sin_palabras_de_tres_caracteres():
+    for palabras in (['g'], ['ga', 'pe']):
+        with pytest.raises(ValueError):
+            trigramas_consulta(palabras)
+
+
+def test_los_trigramas_de_la_consulta_estan_en_el_texto():
+    texto = trigramas_texto('Galo Pérez')
+    for consulta in ('galo', 'g perez', 'pe galo', 'alo', 'perez galo'):
+        assert trigramas_consulta(normalizar(consulta).split()) <= texto
+
+
+def test_puntuar_orden_de_relevancia():
+    valores = ['galo perez', 'gperez@correo com', '600111222']
+    assert puntuar(['galo', 'perez'], valores) == (0, 0)   # coincidencia exacta
+    assert puntuar(['galo'], valores) == (1, 0)            # prefijo del campo
+    assert puntuar(['perez'], valores) == (2, 0)           # prefijo de una palabra
+    assert puntuar(['erez'], valores) == (3, 0)            # subcadena
+    assert puntuar(['perez', 'galo'], valores) == (4, 0)   # todas las palabras, en otro orden
+    assert puntuar(['600111'], valores) == (1, 2)          # el peso es la posición del campo
+
+
+def test_puntuar_sin_coincidencia():
+    assert puntuar(['ana'], ['galo perez']) is None
+    assert puntuar(['galo', 'ana'], ['galo perez', 'ana@correo com']) == (4, 0)
+    assert puntuar(['galo', 'ruiz'], ['galo perez', 'ana@correo com']) is None
@@ -0,0 +1,60 @@
+from catalogo import IndiceAlergenos, mascaras_minimas
+
+
+class CursorFalso:
+    """Devuelve las filas de la primera consulta conocida que aparece en la sentencia."""
+
+    def __init__(self, respuestas):
+        self.respuestas = respuestas
+        self.filas = ()
+
+    def execute(self, sql, args=None):
+        self.filas = next(filas for inicio, filas in self.respuestas.items() if inicio in sql)
+
+    def fetchall(self):
+        return self.filas
+
+
+def cargar_alergenos():
+    cursor = CursorFalso({
+        'CHECKSUM TABLE': (('alergenos', 1), ('platos', 2), ('alergias', 3)),
+        'FROM alergenos': (('Gluten', 1), ('Huevo', 3), ('Lactosa', 7)),
+        'FROM platos': (
+            ('R000001', 'Croquetas', 'ENTRANTE', 8, 1),
+            ('R000001', 'Croquetas', 'ENTRANTE', 8, 7),
+            ('R000001', 'Tortilla', 'PRINCIPAL', 12, 3),
+            ('R000001', 'Ensalada', 'ENTRANTE', 9, None),
+            ('R000002', 'Flan', 'POSTRE', 5, 3),
+            ('R000002', 'Flan', 'POSTRE', 5, 7),
+        ),
+    })
+    return IndiceAlergenos().cargar(cursor)
+
+
+def test_mascara_por_nombre():
+    alergenos = cargar_alergenos()
+    # Un bit por alérgeno en el orden de NUM_ALERGENO
+    assert dict(alergenos.bits) == {'gluten': 0b001, 'huevo': 0b010, 'lactosa': 0b100}
+    assert alergenos.mascara([' Gluten', 'LACTOSA', 'desconocido']) == 0b101
+
+
+def test_mascaras_de_los_platos():
+    alergenos = cargar_alergenos()
+    assert alergenos.mascara_plato[('R000001', 'Croquetas')] == 0b101
+    assert alergenos.mascara_plato[('R000001', 'Ensalada')] == 0
+    assert alergenos.mascara_plato[('R000002', 'Flan')] == 0b110
+    assert [(p.nombre, p.alergenos) for p in alergenos.menu('r000002')] == [('Flan', ('Huevo', 'Lactosa'))]
+
+
+def test_restaurante_seguro():
+    alergenos = cargar_alergenos()
+    huevo_y_lactosa = alergenos.mascara(['huevo', 'lactosa'])
+    assert alergenos.restaurante_seguro('R000001', huevo_y_lactosa)  # la ensalada
+    assert not alergenos.restaurante_seguro('R000002', huevo_y_lactosa)
+    assert alergenos.restaurante_seguro('R000002', alergenos.mascara(['gluten']))
+    assert not alergenos.restaurante_seguro('R999999', 0)
+
+
+def test_mascaras_minimas():
+    assert mascaras_minimas([0b011, 0b001, 0b110, 0b001, 0b111]) == (0b001, 0b110)
+    assert mascaras_minimas([0b101, 0]) == (0,)
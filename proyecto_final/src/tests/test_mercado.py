@@ -0,0 +1,54 @@
+import pytest
+
+from mercado import HistogramaCuantiles
+
+
+def histograma(valores):
+    h = HistogramaCuantiles()
+    for valor in valores:
+        h.anadir(valor)
+    return h
+
+
+def percentil_exacto(valores, valor):
+    # scipy.stats.percentileofscore(kind='rank')
+    debajo = sum(v < valor for v in valores)
+    iguales = sum(v == valor for v in valores)
+    return (2 * debajo + iguales + (1 if iguales else 0)) * 50.0 / len(valores)
+
+
+def test_vacio():
+    h = HistogramaCuantiles()
+    assert h.media is None and h.desviacion is None and h.percentil(20) is None
+
+
+def test_media_y_desviacion_exactas():
+    h = histograma([10, 20, 30, 40])
+    assert h.media == 25
+    assert h.desviacion == pytest.approx(11.1803398875)  # numpy.std
+
+
+def test_percentil_como_percentileofscore():
+    valores = [12, 18, 18, 25, 31, 40, 55, 80, 120, 300]
+    h = histograma(valores)
+    for valor in (5, 12, 18, 30, 55, 100, 300, 1000):
+        assert h.percentil(valor) == percentil_exacto(valores, valor)
+
+
+def test_cubos():
+    indice = HistogramaCuantiles.indice
+    # Cada cubo abarca un factor (1 + ALFA) / (1 - ALFA): un 2,5·ALFA más ya es otro cubo
+    for valor in (0.75, 3, 27.5, 142, 4000):
+        assert indice(valor * (1 + 2.5 * HistogramaCuantiles.ALFA)) > indice(valor)
+    assert indice(0.1) == 0
+    assert indice(10 ** 6) == HistogramaCuantiles.CUBOS - 1
+
+
+def test_quitar_y_fusionar():
+    a = histograma([10, 20, 30])
+    b = histograma([40, 50])
+    fusion = a.copia().fusionar(b)
+    assert fusion.n == 5 and fusion.media == 30
+    assert a.n == 3  # copia() no comparte los conteos
+    fusion.quitar(50)
+    assert fusion.percentil(40) == histograma([10, 20, 30, 40]).percentil(40)
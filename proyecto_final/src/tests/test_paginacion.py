@@ -0,0 +1,32 @@
+import pytest
+
+from paginacion import Pagina, codificar_token, cortar, decodificar_token, filtros
+
+
+def test_token_ida_y_vuelta():
+    valores = ['2024-05-01', '13:30:00', 'R00000ÑA']
+    token = codificar_token(valores)
+    assert '=' not in token
+    assert decodificar_token(token, 3) == valores
+
+
+@pytest.mark.parametrize('token', ['no-es-base64!', codificar_token(['a', 'b']), 'e30'])
+def test_token_no_valido(token):
+    with pytest.raises(ValueError, match='after'):
+        decodificar_token(token, 3)
+
+
+def test_filtros_despues_del_token():
+    token = codificar_token(['2024-05-01', 'R1'])
+    condiciones, params = filtros(Pagina(10, token, '2024-01-01', None), ('f.FECHA', 'f.ID'))
+    assert condiciones == ["f.FECHA >= %s",
+                           "f.FECHA <= %s AND ((f.FECHA < %s) OR (f.FECHA = %s AND f.ID < %s))"]
+    assert params == ['2024-01-01', '2024-05-01', '2024-05-01', '2024-05-01', 'R1']
+
+
+def test_cortar():
+    filas = [('2024-05-03', 'R3'), ('2024-05-02', 'R2'), ('2024-05-01', 'R1')]
+    pagina, siguiente = cortar(filas, 2, clave=lambda fila: fila)
+    assert pagina == filas[:2]
+    assert decodificar_token(siguiente, 2) == ['2024-05-02', 'R2']
+    assert cortar(filas, 3, clave=lambda fila: fila) == (filas, None)